@@ -0,0 +1,126 @@
+"""
+Money cells of the operation lists.
+
+The site writes an amount as the currency label followed by
+the value, thousands separated by spaces or NBSP and a comma
+or a dot before the cents:
+
+>>> parse_amount('руб\xa01\xa0234,56')
+Amount(currency='RUB', minor_units=123456)
+
+Cells are read in a single pass with str methods, currency
+labels are mapped to ISO codes once and remembered. The SQLite
+index and the daemon keep the ISO codes, so a label the site
+writes in another case is not a currency of its own.
+
+The examples are the checks of the module:
+
+    python -m doctest amounts.py
+"""
+from collections import namedtuple
+from decimal import Decimal
+from typing import Tuple
+
+
+Amount = namedtuple("Amount", ["currency", "minor_units"])
+
+CURRENCY_SYMBOLS = frozenset('$€')
+DIGIT_SEPARATORS = ' \xa0'
+# Labels the site shows instead of the ISO codes, casefolded
+ISO_CODES = {
+    '$': 'USD',
+    '€': 'EUR',
+    'руб': 'RUB',
+    'rur': 'RUB',
+    'грн': 'UAH',
+    'тенге': 'KZT',
+    'zł': 'PLN',
+}
+
+_codes = {}
+
+
+def currency_code(label: str) -> str:
+    """
+    ISO 4217 code of the currency label whatever its case,
+    labels with no known code are returned upper cased.
+    >>> currency_code('Руб'), currency_code('РУБ'), currency_code('RUR')
+    ('RUB', 'RUB', 'RUB')
+    >>> currency_code('byn')
+    'BYN'
+    >>> all(currency_code(label.upper()) == currency_code(label.title()) == code
+    ...     for label, code in ISO_CODES.items())
+    True
+    """
+    code = _codes.get(label)
+    if code is None:
+        code = _codes[label] = ISO_CODES.get(label.casefold()) or label.upper()
+    return code
+
+
+def _split(text: str) -> Tuple[str, str, str]:
+    """
+    Currency label, whole digits and the two fraction digits.
+    Anything after the fraction is ignored.
+    """
+    end = 0
+    length = len(text)
+    while end < length and (text[end].isalpha() or text[end] in CURRENCY_SYMBOLS):
+        end += 1
+    comma, dot = text.find(',', end), text.find('.', end)
+    point = comma if dot == -1 or -1 < comma < dot else dot
+    whole = text[end:point]
+    fraction = text[point + 1:point + 3]
+    if (not end or point == -1 or not whole or
+            len(fraction) != 2 or not fraction.isdecimal()):
+        raise ValueError("Incorrect currency string: {}".format(text))
+    for separator in DIGIT_SEPARATORS:
+        if separator in whole:
+            whole = whole.replace(separator, '')
+    if whole and not whole.isdecimal():
+        raise ValueError("Incorrect currency string: {}".format(text))
+    return text[:end], whole, fraction
+
+
+def split_currency(text: str) -> Tuple[str, str]:
+    """
+    Currency label as shown by the site and the value with
+    a dot decimal separator.
+    >>> split_currency('$\xa01\xa0234,56')
+    ('$', '1234.56')
+    """
+    label, whole, fraction = _split(text)
+    return label, whole + '.' + fraction
+
+
+def parse_amount(text: str) -> Amount:
+    """
+    Currency code and the value in cents.
+    >>> parse_amount('€0.07')
+    Amount(currency='EUR', minor_units=7)
+    >>> parse_amount('ZŁ 12,30')
+    Amount(currency='PLN', minor_units=1230)
+    >>> cells = {cents: 'Грн{:,}.{:02}'.format(cents // 100, cents % 100).replace(',', '\xa0')
+    ...          for cents in (0, 1, 99, 100, 123456, 10 ** 11 + 1)}
+    >>> all(parse_amount(cell) == ('UAH', cents) for cents, cell in cells.items())
+    True
+    >>> parse_amount('1 234,56')
+    Traceback (most recent call last):
+    ...
+    ValueError: Incorrect currency string: 1 234,56
+    >>> parse_amount('руб12,5')
+    Traceback (most recent call last):
+    ...
+    ValueError: Incorrect currency string: руб12,5
+    """
+    label, whole, fraction = _split(text)
+    return Amount(currency_code(label), int(whole or 0) * 100 + int(fraction))
+
+
+def to_minor_units(value) -> int:
+    """
+    Value of a parsed record in cents.
+    """
+    if isinstance(value, str):
+        value = Decimal(value)
+    return int((value * 100).to_integral_value())
@@ -0,0 +1,241 @@
+"""
+Aggregates of the exported costs and incomes.
+
+Operations are turned into a pandas DataFrame once, straight from
+the parsed records, the local store or the exported files, then
+all the reports are vectorised group-bys over its columns:
+
+>>> frame = operations_frame(parser.iter_operations(months=12))
+>>> net_profit(frame)
+
+Sums are never mixed between currencies. Exchanges move money
+between accounts and are left out.
+
+    python analysis.py monthly --store operations_store.json --currency руб
+"""
+import argparse
+import datetime
+import os
+
+from typing import Iterable, List
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # pragma: no cover
+    np = pd = None
+
+import constants
+import operations as ops
+
+
+COST, INCOME = constants.COST_NAME, constants.INCOME_NAME
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+TEXT_FIELDS = ("id", "title", "category", "budget", "currency", "account")
+KINDS = {
+    ops.Cost: COST,
+    ops.Income: INCOME,
+}
+
+
+def _require_pandas():
+    if pd is None:
+        raise RuntimeError("numpy and pandas are required for the analysis.")
+
+
+def _frame(kind: 'np.ndarray', columns: dict) -> 'pd.DataFrame':
+    """
+    Assemble the frame from column arrays: text fields,
+    value as float64 and date as datetime64.
+    """
+    frame = pd.DataFrame({field: columns[field] for field in TEXT_FIELDS})
+    frame["kind"] = kind
+    frame["value"] = np.asarray(columns["value"], dtype=np.float64)
+    dates = np.asarray(columns["date"], dtype="datetime64[D]")
+    frame["date"] = dates.astype("datetime64[ns]")
+    frame["month"] = dates.astype("datetime64[M]").astype("datetime64[ns]")
+    frame["amount"] = np.where(kind == COST, -frame["value"].values,
+                               frame["value"].values)
+    return frame
+
+
+def operations_frame(operations: Iterable[ops.Operation]) -> 'pd.DataFrame':
+    """
+    Frame of the costs and incomes, records are transposed into
+    columns at once, exchanges are skipped.
+    """
+    _require_pandas()
+    records = {kind: [] for kind in KINDS.values()}
+    for operation in operations:
+        kind = KINDS.get(type(operation))
+        if kind is not None:
+            records[kind].append(operation)
+    frames = []
+    for kind, kind_records in records.items():
+        if not kind_records:
+            continue
+        columns = dict(zip(kind_records[0]._fields, zip(*kind_records)))
+        columns["value"] = np.fromiter(map(float, columns["value"]),
+                                       dtype=np.float64, count=len(kind_records))
+        # numpy converts date objects one by one, ordinals go as a whole
+        ordinals = np.fromiter(map(datetime.date.toordinal, columns["date"]),
+                               dtype=np.int64, count=len(kind_records))
+        columns["date"] = (ordinals - EPOCH).astype("datetime64[D]")
+        frames.append(_frame(np.full(len(kind_records), kind, dtype=object), columns))
+    if not frames:
+        empty = {field: [] for field in TEXT_FIELDS + ("value", "date")}
+        return _frame(np.array([], dtype=object), empty)
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_store(path: str) -> 'pd.DataFrame':
+    from operation_store import OperationStore
+    store = OperationStore(path)
+    return operations_frame(store.costs + store.incomes)
+
+
+def load_csv(directory: str=".") -> 'pd.DataFrame':
+    """
+    Frame of the all_costs.csv and all_incomes.csv files.
+    """
+    _require_pandas()
+    frames = []
+    for kind, filename in ((COST, "all_costs.csv"), (INCOME, "all_incomes.csv")):
+        data = pd.read_csv(os.path.join(directory, filename), sep=",",
+                           dtype=str, keep_default_na=False)
+        columns = {field: data[field].values for field in TEXT_FIELDS}
+        columns["value"] = data["value"].values.astype(np.float64)
+        columns["date"] = pd.to_datetime(data["date"],
+                                         format=constants.DATE_FORMAT).values
+        frames.append(_frame(np.full(len(data), kind, dtype=object), columns))
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_npy(directory: str=".") -> 'pd.DataFrame':
+    """
+    Frame of the all_costs and all_incomes column directories
+    written by the npy exporter.
+    """
+    from exporters import read_columns
+    _require_pandas()
+    frames = []
+    for kind, name in ((COST, "all_costs"), (INCOME, "all_incomes")):
+        columns = read_columns(os.path.join(directory, name))
+        length = len(columns["value"])
+        frames.append(_frame(np.full(length, kind, dtype=object), columns))
+    return pd.concat(frames, ignore_index=True)
+
+
+def filter_operations(frame: 'pd.DataFrame',
+                      currency: str=None,
+                      accounts: List[str]=None,
+                      since: datetime.date=None,
+                      until: datetime.date=None) -> 'pd.DataFrame':
+    mask = np.ones(len(frame), dtype=bool)
+    if currency:
+        mask &= (frame["currency"] == currency).values
+    if accounts:
+        mask &= frame["account"].isin(accounts).values
+    if since:
+        mask &= (frame["date"] >= pd.Timestamp(since)).values
+    if until:
+        mask &= (frame["date"] <= pd.Timestamp(until)).values
+    return frame[mask]
+
+
+def _totals(frame: 'pd.DataFrame', by: List[str]) -> 'pd.DataFrame':
+    """
+    Costs, incomes and their difference per group.
+    """
+    totals = (frame.groupby(by + ["kind"])["value"].sum()
+              .unstack("kind", fill_value=0.0)
+              .reindex(columns=[COST, INCOME], fill_value=0.0))
+    totals["net"] = totals[INCOME] - totals[COST]
+    return totals
+
+
+def monthly_totals(frame: 'pd.DataFrame') -> 'pd.DataFrame':
+    return _totals(frame, ["month", "currency"])
+
+
+def net_profit(frame: 'pd.DataFrame') -> 'pd.DataFrame':
+    """
+    Incomes minus costs per month, a column per currency.
+    """
+    return (frame.groupby(["month", "currency"])["amount"].sum()
+            .unstack("currency", fill_value=0.0))
+
+
+def category_totals(frame: 'pd.DataFrame', kind: str=COST) -> 'pd.DataFrame':
+    totals = (frame[(frame["kind"] == kind).values]
+              .groupby(["currency", "category"])["value"]
+              .agg(["sum", "count"]))
+    return totals.sort_values("sum", ascending=False)
+
+
+def account_totals(frame: 'pd.DataFrame') -> 'pd.DataFrame':
+    return _totals(frame, ["account", "currency"])
+
+
+def currency_totals(frame: 'pd.DataFrame') -> 'pd.DataFrame':
+    totals = _totals(frame, ["currency"])
+    totals["count"] = frame.groupby("currency").size()
+    return totals
+
+
+REPORTS = {
+    "monthly": monthly_totals,
+    "profit": net_profit,
+    "categories": category_totals,
+    "accounts": account_totals,
+    "currencies": currency_totals,
+}
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description='Reports on the exported operations.')
+    arg_parser.add_argument('report', choices=sorted(REPORTS))
+    source = arg_parser.add_mutually_exclusive_group()
+    source.add_argument('--store', help='Local operation store of the --sync exports.')
+    source.add_argument('--csv-dir', help='Directory with the exported CSV files.')
+    source.add_argument('--npy-dir', help='Directory with the npy exported columns.')
+    arg_parser.add_argument('--currency', help='Only operations in this currency.')
+    arg_parser.add_argument('--account', action='append', dest='accounts',
+                            help='Only operations of the account, may be repeated.')
+    arg_parser.add_argument('--since', type=ops.to_date,
+                            help='First date of the operations, dd.mm.yyyy.')
+    arg_parser.add_argument('--until', type=ops.to_date,
+                            help='Last date of the operations, dd.mm.yyyy.')
+    arg_parser.add_argument('--kind', choices=(COST, INCOME), default=COST,
+                            help='Operations of the categories report.')
+    arg_parser.add_argument('--output',
+                            help='Write the report to a .csv or .json file instead of printing.')
+    return arg_parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.store:
+        frame = load_store(args.store)
+    elif args.npy_dir:
+        frame = load_npy(args.npy_dir)
+    else:
+        frame = load_csv(args.csv_dir or ".")
+    frame = filter_operations(frame, args.currency, args.accounts,
+                              args.since, args.until)
+    if args.report == "categories":
+        report = category_totals(frame, args.kind)
+    else:
+        report = REPORTS[args.report](frame)
+
+    if not args.output:
+        print(report.round(2).to_string())
+    elif args.output.endswith('.json'):
+        report.reset_index().to_json(args.output, orient='records',
+                                     date_format='iso', force_ascii=False)
+    else:
+        report.to_csv(args.output)
+
+
+if __name__ == '__main__':
+    main()
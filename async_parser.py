@@ -0,0 +1,369 @@
+"""
+Asyncio based fetch engine.
+
+All the requests (month pages, exchange editorial forms
+and account balance probes) are run as coroutines on a
+single event loop thread sharing one connection pool,
+so hundreds of requests may be in flight without spawning
+an OS thread per request.
+"""
+import asyncio
+import datetime
+import logging
+import threading
+import time
+
+from typing import Iterator, List
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+import constants
+from exchange_resolver import ExchangeResolver
+from exporters import CSVExporter
+from metrics import Metrics
+import operations as ops
+import page_cache
+import parsing_strategies as strategies
+from process_parsing import ProcessPageParser
+from request_scheduler import AdaptiveLimit, RequestFailed, RequestScheduler
+from row_extractors import Row, get_row_extractor
+from page_cache import PageCache
+from session_store import SessionStore
+from parser import BlockParser, IncorrectCredentials, KoshelekParser
+
+
+logger = logging.getLogger('koshelek.async_parser')
+
+
+def decode_body(body: bytes, charset: str=None) -> str:
+    """
+    Text of the response, bytes that do not decode and unknown
+    charsets are replaced as requests does for the threads engine.
+    """
+    try:
+        return body.decode(charset or constants.DEFAULT_ENCODING, errors='replace')
+    except LookupError:
+        return body.decode(constants.DEFAULT_ENCODING, errors='replace')
+
+
+class AsyncKoshelekParser(KoshelekParser):
+    """
+    Drop-in replacement of the KoshelekParser doing network I/O
+    with aiohttp. Public methods stay synchronous, the event
+    loop lives in a background thread for the parser lifetime.
+    """
+
+    def __init__(self,
+                 username: str="",
+                 password: str="",
+                 exporter=None,
+                 concurrency: int=constants.DEFAULT_ASYNC_CONCURRENCY,
+                 queue_size: int=constants.DEFAULT_QUEUE_SIZE,
+                 base_url: str=constants.BASE_URL,
+                 page_cache: PageCache=None,
+                 exchange_resolver: ExchangeResolver=None,
+                 row_extractor=None,
+                 page_parser: ProcessPageParser=None,
+                 max_rows_per_request: int=constants.DEFAULT_MAX_ROWS_PER_REQUEST,
+                 max_request_seconds: float=constants.DEFAULT_MAX_REQUEST_SECONDS,
+                 metrics: Metrics=None,
+                 scheduler: RequestScheduler=None,
+                 session_store: SessionStore=None,
+                 low_memory: bool=False) -> None:
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for the asyncio engine.")
+        if not (username and password):
+            msg = "Password or username is empty."
+            raise IncorrectCredentials(msg)
+        self.username = username
+        self.password = password
+        self.base_url = base_url
+        self.urls = {name: base_url + path
+                     for name, path in self.URL_PATHS.items()}
+        self._logger = logger
+        self._exporter = exporter or CSVExporter()
+        self._page_cache = page_cache
+        self._session_store = session_store
+        self._concurrency = concurrency
+        self._queue_size = queue_size
+        self.metrics = metrics or Metrics()
+        self._scheduler = scheduler or RequestScheduler(
+            limit=AdaptiveLimit(maximum=concurrency), metrics=self.metrics)
+        self.exchange_resolver = exchange_resolver or ExchangeResolver(
+            max_entries=constants.LOW_MEMORY_EXCHANGE_MEMO if low_memory else None)
+        self._block_parser = BlockParser(None, base_url, self.exchange_resolver,
+                                         self.metrics)
+        self._row_extractor = row_extractor or get_row_extractor()
+        self._page_parser = page_parser
+        self._balance_cache = {}
+        # pages are archived and replayed by the threads engine only
+        self._archive = None
+        self._replay = None
+        self._low_memory = low_memory
+        if low_memory:
+            self._queue_size = min(queue_size, constants.LOW_MEMORY_QUEUE_SIZE)
+            max_rows_per_request = min(max_rows_per_request,
+                                       constants.LOW_MEMORY_MAX_ROWS_PER_REQUEST)
+        self._max_rows_per_request = max_rows_per_request
+        self._max_request_seconds = max_request_seconds
+        self._failures_lock = threading.Lock()
+        self.reset_failures()
+
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever,
+                                             name='asyncio-engine',
+                                             daemon=True)
+        self._loop_thread.start()
+        self._session = self._run(self._create_session())
+        self._run(self._authorise())
+
+    def _run(self, coroutine):
+        """
+        Run coroutine on the engine loop and wait for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _create_session(self):
+        connector = aiohttp.TCPConnector(limit=self._concurrency, ssl=False)
+        timeout = aiohttp.ClientTimeout(sock_connect=constants.DEFAULT_REQUEST_TIMEOUT,
+                                        sock_read=constants.DEFAULT_REQUEST_TIMEOUT)
+        return aiohttp.ClientSession(connector=connector,
+                                     cookie_jar=aiohttp.CookieJar(unsafe=True),
+                                     timeout=timeout)
+
+    async def _authorise(self):
+        if await self._restore_session():
+            return
+        await self._fetch(self.base_url)
+        payload = {
+            'user.login': self.username,
+            'user.password': self.password,
+            'saveUser': 'True'
+        }
+        await self._request(self.urls["login"], method='POST', data=payload)
+        if self._session_store is not None:
+            cookies = self._session.cookie_jar.filter_cookies(URL(self.base_url))
+            cookie = cookies.get(self.SESSION_COOKIE_NAME)
+            self._session_store.save(self.base_url, self.username,
+                                     cookie.value if cookie else None)
+
+    async def _restore_session(self) -> bool:
+        if self._session_store is None:
+            return False
+        cookie = self._session_store.get(self.base_url, self.username)
+        if not cookie:
+            return False
+        self._session.cookie_jar.update_cookies({self.SESSION_COOKIE_NAME: cookie},
+                                                URL(self.base_url))
+        try:
+            resp, body = await self._request(self.urls['accounts'],
+                                             allow_redirects=False)
+            authorised = self._is_authorised(resp.status, body)
+        except RequestFailed:
+            authorised = False
+        if not authorised:
+            logger.info("Stored session of %s has expired.", self.username)
+            self._session.cookie_jar.clear()
+        return authorised
+
+    async def _request(self, url: str,
+                       param_dict: dict=None,
+                       headers: dict=None,
+                       method: str='GET',
+                       data: dict=None,
+                       allow_redirects: bool=True):
+        """
+        Send the request through the scheduler, returns the
+        response and its text. Raises RequestFailed once the
+        retries are exhausted.
+        """
+        async def send():
+            started = time.monotonic()
+            async with self._session.request(method, url, params=param_dict,
+                                             headers=headers, data=data,
+                                             allow_redirects=allow_redirects) as resp:
+                body = await resp.read()
+            self.metrics.request(url, time.monotonic() - started,
+                                 len(body), resp.status)
+            return resp.status, resp.headers, (resp, decode_body(body, resp.charset))
+
+        return await self._scheduler.request_async(
+            send, url, network_errors=(aiohttp.ClientError, asyncio.TimeoutError))
+
+    async def _fetch(self, url: str,
+                     param_dict: dict=None,
+                     ttl: int=None) -> str:
+        param_dict = param_dict or {}
+        if self._page_cache is None or ttl is None:
+            resp, body = await self._request(url, param_dict)
+            return body
+        cached = self._page_cache.lookup(url, param_dict, ttl)
+        if cached.body is not None:
+            return cached.body
+        resp, body = await self._request(url, param_dict, headers=cached.headers)
+        if resp.status == 304:
+            body = self._page_cache.revalidated(url, param_dict)
+            if body is not None:
+                return body
+            # evicted since the lookup, fetch it unconditionally
+            resp, body = await self._request(url, param_dict)
+        self._page_cache.store(url, param_dict, body, resp.headers)
+        return body
+
+    def get_accounts(self) -> List[ops.Account]:
+        return self._run(self._get_accounts())
+
+    async def _get_accounts(self) -> List[ops.Account]:
+        self._balance_cache = {}
+        page = await self._fetch(self.urls['accounts'])
+        blocks = self._extract_account_blocks_from_page(page)
+        parser = strategies.AccountParser(None, self.base_url,
+                                          balance_cache=self._balance_cache)
+        details_urls = [parser._extract_details_url(b) for b in blocks]
+        return await asyncio.gather(*(self._get_account(parser, url)
+                                      for url in details_urls))
+
+    async def _get_account(self,
+                           parser: strategies.AccountParser,
+                           details_url: str) -> ops.Account:
+        page = await self._fetch(details_url)
+        account_id, account_title, currencies = parser._extract_account_details(page)
+        balances = await asyncio.gather(*(self._get_balance(parser, account_id, cur)
+                                          for cur in currencies))
+        return ops.Account(account_id, account_title,
+                           [b for b in balances if b])
+
+    async def _get_balance(self,
+                           parser: strategies.AccountParser,
+                           account_id: str,
+                           cur_code: str) -> ops.Balance:
+        key = (account_id, cur_code)
+        if key not in self._balance_cache:
+            text = await self._fetch(parser._balance_url(account_id, cur_code))
+            self._balance_cache[key] = parser._balance_from_text(cur_code, text)
+        return self._balance_cache[key]
+
+    async def _get_operations_content_for_range(self, operation,
+                                                date_start, date_end,
+                                                now=None, revalidate=False) -> str:
+        logger.info("Getting {op} for {start:%d.%m.%Y}-{end:%d.%m.%Y}"
+                    .format(op=operation, start=date_start, end=date_end))
+        date_filter = self.get_date_filter_dict(date_start, date_end)
+        return await self._fetch(self.urls.get(operation, constants.COST_NAME),
+                                 date_filter,
+                                 ttl=0 if revalidate else page_cache.month_ttl(
+                                     date_end.month, date_end.year, now))
+
+    def iter_operations(self,
+                        now: datetime.datetime=None,
+                        months: int=1,
+                        skip: int=0,
+                        revalidate: bool=False) -> Iterator[ops.Operation]:
+        now = now or datetime.datetime.now()
+        queue = self._run(self._create_queue())
+        planner = self._create_fetch_planner(now, months, skip, revalidate)
+        producer = asyncio.run_coroutine_threadsafe(
+            self._produce_operations(planner, now, queue), self._loop)
+        try:
+            while True:
+                operation = self._run(queue.get())
+                if operation is self._SENTINEL:
+                    break
+                yield operation
+        finally:
+            producer.cancel()
+        self._log_failures()
+        logger.info('Operations extraction completed.')
+
+    async def _create_queue(self) -> asyncio.Queue:
+        return asyncio.Queue(maxsize=self._queue_size)
+
+    async def _produce_operations(self, planner, now, queue: asyncio.Queue):
+        try:
+            # With hundreds of workers every month would be handed out
+            # before the planner sees a single page, so the first page
+            # of every operation is fetched alone to size the windows.
+            await asyncio.gather(*(self._produce_shard(planner, now, shard, queue)
+                                   for shard in planner.first_shards()))
+            # every worker holds the rows of its page
+            # until they are taken from the queue
+            workers = (min(self._concurrency, constants.LOW_MEMORY_PAGES_IN_FLIGHT)
+                       if self._low_memory else self._concurrency)
+            await asyncio.gather(*(self._produce_pages(planner, now, queue)
+                                   for _ in range(workers)))
+        except asyncio.CancelledError:
+            # the consumer has stopped and will not make room in a full queue
+            try:
+                queue.put_nowait(self._SENTINEL)
+            except asyncio.QueueFull:
+                pass
+            raise
+        except Exception:
+            await queue.put(self._SENTINEL)
+            raise
+        await queue.put(self._SENTINEL)
+
+    async def _produce_pages(self, planner, now, queue: asyncio.Queue):
+        shard = planner.next_shard()
+        while shard is not None:
+            await self._produce_shard(planner, now, shard, queue)
+            shard = planner.next_shard()
+
+    async def _produce_shard(self, planner, now, shard, queue: asyncio.Queue):
+        try:
+            started = time.monotonic()
+            page = await self._get_operations_content_for_range(
+                *shard, now=now, revalidate=planner.revalidate)
+            elapsed = time.monotonic() - started
+            rows = await self._loop.run_in_executor(
+                None, self._extract_operation_rows_from_page, page)
+            del page
+            planner.record(shard, len(rows), elapsed)
+        except Exception:
+            logger.exception("Unknown error occured while parsing the page.")
+            self.failed_shards.append(shard)
+            return
+        await asyncio.gather(*(self._produce_operation(shard, row, queue)
+                               for row in rows))
+
+    async def _produce_operation(self, shard, row: Row, queue: asyncio.Queue):
+        if not isinstance(row, Row):
+            await queue.put(row)
+            self.metrics.incr('operations')
+            return
+        try:
+            strategy = self._block_parser.OPERATION_MAP[row.operation]
+            if strategy is strategies.ExchangeParseStrategy:
+                accounts = await self._resolve_exchange_accounts(row)
+                with self.metrics.timer('parse.' + row.operation):
+                    operation = strategy.parse_with_accounts(row, *accounts)
+            else:
+                with self.metrics.timer('parse.' + row.operation):
+                    operation = strategy.parse(None, row, base_url=self.base_url)
+        except Exception:
+            logger.exception("Error parsing the operation.")
+            self._record_failed_row(shard, row)
+            return
+        await queue.put(operation)
+        self.metrics.incr('operations')
+        self.metrics.gauge('queue.operations', queue.qsize())
+
+    async def _resolve_exchange_accounts(self, row: Row):
+        accounts = self.exchange_resolver.cached_or_inferred(row)
+        if accounts is None:
+            form = await self._fetch(self.base_url + row.ajax_url)
+            accounts = strategies.ExchangeParseStrategy._extract_accounts_from_form(form)
+            self.exchange_resolver.remember(row, accounts, fetched=True)
+        return accounts
+
+    def close(self):
+        if self._page_parser is not None:
+            self._page_parser.close()
+        self._run(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
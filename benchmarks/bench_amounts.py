@@ -0,0 +1,81 @@
+"""
+Parsing of the money cells with the amounts module, compared
+with the former regex based split_currency when the third party
+regex package is installed. The checks of the parser are the
+doctests of the amounts module.
+
+    python -m benchmarks.bench_amounts --cells 100000
+"""
+import argparse
+import random
+
+from typing import Callable, Dict, List, Optional
+
+try:
+    import regex
+except ImportError:  # pragma: no cover
+    regex = None
+
+import amounts
+from benchmarks import synthetic
+from benchmarks.timing import best_of
+
+
+def legacy_split_currency() -> Optional[Callable]:
+    """
+    split_currency as it was before the amounts module.
+    """
+    if regex is None:
+        return None
+    pattern = regex.compile(r"(?P<currency>[\p{Alpha}$€]+)(?P<value>[\d ]+(\.|\,)\d{2})",
+                            regex.UNICODE)
+
+    def split_currency(sum_str: str):
+        sum_str = sum_str.replace('\xa0', ' ')
+        match = pattern.match(sum_str)
+        if not match:
+            raise ValueError("Incorrect currency string: {}".format(sum_str))
+        value = match.groupdict()['value'].replace(',', '.').replace(' ', '')
+        return match.groupdict()['currency'], value
+    return split_currency
+
+
+def money_cells(count: int, seed: int=0) -> List[str]:
+    rnd = random.Random(seed)
+    return [synthetic.format_money(rnd.choice(synthetic.CURRENCIES),
+                                   rnd.randint(1, 10 ** rnd.randint(2, 9)))
+            for _ in range(count)]
+
+
+def time_amounts(cells: List[str], repeat: int=3) -> Dict[str, float]:
+    timings = {
+        'amounts.split_currency': best_of(
+            lambda: [amounts.split_currency(cell) for cell in cells], repeat)[0],
+        'amounts.parse_amount': best_of(
+            lambda: [amounts.parse_amount(cell) for cell in cells], repeat)[0],
+    }
+    legacy = legacy_split_currency()
+    if legacy is not None:
+        timings['regex.split_currency'] = best_of(
+            lambda: [legacy(cell) for cell in cells], repeat)[0]
+    return timings
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    return time_amounts(money_cells(20000 if quick else 200000))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark money cell parsing.')
+    arg_parser.add_argument('--cells', type=int, default=200000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    cells = money_cells(args.cells)
+    for name, elapsed in time_amounts(cells, args.repeat).items():
+        print('{:<24}{:>10.3f} s{:>12.0f} cells/s'.format(name, elapsed,
+                                                         len(cells) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
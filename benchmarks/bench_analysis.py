@@ -0,0 +1,65 @@
+"""
+Monthly reporting over years of operations with the analysis module.
+
+    python -m benchmarks.bench_analysis --years 10 --rows 300
+"""
+import argparse
+import datetime
+
+from typing import Dict
+
+import analysis
+from benchmarks import synthetic
+from benchmarks.bench_parsing import parse_rows
+from benchmarks.timing import best_of
+from parser import BlockParser
+from row_extractors import get_row_extractor
+
+
+def synthetic_operations(years: int, rows_per_month: int) -> list:
+    """
+    Costs and incomes of every month of the last years.
+    """
+    today = datetime.date.today()
+    start = datetime.date(today.year - years, today.month, 1)
+    rows = []
+    for operation in ('cost', 'income'):
+        page = synthetic.operations_page(operation, start, today,
+                                         rows_per_month, transfer_ratio=0)
+        rows.extend(get_row_extractor().extract(page))
+    return parse_rows(BlockParser(None), rows)
+
+
+def report_all(frame):
+    return [report(frame) for report in analysis.REPORTS.values()]
+
+
+def time_analysis(operations: list, repeat: int=3) -> Dict[str, float]:
+    frame = analysis.operations_frame(operations)
+    return {
+        'analysis.frame': best_of(lambda: analysis.operations_frame(operations),
+                                  repeat)[0],
+        'analysis.reports': best_of(lambda: report_all(frame), repeat)[0],
+    }
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    return time_analysis(synthetic_operations(2 if quick else 10, 300))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark analysis reports.')
+    arg_parser.add_argument('--years', type=int, default=10)
+    arg_parser.add_argument('--rows', type=int, default=300,
+                            help='Rows per month of every operation type.')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    operations = synthetic_operations(args.years, args.rows)
+    print('Operations: {}'.format(len(operations)))
+    for name, elapsed in time_analysis(operations, args.repeat).items():
+        print('{:<18}{:>10.3f} s'.format(name, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Replay of an export from the page archive.
+
+Months of operations are fetched once from the local stub server
+into an archive, then parsed again from it with nothing sent to
+the network, in the network threads and in worker processes.
+--check compares the replayed operations with the live ones.
+
+    python -m benchmarks.bench_archive --months 120 --rows 100 --check
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from typing import Dict, List, Tuple
+
+from benchmarks.stub_server import StubKoshelekServer
+from page_archive import ArchiveReader, PageArchive
+from parser import KoshelekParser
+from process_parsing import ProcessPageParser
+
+
+def _export(parser: KoshelekParser, months: int) -> List[tuple]:
+    try:
+        parser.get_accounts()
+        return sorted(tuple(map(str, op)) for op in parser.iter_operations(months=months))
+    finally:
+        parser.close()
+
+
+def archive_months(stub: StubKoshelekServer, path: str,
+                   months: int) -> Tuple[float, List[tuple]]:
+    """
+    Seconds and operations of the live export writing the archive.
+    """
+    archive = PageArchive(path)
+    started = time.perf_counter()
+    try:
+        operations = _export(KoshelekParser('demo', 'demo', threads=16, base_url=stub.url,
+                                            archive=archive), months)
+    finally:
+        archive.close()
+    return time.perf_counter() - started, operations
+
+
+def replay(path: str, months: int, threads: int=4,
+           parse_workers: int=0) -> Tuple[float, List[tuple]]:
+    reader = ArchiveReader(path)
+    started = time.perf_counter()
+    page_parser = ProcessPageParser(workers=parse_workers) if parse_workers else None
+    try:
+        operations = _export(KoshelekParser(threads=threads, replay=reader,
+                                            page_parser=page_parser), months)
+    finally:
+        reader.close()
+    return time.perf_counter() - started, operations
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    logging.getLogger('koshelek').setLevel(logging.WARNING)
+    months = 24 if quick else 120
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'pages.pack')
+        with StubKoshelekServer(rows_per_month=100) as stub:
+            archive_months(stub, path, months)
+        return {
+            'archive.replay': replay(path, months)[0],
+            'archive.replay.processes': replay(path, months,
+                                               parse_workers=os.cpu_count() or 1)[0],
+            'archive.size_mb': os.path.getsize(path) / 1e6,
+        }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark replay of the page archive.')
+    arg_parser.add_argument('--months', type=int, default=120)
+    arg_parser.add_argument('--rows', type=int, default=100,
+                            help='Rows per month of every operation type.')
+    arg_parser.add_argument('--latency', type=float, default=0.02,
+                            help='Stub server latency per request, seconds.')
+    arg_parser.add_argument('--threads', type=int, default=4)
+    arg_parser.add_argument('--parse-workers', type=int, nargs='+',
+                            default=[0, os.cpu_count() or 1])
+    arg_parser.add_argument('--check', action='store_true',
+                            help='Compare the replayed operations with the live ones.')
+    args = arg_parser.parse_args()
+
+    logging.getLogger('koshelek').setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'pages.pack')
+        with StubKoshelekServer(rows_per_month=args.rows, latency=args.latency) as stub:
+            elapsed, live = archive_months(stub, path, args.months)
+        print('{:<24}{:>10.2f} s{:>10} operations'.format('live', elapsed, len(live)))
+        print('{:<24}{:>10.2f} MB{:>9.2f} MB index'.format(
+            'archive', os.path.getsize(path) / 1e6,
+            os.path.getsize(path + '.idx') / 1e6))
+        for workers in args.parse_workers:
+            elapsed, replayed = replay(path, args.months, args.threads, workers)
+            print('{:<24}{:>10.2f} s{:>10} operations'.format(
+                'replay, {} processes'.format(workers), elapsed, len(replayed)))
+            if args.check and replayed != live:
+                sys.exit("Replayed operations differ from the live ones.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Queries of the daemon API over years of operations.
+
+The index is built from synthetic operations the way a refresh
+builds it, queries are timed on the index, totals both computed
+and cached, and through the local HTTP server, from the request
+to the decoded answer.
+--check compares the totals read from the monthly sums with the
+ones summed over the operations.
+
+    python -m benchmarks.bench_daemon --years 10 --rows 300 --check
+"""
+import argparse
+import datetime
+import json
+import sys
+import threading
+import urllib.request
+
+from typing import Dict
+
+from benchmarks import synthetic
+from benchmarks.bench_parsing import parse_rows
+from benchmarks.timing import best_of
+from export_daemon import ExportDaemon, OperationIndex, create_api_server, group_totals
+from operation_store import OperationStore
+from parser import BlockParser
+from query import to_bound
+from row_extractors import get_row_extractor
+
+
+QUERIES = 100
+
+
+def synthetic_index(years: int, rows_per_month: int) -> OperationIndex:
+    today = datetime.date.today()
+    start = datetime.date(today.year - years, today.month, 1)
+    rows = []
+    for operation in ('cost', 'income'):
+        page = synthetic.operations_page(operation, start, today,
+                                         rows_per_month, transfer_ratio=0)
+        rows.extend(get_row_extractor().extract(page))
+    return OperationIndex(parse_rows(BlockParser(None), rows))
+
+
+def per_query(func, repeat: int=3) -> float:
+    return best_of(lambda: [func() for _ in range(QUERIES)], repeat)[0] / QUERIES
+
+
+def time_queries(index: OperationIndex, repeat: int=3) -> Dict[str, float]:
+    category = index.entries[0].category
+    return {
+        'daemon.index': best_of(lambda: OperationIndex(e.operation for e in index.entries),
+                                1)[0],
+        'daemon.totals.months': per_query(lambda: index._totals(['month'], since='2010-01-01'),
+                                          repeat),
+        'daemon.totals.days': per_query(lambda: index._totals(['month'], since='2010-01-02'),
+                                        repeat),
+        'daemon.totals.cached': per_query(lambda: index.totals(['month'], since='2010-01-02'),
+                                          repeat),
+        'daemon.list.category': per_query(lambda: index.list_operations(categories=[category]),
+                                          repeat),
+    }
+
+
+def time_http(index: OperationIndex, repeat: int=3) -> float:
+    daemon = ExportDaemon(None, OperationStore(''), months=1)
+    daemon.index = index
+    server = create_api_server(daemon, '127.0.0.1', 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/totals?by=category&kind=cost'.format(server.server_address[1])
+    try:
+        return per_query(lambda: json.loads(urllib.request.urlopen(url).read().decode()),
+                         repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def check_totals(index: OperationIndex) -> bool:
+    """
+    Totals read from the monthly sums, whole or in part,
+    and summed over the operations.
+    """
+    dates = [index.entries[len(index.entries) * part // 8].date for part in range(1, 8)]
+    bounds = [(to_bound(dates[0][:7]), to_bound(dates[6][:7], end=True)),
+              (dates[1], dates[5]), (dates[2], dates[3]), (dates[3], dates[3]),
+              (to_bound(dates[2][:7]), dates[2]), (None, dates[4]), (dates[4], None)]
+    for since, until in bounds:
+        for by in (['month'], ['category', 'account'], ['kind', 'year']):
+            if index._totals(by, since=since, until=until) != \
+                    group_totals(index._scanned_totals(since=since, until=until), by):
+                return False
+    return True
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    index = synthetic_index(2 if quick else 10, 300)
+    results = time_queries(index)
+    results['daemon.http'] = time_http(index)
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark daemon API queries.')
+    arg_parser.add_argument('--years', type=int, default=10)
+    arg_parser.add_argument('--rows', type=int, default=300,
+                            help='Rows per month of every operation type.')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--check', action='store_true',
+                            help='Compare the monthly sums with the operations summed up.')
+    args = arg_parser.parse_args()
+
+    index = synthetic_index(args.years, args.rows)
+    print('Operations: {}'.format(len(index.entries)))
+    results = time_queries(index, args.repeat)
+    results['daemon.http'] = time_http(index, args.repeat)
+    for name, elapsed in results.items():
+        print('{:<24}{:>10.3f} ms'.format(name, elapsed * 1000))
+    if args.check and not check_totals(index):
+        sys.exit("Totals of the monthly sums differ from the summed operations.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare the threaded and the asyncio fetch engines
+against the local stub server.
+
+    python -m benchmarks.bench_engines --months 24 --latency 0.05
+"""
+import argparse
+import logging
+import time
+
+from typing import Dict
+
+from benchmarks.stub_server import StubKoshelekServer
+
+
+def _run_engine(parser_factory, months: int):
+    started = time.perf_counter()
+    parser = parser_factory()
+    try:
+        accounts = parser.get_accounts()
+        costs, incomes, exchanges = parser.get_operations_for_months(months=months)
+    finally:
+        parser.close()
+    elapsed = time.perf_counter() - started
+    return elapsed, len(accounts), len(costs) + len(incomes) + len(exchanges)
+
+
+def _engines(stub: StubKoshelekServer, threads: int, concurrency: int):
+    from async_parser import AsyncKoshelekParser
+    from parser import KoshelekParser
+
+    return (
+        ('threads ({})'.format(threads),
+         lambda: KoshelekParser('demo', 'demo', threads=threads,
+                                base_url=stub.url)),
+        ('asyncio ({})'.format(concurrency),
+         lambda: AsyncKoshelekParser('demo', 'demo',
+                                     concurrency=concurrency,
+                                     base_url=stub.url)),
+    )
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    """
+    End to end get_operations_for_months of both engines.
+    """
+    logging.getLogger('koshelek').setLevel(logging.WARNING)
+    months = 6 if quick else 24
+    results = {}
+    with StubKoshelekServer(rows_per_month=30, latency=0.02) as stub:
+        for name, factory in _engines(stub, threads=8, concurrency=100):
+            elapsed, __, __ = _run_engine(factory, months)
+            results['e2e.' + name.split()[0]] = elapsed
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark fetch engines.')
+    arg_parser.add_argument('--months', type=int, default=24)
+    arg_parser.add_argument('--rows', type=int, default=30,
+                            help='Rows per month page.')
+    arg_parser.add_argument('--latency', type=float, default=0.05,
+                            help='Stub server latency per request, seconds.')
+    arg_parser.add_argument('--threads', type=int, default=8)
+    arg_parser.add_argument('--concurrency', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    logging.getLogger('koshelek').setLevel(logging.WARNING)
+    with StubKoshelekServer(rows_per_month=args.rows,
+                            latency=args.latency) as stub:
+        engines = _engines(stub, args.threads, args.concurrency)
+        print('{:<20}{:>10}{:>12}{:>12}{:>10}'.format(
+            'engine', 'seconds', 'operations', 'requests', 'req/s'))
+        for name, factory in engines:
+            requests_before = stub.requests_count
+            elapsed, __, operations = _run_engine(factory, args.months)
+            requests_made = stub.requests_count - requests_before
+            print('{:<20}{:>10.2f}{:>12}{:>12}{:>10.0f}'.format(
+                name, elapsed, operations, requests_made,
+                requests_made / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Throughput of the exporters writing typed operations.
+
+    python -m benchmarks.bench_export --rows 100000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from typing import Dict, List
+
+from benchmarks.bench_parsing import parse_rows, synthetic_rows
+from benchmarks.timing import best_of
+from exporters import EXPORTERS, export_operations
+from parser import BlockParser
+import operations as ops
+
+
+def synthetic_operations(rows: int) -> List[ops.Operation]:
+    return parse_rows(BlockParser(None), synthetic_rows(rows))
+
+
+def time_exporters(operations: List[ops.Operation],
+                   repeat: int=3) -> Dict[str, float]:
+    directory = tempfile.mkdtemp(prefix='bench-export-')
+    try:
+        results = {}
+        for name, exporter_cls in sorted(EXPORTERS.items()):
+            exporter = exporter_cls()
+            filenames = {operation_cls: os.path.join(directory,
+                                                     operation_cls.__name__ + exporter.EXTENSION)
+                         for operation_cls in (ops.Cost, ops.Income, ops.Exchange)}
+            results['export.' + name] = best_of(
+                lambda: export_operations(exporter, operations, filenames,
+                                          delimeter=','),
+                repeat)[0]
+        return results
+    finally:
+        shutil.rmtree(directory)
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    return time_exporters(synthetic_operations(5000 if quick else 50000))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark exporters.')
+    arg_parser.add_argument('--rows', type=int, default=50000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    operations = synthetic_operations(args.rows)
+    for name, elapsed in time_exporters(operations, args.repeat).items():
+        print('{:<14}{:>10.3f} s{:>12.0f} records/s'.format(
+            name, elapsed, len(operations) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
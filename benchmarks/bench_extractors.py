@@ -0,0 +1,45 @@
+"""
+Micro-benchmark of the row extractors on a synthetic page.
+
+    python -m benchmarks.bench_extractors --rows 10000
+"""
+import argparse
+
+from typing import Dict
+
+from benchmarks import synthetic
+from benchmarks.timing import best_of
+from row_extractors import EXTRACTORS
+
+
+def time_extractor(extractor, page: str, repeat: int):
+    return best_of(lambda: extractor.extract(page), repeat)
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    page = synthetic.page_with_rows(1000 if quick else 10000)
+    return {'extract.' + name: time_extractor(extractor_cls(), page, 3)[0]
+            for name, extractor_cls in sorted(EXTRACTORS.items())}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark row extractors.')
+    arg_parser.add_argument('--rows', type=int, default=10000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    page = synthetic.page_with_rows(args.rows)
+    print('Page: {} rows, {:.1f} MB'.format(args.rows, len(page) / 1024 ** 2))
+    results = {}
+    for name, extractor_cls in sorted(EXTRACTORS.items()):
+        elapsed, rows = time_extractor(extractor_cls(), page, args.repeat)
+        results[name] = rows
+        print('{:<6}{:>10.3f} s{:>12.0f} rows/s'.format(name, elapsed,
+                                                       len(rows) / elapsed))
+    reference = results.pop('bs4')
+    for name, rows in results.items():
+        assert rows == reference, '{} rows differ from bs4 ones'.format(name)
+
+
+if __name__ == '__main__':
+    main()
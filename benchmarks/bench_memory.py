@@ -0,0 +1,100 @@
+"""
+Peak memory of a long export traced with tracemalloc.
+
+Operations of every month are fetched from the local stub server
+and written to CSV files, as main.py does. With --low-memory the
+peak should stay flat however many months are exported.
+
+    python -m benchmarks.bench_memory --months 120 --rows 300
+    python -m benchmarks.bench_memory --months 12 120 --modes default low_memory
+
+The stub server runs in the same process, pages it generates are
+traced too. Memory allocated by libxml2 is not.
+"""
+import argparse
+import logging
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from typing import Dict, Tuple
+
+import constants
+from benchmarks.stub_server import StubKoshelekServer
+from exporters import export_operations, get_exporter
+import operations as ops
+
+
+MODES = ('default', 'low_memory')
+
+
+def traced_export(stub: StubKoshelekServer, months: int,
+                  low_memory: bool, threads: int=8) -> Tuple[float, int, int]:
+    """
+    Export months of operations into a temporary directory,
+    returns seconds, peak traced bytes and number of operations.
+    """
+    from parser import KoshelekParser
+
+    batch_size = constants.LOW_MEMORY_BATCH_SIZE if low_memory else 1000
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = {record_type: os.path.join(directory, record_type.__name__ + '.csv')
+                     for record_type in (ops.Cost, ops.Income, ops.Exchange)}
+        tracemalloc.start()
+        started = time.perf_counter()
+        parser = KoshelekParser('demo', 'demo', threads=threads,
+                                base_url=stub.url, low_memory=low_memory)
+        try:
+            written = export_operations(get_exporter('csv', batch_size=batch_size),
+                                        parser.iter_operations(months=months),
+                                        filenames)
+        finally:
+            parser.close()
+        elapsed = time.perf_counter() - started
+        __, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak, sum(written.values())
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    """
+    Low memory export, peak is reported in megabytes.
+    """
+    logging.getLogger('koshelek').setLevel(logging.WARNING)
+    months = 24 if quick else 120
+    with StubKoshelekServer(rows_per_month=300, transfer_ratio=0.01) as stub:
+        elapsed, peak, __ = traced_export(stub, months, low_memory=True)
+    return {
+        'memory.low_memory': elapsed,
+        'memory.low_memory.peak_mb': peak / 1e6,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark export peak memory.')
+    arg_parser.add_argument('--months', type=int, nargs='+', default=[120])
+    arg_parser.add_argument('--rows', type=int, default=300,
+                            help='Rows per month of every operation type.')
+    arg_parser.add_argument('--modes', nargs='+', choices=MODES, default=['low_memory'])
+    arg_parser.add_argument('--threads', type=int, default=8)
+    args = arg_parser.parse_args()
+
+    logging.getLogger('koshelek').setLevel(logging.WARNING)
+    print('{:<12}{:>8}{:>12}{:>10}{:>12}'.format('mode', 'months', 'operations',
+                                                 'seconds', 'peak MB'))
+    with StubKoshelekServer(rows_per_month=args.rows, transfer_ratio=0.01) as stub:
+        for mode in args.modes:
+            for months in args.months:
+                elapsed, peak, operations = traced_export(
+                    stub, months, low_memory=mode == 'low_memory', threads=args.threads)
+                print('{:<12}{:>8}{:>12}{:>10.1f}{:>12.1f}'.format(
+                    mode, months, operations, elapsed, peak / 1e6))
+    # kilobytes on Linux, the whole process including libxml2
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print('Max RSS of the process: {:.1f} MB'.format(max_rss / 1024))
+
+
+if __name__ == '__main__':
+    main()
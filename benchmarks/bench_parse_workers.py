@@ -0,0 +1,67 @@
+"""
+Throughput of the process pool parsing stage with
+a growing number of workers on synthetic pages.
+
+    python -m benchmarks.bench_parse_workers --pages 16 --rows 5000
+"""
+import argparse
+import os
+import time
+
+from typing import Dict, List
+
+from benchmarks import synthetic
+from process_parsing import ProcessPageParser
+
+
+def time_workers(pages: List[str], workers: int) -> float:
+    page_parser = ProcessPageParser(workers=workers)
+    try:
+        page_parser.parse(pages[0])  # spawn the workers
+        started = time.perf_counter()
+        for page in pages:
+            page_parser.parse(page)
+        return time.perf_counter() - started
+    finally:
+        page_parser.close()
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    pages = [synthetic.page_with_rows(1000 if quick else 5000, seed=i,
+                                      transfer_ratio=0)
+             for i in range(4 if quick else 16)]
+    return {
+        'parse_workers.1': time_workers(pages, 1),
+        'parse_workers.all': time_workers(pages, os.cpu_count()),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark parse workers.')
+    arg_parser.add_argument('--pages', type=int, default=16)
+    arg_parser.add_argument('--rows', type=int, default=5000,
+                            help='Rows per page.')
+    arg_parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    args = arg_parser.parse_args()
+
+    pages = [synthetic.page_with_rows(args.rows, seed=i, transfer_ratio=0)
+             for i in range(args.pages)]
+    total_rows = args.rows * args.pages
+    baseline = None
+    workers = 1
+    while workers <= args.max_workers:
+        page_parser = ProcessPageParser(workers=workers)
+        page_parser.parse(pages[0])  # spawn the workers
+        started = time.perf_counter()
+        parsed = sum(len(page_parser.parse(page)) for page in pages)
+        elapsed = time.perf_counter() - started
+        page_parser.close()
+        assert parsed == total_rows
+        baseline = baseline or elapsed
+        print('{:>3} workers{:>10.2f} s{:>12.0f} rows/s{:>8.2f}x'.format(
+            workers, elapsed, total_rows / elapsed, baseline / elapsed))
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
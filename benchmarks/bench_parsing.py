@@ -0,0 +1,66 @@
+"""
+Parsing of the extracted rows into operations
+and of the money cells with split_currency.
+
+    python -m benchmarks.bench_parsing --rows 20000
+"""
+import argparse
+
+from typing import Dict, List
+
+from benchmarks import synthetic
+from benchmarks.timing import best_of
+from parser import BlockParser
+from row_extractors import Row, get_row_extractor
+import parsing_strategies as strategies
+import utils
+
+
+def synthetic_rows(rows: int) -> List[Row]:
+    return get_row_extractor().extract(synthetic.page_with_rows(rows))
+
+
+def parse_rows(block_parser: BlockParser, rows: List[Row]) -> list:
+    """
+    Transfers get their accounts from the synthetic form data
+    instead of the network, the rest go through the BlockParser.
+    """
+    parsed = []
+    for row in rows:
+        if row.operation == 'transfer':
+            accounts = synthetic.transfer_accounts(int(row.id))
+            parsed.append(strategies.ExchangeParseStrategy
+                          .parse_with_accounts(row, *accounts))
+        else:
+            parsed.append(block_parser.parse_row(row))
+    return parsed
+
+
+def time_parsing(rows: List[Row], repeat: int=3) -> Dict[str, float]:
+    block_parser = BlockParser(None)
+    money = [row.money for row in rows]
+    return {
+        'parse.rows': best_of(lambda: parse_rows(block_parser, rows), repeat)[0],
+        'split_currency': best_of(lambda: [utils.split_currency(m) for m in money],
+                                  repeat)[0],
+    }
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    return time_parsing(synthetic_rows(2000 if quick else 20000))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark row parsing.')
+    arg_parser.add_argument('--rows', type=int, default=20000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    for name, elapsed in time_parsing(rows, args.repeat).items():
+        print('{:<16}{:>10.3f} s{:>12.0f} rows/s'.format(name, elapsed,
+                                                         len(rows) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Start up time of the command line entry point.
+
+Every measurement runs a fresh interpreter: importing main as
+reported by python -X importtime, main.py --help and a run
+stopped by a missing settings file. The bare interpreter start
+is measured too, it bounds what main.py can get down to.
+
+    python -m benchmarks.bench_startup --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from typing import Dict, List, Tuple
+
+from benchmarks.timing import best_of
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+MISSING_SETTINGS = os.path.join(ROOT, 'benchmarks', 'missing-settings.json')
+
+
+def _run(args: List[str], **kwargs) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + args, cwd=ROOT,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, **kwargs)
+
+
+def wall_time(args: List[str]) -> float:
+    started = time.perf_counter()
+    _run(args)
+    return time.perf_counter() - started
+
+
+def import_times(module: str='main') -> List[Tuple[str, float, float]]:
+    """
+    Modules imported by the module with their own and cumulative
+    import time in seconds, as python -X importtime reports them.
+    """
+    output = _run(['-X', 'importtime', '-c', 'import ' + module]).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name[1:].rstrip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return modules
+
+
+def main_import_time() -> float:
+    """
+    Cumulative time of importing main, the interpreter
+    start up is left out.
+    """
+    return next(cumulative for name, own, cumulative in import_times()
+                if name.strip() == 'main')
+
+
+def time_startup(repeat: int=5) -> Dict[str, float]:
+    return {
+        'startup.interpreter': best_of(lambda: wall_time(['-c', 'pass']), repeat)[0],
+        'startup.import_main': min(main_import_time() for _ in range(repeat)),
+        'startup.help': best_of(lambda: wall_time([MAIN, '--help']), repeat)[0],
+        'startup.settings_error': best_of(
+            lambda: wall_time([MAIN, '--settings', MISSING_SETTINGS]), repeat)[0],
+    }
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    return time_startup(3 if quick else 10)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark CLI start up.')
+    arg_parser.add_argument('--repeat', type=int, default=10)
+    arg_parser.add_argument('--top', type=int, default=0,
+                            help='Also list the slowest modules imported by main.')
+    args = arg_parser.parse_args()
+
+    for name, elapsed in time_startup(args.repeat).items():
+        print('{:<24}{:>8.1f} ms'.format(name, elapsed * 1000))
+    if args.top:
+        modules = import_times()
+        start = next(i for i, (name, _, _) in enumerate(modules)
+                     if name.strip() == 'main')
+        # importtime lists the modules imported by main indented
+        # right before main itself
+        first = start
+        while first and modules[first - 1][0].startswith(' '):
+            first -= 1
+        children = modules[first:start]
+        print()
+        for name, own, cumulative in sorted(children, key=lambda m: -m[2])[:args.top]:
+            print('{:<40}{:>8.1f} ms{:>8.1f} ms'.format(name, own * 1000,
+                                                      cumulative * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Throughput of the threads engine with growing --threads
+against the local stub server answering with gzip.
+
+The legacy transport is the single requests session with the
+default pool of 10 connections the parser used to share between
+all the threads. Connections opened show how many of them were
+thrown away instead of reused.
+
+Transfers are left out by default: their exchange forms are
+fetched at most DEFAULT_EXCHANGE_CONCURRENCY at a time, which
+would bound throughput whatever the transport.
+
+    python -m benchmarks.bench_transport --threads 1 4 16 32 --latency 0.1
+"""
+import argparse
+import logging
+import time
+
+from typing import Dict, Tuple
+
+from benchmarks.stub_server import StubKoshelekServer
+from parser import KoshelekParser
+from request_scheduler import ScheduledSession
+
+
+class LegacyTransportParser(KoshelekParser):
+
+    def _initialize_session(self):
+        return ScheduledSession(self._scheduler)
+
+
+TRANSPORTS = {
+    'managed': KoshelekParser,
+    'legacy': LegacyTransportParser,
+}
+
+
+def run_export(stub: StubKoshelekServer, parser_class, threads: int,
+               months: int) -> Tuple[float, int, int, int]:
+    """
+    Seconds, requests, connections opened and bytes received
+    of fetching and parsing the months of operations.
+    """
+    requests_before = stub.requests_count
+    connections_before = stub.connections_count
+    bytes_before = stub.bytes_sent
+    started = time.perf_counter()
+    parser = parser_class('demo', 'demo', threads=threads, base_url=stub.url)
+    try:
+        parser.get_accounts()
+        for __ in parser.iter_operations(months=months):
+            pass
+    finally:
+        parser.close()
+    return (time.perf_counter() - started,
+            stub.requests_count - requests_before,
+            stub.connections_count - connections_before,
+            stub.bytes_sent - bytes_before)
+
+
+def benchmark(quick: bool=False) -> Dict[str, float]:
+    logging.getLogger('koshelek').setLevel(logging.WARNING)
+    months = 12 if quick else 48
+    results = {}
+    with StubKoshelekServer(rows_per_month=30, latency=0.02, compress=True,
+                            transfer_ratio=0) as stub:
+        for threads in (4, 16):
+            elapsed, __, __, __ = run_export(stub, KoshelekParser, threads, months)
+            results['transport.threads_{}'.format(threads)] = elapsed
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark HTTP transport.')
+    arg_parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    arg_parser.add_argument('--transports', nargs='+', choices=sorted(TRANSPORTS),
+                            default=['managed', 'legacy'])
+    arg_parser.add_argument('--months', type=int, default=24)
+    arg_parser.add_argument('--rows', type=int, default=30,
+                            help='Rows per month page.')
+    arg_parser.add_argument('--transfer-ratio', type=float, default=0,
+                            help='Share of the costs that are transfers.')
+    arg_parser.add_argument('--latency', type=float, default=0.02,
+                            help='Stub server latency per request, seconds.')
+    arg_parser.add_argument('--no-compress', action='store_true',
+                            help='Stub server answers uncompressed.')
+    args = arg_parser.parse_args()
+
+    logging.getLogger('koshelek').setLevel(logging.WARNING)
+    logging.getLogger('urllib3.connectionpool').setLevel(logging.ERROR)
+    print('{:<10}{:>8}{:>10}{:>10}{:>10}{:>13}{:>10}'.format(
+        'transport', 'threads', 'seconds', 'requests', 'req/s', 'connections', 'MB'))
+    with StubKoshelekServer(rows_per_month=args.rows, latency=args.latency,
+                            compress=not args.no_compress,
+                            transfer_ratio=args.transfer_ratio) as stub:
+        for transport in args.transports:
+            for threads in args.threads:
+                elapsed, requests, connections, size = run_export(
+                    stub, TRANSPORTS[transport], threads, args.months)
+                print('{:<10}{:>8}{:>10.2f}{:>10}{:>10.0f}{:>13}{:>10.2f}'.format(
+                    transport, threads, elapsed, requests, requests / elapsed,
+                    connections, size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
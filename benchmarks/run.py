@@ -0,0 +1,146 @@
+"""
+Run the benchmark suite and keep the results history.
+
+Every run is appended to a JSON Lines file, results (seconds,
+peak memory in megabytes for the *_mb ones) are compared with
+the median of the previous runs made on the same host, higher
+ones are reported as regressions and make the command exit
+with non zero status.
+
+    python -m benchmarks.run --quick
+    python -m benchmarks.run --only bench_parsing bench_export
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from typing import Dict, List
+
+
+SUITES = (
+    'bench_engines',
+    'bench_extractors',
+    'bench_parsing',
+    'bench_amounts',
+    'bench_export',
+    'bench_parse_workers',
+    'bench_analysis',
+    'bench_startup',
+    'bench_memory',
+    'bench_transport',
+    'bench_archive',
+    'bench_daemon',
+)
+
+DEFAULT_HISTORY_FILE = os.path.join(os.path.dirname(__file__), 'results.jsonl')
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def load_history(path: str) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as history_fh:
+        return [json.loads(line) for line in history_fh if line.strip()]
+
+
+def append_history(path: str, record: dict):
+    with open(path, 'a', encoding='utf-8') as history_fh:
+        history_fh.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def baselines(history: List[dict], host: str, quick: bool,
+              runs: int) -> Dict[str, float]:
+    """
+    Median timing of every benchmark over the last runs
+    made on the host with the same size of the data.
+    """
+    samples = {}
+    for record in history:
+        if record['host'] != host or record['quick'] != quick:
+            continue
+        for name, seconds in record['results'].items():
+            samples.setdefault(name, []).append(seconds)
+    return {name: statistics.median(values[-runs:])
+            for name, values in samples.items()}
+
+
+def run_suites(suites, quick: bool) -> Dict[str, float]:
+    results = {}
+    for suite in suites:
+        print('Running {}...'.format(suite), file=sys.stderr)
+        try:
+            module = importlib.import_module('benchmarks.' + suite)
+            results.update(module.benchmark(quick=quick))
+        except RuntimeError as exc:
+            # optional dependencies such as pandas are missing
+            print('Skipping {}: {}'.format(suite, exc), file=sys.stderr)
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Run the benchmark suite.')
+    arg_parser.add_argument('--only', nargs='+', choices=SUITES, default=SUITES,
+                            help='Suites to run.')
+    arg_parser.add_argument('--quick', action='store_true',
+                            help='Use small data sizes.')
+    arg_parser.add_argument('--history', default=DEFAULT_HISTORY_FILE,
+                            help='JSON Lines file with the results of the previous runs.')
+    arg_parser.add_argument('--baseline-runs', type=int, default=5,
+                            help='Number of previous runs the baseline is the median of.')
+    arg_parser.add_argument('--threshold', type=float, default=0.15,
+                            help='Relative slowdown reported as a regression.')
+    arg_parser.add_argument('--no-save', action='store_true',
+                            help='Do not append the results to the history.')
+    args = arg_parser.parse_args()
+
+    host = platform.node()
+    history = load_history(args.history)
+    baseline = baselines(history, host, args.quick, args.baseline_runs)
+    results = run_suites(args.only, args.quick)
+
+    regressions = []
+    print('{:<24}{:>12}{:>12}{:>10}'.format('benchmark', 'result',
+                                            'baseline', 'change'))
+    for name, seconds in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            print('{:<24}{:>12.4f}{:>12}{:>10}'.format(name, seconds, '-', '-'))
+            continue
+        change = seconds / reference - 1
+        regressed = change > args.threshold
+        if regressed:
+            regressions.append(name)
+        print('{:<24}{:>12.4f}{:>12.4f}{:>+9.1f}%{}'.format(
+            name, seconds, reference, change * 100,
+            '  REGRESSION' if regressed else ''))
+
+    if not args.no_save:
+        append_history(args.history, {
+            'timestamp': time.time(),
+            'revision': git_revision(),
+            'host': host,
+            'python': platform.python_version(),
+            'quick': args.quick,
+            'results': results,
+        })
+    if regressions:
+        print('Regressions: {}'.format(', '.join(regressions)), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
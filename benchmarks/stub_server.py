@@ -0,0 +1,226 @@
+"""
+Local stub of the koshelek.org endpoints used by the parser.
+"""
+import datetime
+import gzip
+import random
+import threading
+import time
+
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks import synthetic
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def _parse_date(text: str) -> datetime.date:
+    return datetime.datetime.strptime(text, '%d.%m.%Y').date()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, Nagle's algorithm
+    # would hold the body until the client acknowledges the headers
+    disable_nagle_algorithm = True
+    PUBLIC_PATHS = ('', '/', '/login')
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.stub._connected()
+
+    def do_POST(self):
+        self.server.stub._count()
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        session_id = self.server.stub._login()
+        self._respond('', headers={
+            'Set-Cookie': 'JSESSIONID={}; Path=/'.format(session_id)})
+
+    def _session_id(self) -> str:
+        cookie = SimpleCookie(self.headers.get('Cookie') or '')
+        return cookie['JSESSIONID'].value if 'JSESSIONID' in cookie else ''
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub._count()
+        status = stub._enter()
+        try:
+            if stub.latency:
+                time.sleep(stub.latency)
+            if status != 200:
+                self._respond('Try again later', status=status)
+            else:
+                self._get()
+        finally:
+            stub._leave()
+
+    def _get(self):
+        stub = self.server.stub
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path
+
+        if path not in self.PUBLIC_PATHS and not stub._authorised(self._session_id()):
+            self._respond('<form><input name="user.password"></form>', status=302,
+                          headers={'Location': '/login'})
+            return
+        if path in ('/costs', '/income') and 'filtrDateStart' in query:
+            operation = 'cost' if path == '/costs' else 'income'
+            body = synthetic.operations_page(operation,
+                                             _parse_date(query['filtrDateStart']),
+                                             _parse_date(query['filtrDateEnd']),
+                                             stub.rows_per_month,
+                                             stub.seed,
+                                             stub.transfer_ratio)
+        elif '2edit_ajax' in path:
+            op_id = int(path.rsplit('2edit_ajax', 1)[1])
+            body = synthetic.editorial_form(*synthetic.transfer_accounts(op_id))
+        elif path == '/accounts/remainder_currency':
+            body = synthetic.account_balance(int(query['account_id']),
+                                             query['currency'])
+        elif path.startswith('/accounts/edit/'):
+            body = synthetic.account_details_page(int(path.rsplit('/', 1)[1]))
+        elif path == '/accounts':
+            body = synthetic.accounts_page(stub.accounts)
+        elif path in ('', '/'):
+            body = '<html><body>Family budget</body></html>'
+        else:
+            self._respond('Not found', status=404)
+            return
+        self._respond(body)
+
+    def _respond(self, body: str, status: int=200, headers: dict=None):
+        data = body.encode('utf-8')
+        headers = dict(headers or {})
+        if self.server.stub.compress and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+        self.server.stub._sent(len(data))
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubKoshelekServer(object):
+    """
+    Threaded HTTP server answering the way koshelek.org does.
+
+    Usage:
+
+    >>> with StubKoshelekServer(rows_per_month=100, latency=0.02) as stub:
+    ...     parser = KoshelekParser('demo', 'demo', base_url=stub.url)
+    """
+
+    def __init__(self,
+                 rows_per_month: int=50,
+                 latency: float=0.0,
+                 accounts: int=5,
+                 transfer_ratio: float=0.1,
+                 seed: int=0,
+                 error_rate: float=0.0,
+                 max_in_flight: int=0,
+                 compress: bool=False,
+                 host: str='127.0.0.1',
+                 port: int=0) -> None:
+        self.rows_per_month = rows_per_month
+        self.latency = latency
+        self.accounts = accounts
+        self.transfer_ratio = transfer_ratio
+        self.seed = seed
+        self.error_rate = error_rate
+        self.max_in_flight = max_in_flight
+        self.compress = compress
+        self.requests_count = 0
+        self.connections_count = 0
+        self.bytes_sent = 0
+        self.errors_count = 0
+        self.logins_count = 0
+        self._sessions = set()
+        self._in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer((host, port), StubHandler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def _count(self):
+        with self._lock:
+            self.requests_count += 1
+
+    def _connected(self):
+        with self._lock:
+            self.connections_count += 1
+
+    def _sent(self, size: int):
+        with self._lock:
+            self.bytes_sent += size
+
+    def _login(self) -> str:
+        with self._lock:
+            self.logins_count += 1
+            session_id = 'stub-session-{}'.format(self.logins_count)
+            self._sessions.add(session_id)
+            return session_id
+
+    def _authorised(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def expire_sessions(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def _enter(self) -> int:
+        """
+        Status of the request: 503 for the random failures
+        and 429 when too many requests are in flight.
+        """
+        with self._lock:
+            self._in_flight += 1
+            status = 200
+            if self.max_in_flight and self._in_flight > self.max_in_flight:
+                status = 429
+            elif self._random.random() < self.error_rate:
+                status = 503
+            self.errors_count += status != 200
+            return status
+
+    def _leave(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='stub-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
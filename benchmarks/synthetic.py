@@ -0,0 +1,189 @@
+"""
+Generator of synthetic koshelek.org pages.
+
+Markup mimics the parts of the site the parser relies on,
+content is deterministic for the given seed so benchmark
+runs are comparable with each other.
+"""
+import datetime
+import random
+
+from calendar import monthrange
+from typing import Iterator, List, Tuple
+
+
+CURRENCIES = ('BYN', '$', '€', 'руб')
+CATEGORIES = ('Food', 'Transport', 'Rent', 'Health', 'Fun', 'Gifts', 'Salary')
+ACCOUNTS = ('Cash', 'Card', 'Savings')
+
+ROW_TEMPLATE = (
+    '<tr class="data_line">'
+    '<td><a href="#">{title}</a></td>'
+    '<td><a href="#">{category}</a></td>'
+    '<td><a href="#">{budget}</a></td>'
+    '<td><a href="#" onclick=\'showAjaxWindow("/{kind}/2edit_ajax{op_id}'
+    '?return_url=/{operation}")\'>{money}</a></td>'
+    '<td><a href="#">{account}</a></td>'
+    '<td><a href="#">{date}</a></td>'
+    '</tr>'
+)
+
+PAGE_TEMPLATE = (
+    '<!DOCTYPE html><html><head><title>Family budget</title></head>'
+    '<body><div id="content"><table class="data_table">'
+    '<tr class="header"><th>Title</th><th>Category</th><th>Budget</th>'
+    '<th>Sum</th><th>Account</th><th>Date</th></tr>'
+    '{rows}'
+    '</table></div></body></html>'
+)
+
+FORM_TEMPLATE = (
+    '<form action="/transfer/save">'
+    '<select id="accountFrom">{from_options}</select>'
+    '<select id="accountTo">{to_options}</select>'
+    '</form>'
+)
+
+ACCOUNT_BLOCK_TEMPLATE = (
+    '<div class="grid_block"><span>{title}</span>'
+    '<a onclick=\'showAjaxWindow("/accounts/edit/{account_id}")\'>'
+    '<img alt="Редактировать" src="/img/edit.png"/></a></div>'
+)
+
+ACCOUNT_DETAILS_TEMPLATE = (
+    '<html><body><form action="/accounts/save/{account_id}">'
+    '<input id="name" value="{title}"/>'
+    '<select id="currency" multiple="multiple">{currency_options}</select>'
+    '</form></body></html>'
+)
+
+ACCOUNT_CURRENCIES = ('EUR', 'USD', 'BYR', 'BYN', 'RUR', 'PLN')
+
+
+def format_money(currency: str, cents: int) -> str:
+    """
+    Format amount the way the site does: currency symbol
+    followed by the value with NBSP thousands separators.
+    """
+    whole, fraction = divmod(cents, 100)
+    digits = '{:,}'.format(whole).replace(',', '\xa0')
+    return '{}\xa0{},{:02d}'.format(currency, digits, fraction)
+
+
+def operation_row(operation: str, kind: str, op_id: int,
+                  title: str, category: str, money: str,
+                  account: str, date: datetime.date,
+                  budget: str='Family') -> str:
+    return ROW_TEMPLATE.format(title=title, category=category,
+                               budget=budget, kind=kind, op_id=op_id,
+                               operation=operation, money=money,
+                               account=account,
+                               date=date.strftime('%d.%m.%Y'))
+
+
+def month_rows(operation: str, month: int, year: int,
+               rows: int, seed: int=0,
+               transfer_ratio: float=0.1) -> Iterator[Tuple[datetime.date, str]]:
+    """
+    Yield (date, row markup) pairs of the given month.
+    """
+    rnd = random.Random('{}-{}-{}-{}'.format(seed, operation, month, year))
+    kind = 'costs' if operation == 'cost' else 'income'
+    __, days_count = monthrange(year, month)
+    base_id = (year * 12 + month) * 100000 + (0 if kind == 'costs' else 50000)
+    for i in range(rows):
+        date = datetime.date(year, month, 1 + i * days_count // max(rows, 1))
+        row_kind = 'transfer' if rnd.random() < transfer_ratio else kind
+        money = format_money(rnd.choice(CURRENCIES),
+                             rnd.randint(100, 10 ** rnd.randint(3, 8)))
+        category, account = rnd.choice(CATEGORIES), rnd.choice(ACCOUNTS)
+        if row_kind == 'transfer' and i % 2:
+            # the site names both accounts of some transfers
+            account = '{} → {}'.format(*transfer_accounts(base_id + i))
+        yield date, operation_row(operation=kind, kind=row_kind,
+                                  op_id=base_id + i,
+                                  title='Operation {}'.format(i),
+                                  category=category,
+                                  money=money,
+                                  account=account,
+                                  date=date)
+
+
+def operations_page(operation: str,
+                    date_start: datetime.date,
+                    date_end: datetime.date,
+                    rows_per_month: int,
+                    seed: int=0,
+                    transfer_ratio: float=0.1) -> str:
+    """
+    Page of operations within the given inclusive date range.
+    """
+    rows = []
+    year, month = date_start.year, date_start.month
+    while (year, month) <= (date_end.year, date_end.month):
+        rows.extend(row for date, row in month_rows(operation, month, year,
+                                                    rows_per_month, seed,
+                                                    transfer_ratio)
+                    if date_start <= date <= date_end)
+        month, year = (1, year + 1) if month == 12 else (month + 1, year)
+    return PAGE_TEMPLATE.format(rows=''.join(rows))
+
+
+def page_with_rows(rows: int, seed: int=0, transfer_ratio: float=0.1) -> str:
+    """
+    Single page holding the given number of rows spread across months.
+    """
+    chunks, month, year = [], 1, 2010
+    while rows > 0:
+        count = min(rows, 1000)
+        chunks.extend(row for __, row in month_rows('cost', month, year,
+                                                     count, seed,
+                                                     transfer_ratio))
+        rows -= count
+        month, year = (1, year + 1) if month == 12 else (month + 1, year)
+    return PAGE_TEMPLATE.format(rows=''.join(chunks))
+
+
+def editorial_form(account_from: str, account_to: str) -> str:
+    def options(selected):
+        return ''.join(
+            '<option value="{0}"{1}>{0}</option>'.format(
+                account, ' selected="selected"' if account == selected else '')
+            for account in ACCOUNTS)
+    return FORM_TEMPLATE.format(from_options=options(account_from),
+                                to_options=options(account_to))
+
+
+def transfer_accounts(op_id: int) -> Tuple[str, str]:
+    account_from = ACCOUNTS[op_id % len(ACCOUNTS)]
+    account_to = ACCOUNTS[(op_id + 1) % len(ACCOUNTS)]
+    return account_from, account_to
+
+
+def account_ids(accounts: int) -> List[int]:
+    return [1000 + i for i in range(accounts)]
+
+
+def accounts_page(accounts: int) -> str:
+    blocks = ''.join(ACCOUNT_BLOCK_TEMPLATE.format(account_id=account_id,
+                                                   title='Account {}'.format(account_id))
+                     for account_id in account_ids(accounts))
+    return '<html><body>{}</body></html>'.format(blocks)
+
+
+def account_details_page(account_id: int) -> str:
+    options = ''.join(
+        '<option value="{0}"{1}>{0}</option>'.format(
+            currency,
+            '' if account_balance(account_id, currency) == '0.0'
+            else ' selected="selected"')
+        for currency in ACCOUNT_CURRENCIES)
+    return ACCOUNT_DETAILS_TEMPLATE.format(account_id=account_id,
+                                           title='Account {}'.format(account_id),
+                                           currency_options=options)
+
+
+def account_balance(account_id: int, currency: str) -> str:
+    if (account_id + len(currency) + ord(currency[0])) % 3:
+        return '0.0'
+    return '{}.{:02d}'.format(account_id * 7 % 10000, account_id % 100)
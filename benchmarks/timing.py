@@ -0,0 +1,15 @@
+import time
+
+from typing import Callable, Tuple
+
+
+def best_of(func: Callable, repeat: int=3) -> Tuple[float, object]:
+    """
+    Best wall time of repeat calls of func and its last result.
+    """
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
@@ -1,12 +1,76 @@
 import re
-import regex
 
 URL_PART_BEFORE_ID = '2edit_ajax'
 
 DEFAULT_PARSER = 'lxml'
+DEFAULT_ROW_EXTRACTOR = 'lxml'
+# Names of row_extractors.EXTRACTORS, the CLI lists them without importing the parsers
+ROW_EXTRACTORS = ('bs4', 'lxml')
+# Max number of rows sent to a parsing process at once
+DEFAULT_PARSE_CHUNK_ROWS = 500
 BASE_URL = "https://koshelek.org"
-RE_CURRENCY = regex.compile(r"(?P<currency>[\p{Alpha}$€]+)(?P<value>[\d ]+(\.|\,)\d{2})", regex.UNICODE)
+# Pages served with no charset
+DEFAULT_ENCODING = 'utf-8'
 RE_AJAX_ARGS_URL = re.compile(r'showAjaxWindow\(\"(?P<ajax_url>.+?)\"')
 
 COST_NAME, INCOME_NAME = 'cost', 'income'
+DATE_FORMAT = '%d.%m.%Y'
 PRICE_EDITOR_ELEMENT_INDEX = 3
+
+# Max number of page blocks and parsed operations kept in memory
+DEFAULT_QUEUE_SIZE = 512
+# Low memory mode: shorter queues and smaller pages, months start
+# with week windows and at most that many pages are held at once
+LOW_MEMORY_QUEUE_SIZE = 32
+LOW_MEMORY_MAX_ROWS_PER_REQUEST = 250
+LOW_MEMORY_WINDOW_DAYS = 7
+LOW_MEMORY_PAGES_IN_FLIGHT = 8
+LOW_MEMORY_BATCH_SIZE = 100
+# and keeps that many failed rows and memoised exchange accounts
+LOW_MEMORY_FAILED_ROWS = 100
+LOW_MEMORY_EXCHANGE_MEMO = 2000
+# Months whose pages exceed these get split into weeks or days
+DEFAULT_MAX_ROWS_PER_REQUEST = 1000
+DEFAULT_MAX_REQUEST_SECONDS = 5.0
+# Max number of simultaneous requests of the asyncio engine
+DEFAULT_ASYNC_CONCURRENCY = 100
+# Requests in flight the adaptive limit starts with, it is halved
+# on errors and responses slower than the latency target, seconds
+DEFAULT_INITIAL_CONCURRENCY = 4
+DEFAULT_LATENCY_TARGET = 5.0
+DEFAULT_MAX_RETRIES = 4
+# Backoff before the n-th retry is random up to base * 2 ** n seconds
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+SCHEDULER_POLL_INTERVAL = 0.01
+# Seconds to connect and between the bytes of a response before it is retried
+DEFAULT_REQUEST_TIMEOUT = 30.0
+
+DEFAULT_CACHE_DIR = '.koshelek_cache'
+# Max size of the page cache, bytes
+DEFAULT_CACHE_SIZE = 200 * 1024 * 1024
+# Seconds the pages of the previous and older months stay fresh
+CACHE_TTL_RECENT_MONTH = 24 * 60 * 60
+CACHE_TTL_CLOSED_MONTH = 30 * 24 * 60 * 60
+
+DEFAULT_EXCHANGE_CACHE_FILE = 'exchange_accounts.json'
+# Login cookies kept in the cache directory, pages in its
+# subdirectory where the page cache evicts files on its own
+SESSION_FILE_NAME = 'sessions.json'
+PAGE_CACHE_DIR_NAME = 'pages'
+
+DEFAULT_BATCH_OUTPUT_DIR = 'exports'
+SINGLE_FILE_NAME = 'operations'
+DEFAULT_PARALLEL_USERS = 4
+# Max number of requests in flight for all the users of the batch
+DEFAULT_BATCH_BUDGET = 32
+# Max number of simultaneous editorial form requests
+DEFAULT_EXCHANGE_CONCURRENCY = 4
+# Seconds between the stack samples of --profile and
+# number of the hottest functions listed in its summary
+DEFAULT_PROFILE_INTERVAL = 0.01
+DEFAULT_PROFILE_TOP = 25
+# Address of the local API of --daemon and seconds between its refreshes
+DEFAULT_DAEMON_HOST = '127.0.0.1'
+DEFAULT_DAEMON_PORT = 8765
+DEFAULT_REFRESH_INTERVAL = 15 * 60
@@ -0,0 +1,136 @@
+"""
+Resolution of the exchange accounts.
+
+Accounts of the exchange are not a part of the operations list,
+so every transfer used to cost an extra editorial form request.
+Resolved accounts are memoised by the operation id along with
+the money, date and account cells of its row, so a transfer
+edited on the site is resolved again, and persisted between
+runs. The form is fetched only as a last resort. With max_entries
+only the most recently used accounts are kept, the others are
+inferred or fetched again when needed.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import constants
+from parsing_strategies import ExchangeParseStrategy
+from row_extractors import Row
+
+
+logger = logging.getLogger('koshelek.exchange_resolver')
+
+Accounts = Tuple[str, str]
+
+
+class ExchangeResolver(object):
+
+    ACCOUNT_SEPARATORS = ('→', '->', '⇒')
+
+    def __init__(self,
+                 path: str=None,
+                 max_concurrent: int=constants.DEFAULT_EXCHANGE_CONCURRENCY,
+                 max_entries: int=None) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.memo_hits = 0
+        self.inferred = 0
+        self.fetched = 0
+        self._accounts = OrderedDict()
+        self._lock = threading.Lock()
+        self._fetch_semaphore = threading.BoundedSemaphore(max_concurrent)
+        if path and os.path.exists(path):
+            self.load()
+
+    @property
+    def fetches_avoided(self) -> int:
+        return self.memo_hits + self.inferred
+
+    def stats(self) -> dict:
+        return {
+            'memo_hits': self.memo_hits,
+            'inferred': self.inferred,
+            'fetched': self.fetched,
+            'fetches_avoided': self.fetches_avoided,
+        }
+
+    def load(self):
+        with open(self.path, encoding='utf-8') as accounts_fh:
+            items = list(json.load(accounts_fh).items())
+        # saved least recently used first
+        if self.max_entries is not None:
+            items = items[-self.max_entries:] if self.max_entries else []
+        self._accounts = OrderedDict(
+            (key, tuple(sys.intern(account) for account in accounts))
+            for key, accounts in items)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            accounts = OrderedDict(self._accounts)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as accounts_fh:
+            json.dump(accounts, accounts_fh, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def memo_key(row: Row) -> str:
+        return '|'.join((row.id, row.money, row.date, row.account))
+
+    def _infer_accounts(self, row: Row) -> Optional[Accounts]:
+        """
+        Take accounts from the list page when its
+        account cell names both of them.
+        """
+        for separator in self.ACCOUNT_SEPARATORS:
+            if separator in row.account:
+                account_from, __, account_to = row.account.partition(separator)
+                return account_from.strip(), account_to.strip()
+        return None
+
+    def cached_or_inferred(self, row: Row) -> Optional[Accounts]:
+        """
+        Accounts known without fetching the editorial form, if any.
+        """
+        with self._lock:
+            key = self.memo_key(row)
+            accounts = self._accounts.get(key)
+            if accounts is not None:
+                self._accounts.move_to_end(key)
+                self.memo_hits += 1
+                return accounts
+        accounts = self._infer_accounts(row)
+        if accounts is not None:
+            self.remember(row, accounts)
+            with self._lock:
+                self.inferred += 1
+        return accounts
+
+    def remember(self, row: Row, accounts: Accounts, fetched: bool=False):
+        # the memo grows with every exchange, names are shared
+        accounts = tuple(sys.intern(account) for account in accounts)
+        key = self.memo_key(row)
+        with self._lock:
+            self._accounts[key] = accounts
+            self._accounts.move_to_end(key)
+            if self.max_entries is not None and len(self._accounts) > self.max_entries:
+                self._accounts.popitem(last=False)
+            self.fetched += fetched
+
+    def resolve(self, session, row: Row,
+                base_url: str=constants.BASE_URL) -> Accounts:
+        accounts = self.cached_or_inferred(row)
+        if accounts is not None:
+            return accounts
+        with self._fetch_semaphore:
+            accounts = ExchangeParseStrategy._parse_editorial_form(session, row.ajax_url,
+                                                                   base_url)
+        self.remember(row, accounts, fetched=True)
+        return accounts
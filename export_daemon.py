@@ -0,0 +1,491 @@
+"""
+Daemon mode: the parser stays logged in, recent months are
+refreshed on a schedule and a local HTTP API answers queries
+about the operations and account balances kept in memory.
+
+Every refresh syncs the months that may have changed into the
+operation store, as --sync does, then builds a new index from
+the store and swaps it in. A request is answered from the index
+that was current when it came, refreshes never block it.
+
+    python main.py --daemon --months 36 --refresh-interval 600
+    curl 'http://127.0.0.1:8765/totals?by=month&kind=cost&since=2017'
+    curl 'http://127.0.0.1:8765/operations?category=Food&limit=20'
+
+All the endpoints answer JSON:
+
+    GET  /status      last refresh, its duration and error, index size
+    GET  /accounts    accounts with their balances
+    GET  /operations  newest first, filtered by kind, category, account,
+                      currency, since and until, at most limit of them
+    GET  /totals      sums of the costs and incomes with the same filters
+                      grouped by kind, month, year, category or account,
+                      always split by currency
+    POST /refresh     start a refresh now
+
+category, account and by may be repeated, since and until take
+YYYY, YYYY-MM or YYYY-MM-DD as query.py does.
+"""
+import argparse
+import itertools
+import json
+import logging
+import threading
+import time
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from operator import itemgetter
+from socketserver import ThreadingMixIn
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from amounts import currency_code, to_minor_units
+from metrics import Metrics
+from operation_store import OperationStore, sync_operations
+import operations as ops
+from query import GROUPS, format_cents, is_month_bound, to_bound
+
+if TYPE_CHECKING:
+    from parser import KoshelekParser
+
+
+logger = logging.getLogger('koshelek.daemon')
+
+KINDS = {
+    ops.Cost: 'cost',
+    ops.Income: 'income',
+    ops.Exchange: 'exchange',
+}
+# Exchanges move money between accounts, totals leave them out
+TOTAL_KINDS = ('cost', 'income')
+DEFAULT_LIST_LIMIT = 50
+# Totals kept by every index, the same queries come again and again
+TOTALS_CACHE_SIZE = 256
+
+Entry = namedtuple("Entry", ["date", "kind", "category", "accounts",
+                             "currency", "cents", "operation"])
+# Fields of the totals, in the order of the rollup keys
+Totaled = namedtuple("Totaled", ["kind", "month", "year", "currency", "category", "account"])
+
+
+def _entry(operation: ops.Operation) -> Entry:
+    kind = KINDS[type(operation)]
+    if kind == 'exchange':
+        category, accounts = None, (operation.account_from, operation.account_to)
+    else:
+        category, accounts = operation.category, (operation.account,)
+    return Entry(operation.date.isoformat(), kind, category, accounts,
+                 currency_code(operation.currency), to_minor_units(operation.value),
+                 operation)
+
+
+def _totaled(entry: Entry) -> Totaled:
+    return Totaled(entry.kind, entry.date[:7], entry.date[:4], entry.currency,
+                   entry.category, entry.accounts[0])
+
+
+class OperationIndex(object):
+    """
+    Read only snapshot of the operations and accounts.
+
+    Operations are sorted by date, so the bounds of a query are
+    found by bisection, while categories and accounts map to the
+    sorted positions of their operations. Totals of costs and
+    incomes per kind, month, currency, category and account are
+    summed up front, so only the months split by the bounds of a
+    query are summed from their operations.
+    """
+
+    def __init__(self,
+                 operations: Iterable[ops.Operation],
+                 accounts: Iterable[ops.Account]=(),
+                 refreshed_at: float=None) -> None:
+        self.entries = sorted((_entry(operation) for operation in operations),
+                              key=lambda entry: entry.date)
+        self.accounts = list(accounts)
+        self.refreshed_at = refreshed_at
+        self._dates = [entry.date for entry in self.entries]
+        self._by_category = defaultdict(list)
+        self._by_account = defaultdict(list)
+        rollup = defaultdict(lambda: [0, 0])
+        for position, entry in enumerate(self.entries):
+            if entry.category is not None:
+                self._by_category[entry.category].append(position)
+            for account in sorted(set(entry.accounts)):
+                self._by_account[account].append(position)
+            if entry.kind in TOTAL_KINDS:
+                totals = rollup[_totaled(entry)]
+                totals[0] += entry.cents
+                totals[1] += 1
+        self._rollup = sorted(rollup.items(), key=lambda item: item[0].month)
+        self._rollup_months = [totaled.month for totaled, __ in self._rollup]
+        self._totals_cache = {}
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(KINDS.values(), 0)
+        for entry in self.entries:
+            counts[entry.kind] += 1
+        return counts
+
+    def _positions(self, since: str=None, until: str=None,
+                   categories: List[str]=None,
+                   accounts: List[str]=None) -> Iterable[int]:
+        low = bisect_left(self._dates, since) if since else 0
+        high = bisect_right(self._dates, until) if until else len(self._dates)
+        selected = None
+        for positions_of, values in ((self._by_category, categories),
+                                     (self._by_account, accounts)):
+            if not values:
+                continue
+            positions = set()
+            for value in values:
+                found = positions_of.get(value, ())
+                positions.update(found[bisect_left(found, low):bisect_left(found, high)])
+            selected = positions if selected is None else selected & positions
+        return range(low, high) if selected is None else sorted(selected)
+
+    def select(self, kind: str=None,
+               categories: List[str]=None,
+               accounts: List[str]=None,
+               currency: str=None,
+               since: str=None,
+               until: str=None,
+               newest_first: bool=False) -> Iterable[Entry]:
+        positions = self._positions(since, until, categories, accounts)
+        if newest_first:
+            positions = reversed(positions)
+        for position in positions:
+            entry = self.entries[position]
+            if (kind is None or entry.kind == kind) and \
+                    (currency is None or entry.currency == currency):
+                yield entry
+
+    def list_operations(self, limit: int=DEFAULT_LIST_LIMIT, **filters) -> List[Entry]:
+        return list(itertools.islice(self.select(newest_first=True, **filters), limit))
+
+    def _rollup_totals(self, kind: str=None,
+                       categories: List[str]=None,
+                       accounts: List[str]=None,
+                       currency: str=None,
+                       first_month: str=None,
+                       last_month: str=None) -> Iterable[tuple]:
+        """
+        Monthly totals from first_month to last_month, YYYY-MM.
+        """
+        low = bisect_left(self._rollup_months, first_month) if first_month else 0
+        high = (bisect_right(self._rollup_months, last_month) if last_month
+                else len(self._rollup_months))
+        checks = [(field, values) for field, values in (('kind', kind and [kind]),
+                                                        ('currency', currency and [currency]),
+                                                        ('category', categories),
+                                                        ('account', accounts)) if values]
+        for totaled, (cents, count) in itertools.islice(self._rollup, low, high):
+            if all(getattr(totaled, field) in values for field, values in checks):
+                yield totaled, cents, count
+
+    def _scanned_totals(self, kind: str=None, **filters) -> Iterable[tuple]:
+        for entry in self.select(kind=kind, **filters):
+            if entry.kind in TOTAL_KINDS:
+                yield _totaled(entry), entry.cents, 1
+
+    def totals(self, by: List[str]=(), **filters) -> List[dict]:
+        """
+        Sum and count of the costs and incomes per group, read
+        from the monthly totals unless the bounds split a month.
+        The index never changes, so the results are cached
+        and must not be modified.
+        """
+        key = (tuple(by),) + tuple(sorted(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in filters.items()))
+        found = self._totals_cache.get(key)
+        if found is None:
+            if len(self._totals_cache) >= TOTALS_CACHE_SIZE:
+                self._totals_cache.clear()
+            found = self._totals_cache[key] = self._totals(by, **filters)
+        return found
+
+    def _totals(self, by: List[str]=(), since: str=None, until: str=None,
+                **filters) -> List[dict]:
+        """
+        Only the months split by the bounds are summed
+        from their operations, whole ones from the totals.
+        """
+        if since and until and since > until:
+            return []
+        if since and until and since[:7] == until[:7] and not (
+                is_month_bound(since) and is_month_bound(until, end=True)):
+            return group_totals(self._scanned_totals(since=since, until=until,
+                                                     **filters), by)
+        parts = []
+        first_month = since and since[:7]
+        if not is_month_bound(since):
+            parts.append(self._scanned_totals(since=since,
+                                              until=to_bound(first_month, end=True),
+                                              **filters))
+            first_month = next_month(first_month)
+        last_month = until and until[:7]
+        if not is_month_bound(until, end=True):
+            parts.append(self._scanned_totals(since=to_bound(last_month),
+                                              until=until, **filters))
+            last_month = previous_month(last_month)
+        parts.append(self._rollup_totals(first_month=first_month,
+                                         last_month=last_month, **filters))
+        return group_totals(itertools.chain(*parts), by)
+
+
+def next_month(month: str) -> str:
+    year, month = (int(part) for part in month.split('-'))
+    return '{:04d}-{:02d}'.format(year + month // 12, month % 12 + 1)
+
+
+def previous_month(month: str) -> str:
+    year, month = (int(part) for part in month.split('-'))
+    return '{:04d}-{:02d}'.format(year - (month == 1), (month - 2) % 12 + 1)
+
+
+def group_totals(found: Iterable[tuple], by: List[str]=()) -> List[dict]:
+    by = [group for group in by if group != 'currency'] + ['currency']
+    key = itemgetter(*(Totaled._fields.index(group) for group in by))
+    if len(by) == 1:
+        key = lambda totaled, field=key: (field(totaled),)
+    groups = defaultdict(lambda: [0, 0])
+    for totaled, cents, count in found:
+        group = groups[key(totaled)]
+        group[0] += cents
+        group[1] += count
+    return [dict(zip(by, key), total=format_cents(cents), count=count)
+            for key, (cents, count) in sorted(groups.items(),
+                                              key=lambda item: [str(v) for v in item[0]])]
+
+
+def entry_to_dict(entry: Entry) -> dict:
+    operation = entry.operation
+    fields = dict(zip(operation._fields, ops.to_strings(operation)))
+    fields.update(kind=entry.kind, date=entry.date, currency=entry.currency)
+    return fields
+
+
+def account_to_dict(account: ops.Account) -> dict:
+    return {
+        'id': account.id,
+        'title': account.title,
+        'balances': [{'currency': balance.currency, 'value': str(balance.value)}
+                     for balance in account.remnants],
+    }
+
+
+class ExportDaemon(object):
+    """
+    Keeps the parser, the operation store and the current index,
+    refreshes them every refresh_interval seconds in a background
+    thread. The parser is created and logged in by that thread,
+    which owns its session and logs in again when it expires.
+    """
+
+    def __init__(self,
+                 parser_factory: Callable[[], 'KoshelekParser'],
+                 store: OperationStore,
+                 months: int,
+                 dirty_window: int=1,
+                 refresh_interval: float=900,
+                 metrics: Metrics=None) -> None:
+        self.parser_factory = parser_factory
+        self.store = store
+        self.months = months
+        self.dirty_window = dirty_window
+        self.refresh_interval = refresh_interval
+        self.metrics = metrics or Metrics()
+        # operations synced by the previous runs are served right away
+        self.index = OperationIndex(self._stored_operations())
+        self.refreshes = 0
+        self.refreshing = False
+        self.last_error = None
+        self.last_refresh_seconds = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='refresh', daemon=True)
+
+    def _stored_operations(self) -> Iterable[ops.Operation]:
+        return itertools.chain(self.store.costs, self.store.incomes, self.store.exchanges)
+
+    def _run(self):
+        parser = None
+        try:
+            while not self._stop.is_set():
+                try:
+                    if parser is None:
+                        parser = self.parser_factory()
+                    else:
+                        parser.ensure_authorised()
+                    self.refresh(parser)
+                except Exception as exc:
+                    logger.exception("Refresh failed.")
+                    self.last_error = str(exc)
+                self._wake.wait(self.refresh_interval)
+                self._wake.clear()
+        finally:
+            if parser is not None:
+                parser.close()
+
+    def refresh(self, parser: 'KoshelekParser'):
+        """
+        Sync the changed months and swap in the new index.
+        """
+        started = time.monotonic()
+        self.refreshing = True
+        try:
+            # failures of the previous refresh must not hold the checkpoint
+            parser.reset_failures()
+            accounts = parser.get_accounts()
+            sync_operations(parser, self.store, months=self.months,
+                            dirty_window=self.dirty_window)
+            parser.exchange_resolver.save()
+            self.index = OperationIndex(self._stored_operations(), accounts,
+                                        refreshed_at=time.time())
+            self.last_error = None
+            self.refreshes += 1
+        finally:
+            self.refreshing = False
+            self.last_refresh_seconds = round(time.monotonic() - started, 3)
+        logger.info("Refresh completed in %.1f s, %d operations indexed.",
+                    self.last_refresh_seconds, len(self.index.entries))
+
+    def request_refresh(self):
+        self._wake.set()
+
+    def status(self) -> dict:
+        index = self.index
+        return {
+            'refreshed_at': index.refreshed_at,
+            'refreshing': self.refreshing,
+            'refreshes': self.refreshes,
+            'last_refresh_seconds': self.last_refresh_seconds,
+            'last_error': self.last_error,
+            'refresh_interval': self.refresh_interval,
+            'checkpoint': self.store.checkpoint,
+            'operations': index.counts(),
+            'accounts': len(index.accounts),
+            'requests': self.metrics.totals()['requests'],
+        }
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop refreshing, a refresh in progress is completed first.
+        """
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+
+
+def _one(params: dict, name: str, choices: Iterable[str]=None) -> Optional[str]:
+    values = params.get(name)
+    if not values:
+        return None
+    if choices is not None and values[-1] not in choices:
+        raise ValueError("{} should be one of: {}".format(name, ", ".join(choices)))
+    return values[-1]
+
+
+def _filters(params: dict, kinds: Iterable[str]) -> dict:
+    since, until = _one(params, 'since'), _one(params, 'until')
+    currency = _one(params, 'currency')
+    return {
+        'kind': _one(params, 'kind', kinds),
+        'categories': params.get('category'),
+        'accounts': params.get('account'),
+        'currency': currency and currency_code(currency),
+        'since': to_bound(since) if since else None,
+        'until': to_bound(until, end=True) if until else None,
+    }
+
+
+def get_status(daemon: ExportDaemon, params: dict) -> dict:
+    return daemon.status()
+
+
+def get_accounts(daemon: ExportDaemon, params: dict) -> dict:
+    index = daemon.index
+    return {
+        'refreshed_at': index.refreshed_at,
+        'accounts': [account_to_dict(account) for account in index.accounts],
+    }
+
+
+def get_operations(daemon: ExportDaemon, params: dict) -> dict:
+    index = daemon.index
+    limit = int(_one(params, 'limit') or DEFAULT_LIST_LIMIT)
+    entries = index.list_operations(limit=limit, **_filters(params, KINDS.values()))
+    return {
+        'refreshed_at': index.refreshed_at,
+        'operations': [entry_to_dict(entry) for entry in entries],
+    }
+
+
+def get_totals(daemon: ExportDaemon, params: dict) -> dict:
+    index = daemon.index
+    by = params.get('by', [])
+    unknown = sorted(set(by) - set(GROUPS))
+    if unknown:
+        raise ValueError("Unknown groups: {}".format(", ".join(unknown)))
+    return {
+        'refreshed_at': index.refreshed_at,
+        'totals': index.totals(by, **_filters(params, TOTAL_KINDS)),
+    }
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+
+    GET_ROUTES = {
+        '/status': get_status,
+        '/accounts': get_accounts,
+        '/operations': get_operations,
+        '/totals': get_totals,
+    }
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        route = self.GET_ROUTES.get(url.path.rstrip('/'))
+        if route is None:
+            self._send({'error': 'Unknown path: {}'.format(url.path)}, 404)
+            return
+        try:
+            body = route(self.server.export_daemon, parse_qs(url.query))
+        except (ValueError, argparse.ArgumentTypeError) as exc:
+            self._send({'error': str(exc)}, 400)
+            return
+        self._send(body)
+
+    def do_POST(self):
+        if urlsplit(self.path).path.rstrip('/') != '/refresh':
+            self._send({'error': 'Unknown path: {}'.format(self.path)}, 404)
+            return
+        self.server.export_daemon.request_refresh()
+        self._send({'refresh': 'requested'}, 202)
+
+    def _send(self, body: dict, status: int=200):
+        content = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class ApiServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def create_api_server(daemon: ExportDaemon, host: str, port: int) -> ApiServer:
+    server = ApiServer((host, port), ApiHandler)
+    server.export_daemon = daemon
+    return server
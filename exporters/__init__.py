@@ -1,3 +1,21 @@
+from exporters.base import BaseExporter, BaseSink, export_operations
+from exporters.columnar_exporter import NpyColumnsExporter, read_columns
 from exporters.csv_exporter import CSVExporter
+from exporters.jsonl_exporter import JSONLinesExporter
+from exporters.sqlite_exporter import SQLiteExporter
 
-__all__ = ["CSVExporter", ]
+EXPORTERS = {
+    'csv': CSVExporter,
+    'jsonl': JSONLinesExporter,
+    'npy': NpyColumnsExporter,
+    'sqlite': SQLiteExporter,
+}
+
+
+def get_exporter(name: str='csv', **kwargs) -> BaseExporter:
+    return EXPORTERS[name](**kwargs)
+
+
+__all__ = ["BaseExporter", "BaseSink", "CSVExporter", "JSONLinesExporter",
+           "NpyColumnsExporter", "SQLiteExporter", "EXPORTERS", "export_operations",
+           "get_exporter", "read_columns", ]
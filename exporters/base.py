@@ -0,0 +1,105 @@
+import abc
+import time
+from typing import Dict, Iterable
+
+
+class BaseSink(abc.ABC):
+    """
+    Receives records one by one and writes them
+    to the file in batches of batch_size records.
+    """
+
+    def __init__(self, filename: str, batch_size: int) -> None:
+        self.filename = filename
+        self.batch_size = batch_size
+        self.records_written = 0
+        self.write_seconds = 0.0
+        self._batch = []
+
+    def write(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records: Iterable):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        if self._batch:
+            started = time.perf_counter()
+            self._write_batch(self._batch)
+            self.write_seconds += time.perf_counter() - started
+            self.records_written += len(self._batch)
+            self._batch = []
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    @abc.abstractmethod
+    def _write_batch(self, records: list):
+        pass
+
+    @abc.abstractmethod
+    def _close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BaseExporter(abc.ABC):
+    """
+    Exporters either dump the whole sequence of records with
+    export_to_file or give a sink records may be streamed to.
+    """
+
+    EXTENSION = ''
+    # All the record types go to the same file
+    SINGLE_FILE = False
+
+    def __init__(self, batch_size: int=1000) -> None:
+        self.batch_size = batch_size
+
+    @abc.abstractmethod
+    def open(self, filename: str, **kwargs) -> BaseSink:
+        pass
+
+    def export_to_file(self, records: Iterable, filename: str, **kwargs):
+        with self.open(filename, **kwargs) as sink:
+            sink.write_many(records)
+
+
+def export_operations(exporter: BaseExporter,
+                      operations: Iterable,
+                      filenames: Dict[type, str],
+                      metrics=None,
+                      **kwargs) -> Dict[type, int]:
+    """
+    Route every operation to the sink of its type as soon as it comes,
+    returns number of records written per type. Types mapped to the
+    same file share the sink. Records and time spent writing them
+    are reported to metrics if given.
+    """
+    opened = {}
+    for filename in filenames.values():
+        if filename not in opened:
+            opened[filename] = exporter.open(filename, **kwargs)
+    sinks = {record_type: opened[filename]
+             for record_type, filename in filenames.items()}
+    counts = dict.fromkeys(filenames, 0)
+    try:
+        for operation in operations:
+            sinks[type(operation)].write(operation)
+            counts[type(operation)] += 1
+    finally:
+        for sink in opened.values():
+            sink.close()
+            if metrics is not None:
+                metrics.exported(sink.filename, sink.records_written,
+                                 sink.write_seconds)
+    return counts
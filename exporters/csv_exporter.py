@@ -1,25 +1,32 @@
 import csv
-import itertools
-import typing
-from collections import namedtuple
 
+from exporters.base import BaseExporter, BaseSink
+from operations import to_strings
 
-class CSVExporter(object):
 
-    @staticmethod
-    def export_to_file(costs: typing.Sequence[namedtuple],
-                       filename: str,
-                       **kwargs):
-        delimiter = kwargs.get('delimeter', ',')
+class CSVSink(BaseSink):
+
+    def __init__(self, filename: str, batch_size: int, delimiter: str=',') -> None:
+        super().__init__(filename, batch_size)
         # Description and title may contain commas
-        with open(filename, "w") as csv_f:
-            if not costs:
-                return
-            first = next(iter(costs))
-            writer = csv.writer(csv_f, delimiter=delimiter)
-            writer.writerow(first._fields)
-
-            for cost in itertools.chain([first], costs):
-                values = [getattr(cost, field)
-                          for field in first._fields]
-                writer.writerow(values)
+        self._file = open(filename, "w")
+        self._writer = csv.writer(self._file, delimiter=delimiter)
+        self._header_written = False
+
+    def _write_batch(self, records: list):
+        if not self._header_written:
+            self._writer.writerow(records[0]._fields)
+            self._header_written = True
+        self._writer.writerows(to_strings(record) for record in records)
+
+    def _close(self):
+        self._file.close()
+
+
+class CSVExporter(BaseExporter):
+
+    EXTENSION = '.csv'
+
+    def open(self, filename: str, **kwargs) -> CSVSink:
+        delimiter = kwargs.get('delimeter', ',')
+        return CSVSink(filename, self.batch_size, delimiter=delimiter)
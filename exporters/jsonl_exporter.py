@@ -0,0 +1,32 @@
+import json
+
+from exporters.base import BaseExporter, BaseSink
+from operations import to_strings
+
+
+class JSONLinesSink(BaseSink):
+
+    def __init__(self, filename: str, batch_size: int) -> None:
+        super().__init__(filename, batch_size)
+        self._file = open(filename, "w", encoding="utf-8")
+
+    def _write_batch(self, records: list):
+        fields = records[0]._fields
+        self._file.write(''.join(
+            json.dumps(dict(zip(fields, to_strings(record))),
+                       ensure_ascii=False, default=str) + '\n'
+            for record in records))
+
+    def _close(self):
+        self._file.close()
+
+
+class JSONLinesExporter(BaseExporter):
+    """
+    One JSON object per record and line.
+    """
+
+    EXTENSION = '.jsonl'
+
+    def open(self, filename: str, **kwargs) -> JSONLinesSink:
+        return JSONLinesSink(filename, self.batch_size)
@@ -0,0 +1,180 @@
+"""
+SQLite index of the exported operations.
+
+Costs and incomes go to the operations table, exchanges and
+account balances to their own tables. Values are kept as integer
+cents so the sums are exact, currencies as ISO codes so a label
+the site writes in a different case is not a currency of its own. Triggers maintain the monthly_rollup
+table with totals per kind, month, currency, category and
+account on every insert, so group-by questions at month level
+never scan the operations. Records with a known id replace
+the previous version and the rollup is adjusted.
+"""
+import sqlite3
+
+from amounts import currency_code, to_minor_units
+from exporters.base import BaseExporter, BaseSink
+import operations as ops
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    category TEXT,
+    budget TEXT,
+    currency TEXT,
+    value_cents INTEGER NOT NULL,
+    account TEXT,
+    date TEXT NOT NULL,
+    month TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS operations_date ON operations (date);
+CREATE INDEX IF NOT EXISTS operations_category ON operations (category);
+CREATE INDEX IF NOT EXISTS operations_account ON operations (account);
+CREATE INDEX IF NOT EXISTS operations_currency ON operations (currency);
+
+CREATE TABLE IF NOT EXISTS monthly_rollup (
+    kind TEXT NOT NULL,
+    month TEXT NOT NULL,
+    currency TEXT,
+    category TEXT,
+    account TEXT,
+    total_cents INTEGER NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, month, currency, category, account)
+);
+
+CREATE TRIGGER IF NOT EXISTS operations_rollup_insert
+AFTER INSERT ON operations
+BEGIN
+    -- no OR IGNORE: the conflict clause of the outer INSERT OR REPLACE
+    -- would override it and reset the row
+    INSERT INTO monthly_rollup (kind, month, currency, category, account)
+    SELECT NEW.kind, NEW.month, NEW.currency, NEW.category, NEW.account
+    WHERE NOT EXISTS (
+        SELECT 1 FROM monthly_rollup
+        WHERE kind = NEW.kind AND month = NEW.month AND currency = NEW.currency
+          AND category = NEW.category AND account = NEW.account);
+    UPDATE monthly_rollup
+    SET total_cents = total_cents + NEW.value_cents, count = count + 1
+    WHERE kind = NEW.kind AND month = NEW.month AND currency = NEW.currency
+      AND category = NEW.category AND account = NEW.account;
+END;
+
+CREATE TRIGGER IF NOT EXISTS operations_rollup_delete
+AFTER DELETE ON operations
+BEGIN
+    UPDATE monthly_rollup
+    SET total_cents = total_cents - OLD.value_cents, count = count - 1
+    WHERE kind = OLD.kind AND month = OLD.month AND currency = OLD.currency
+      AND category = OLD.category AND account = OLD.account;
+    DELETE FROM monthly_rollup
+    WHERE count = 0 AND kind = OLD.kind AND month = OLD.month
+      AND currency = OLD.currency AND category = OLD.category
+      AND account = OLD.account;
+END;
+
+CREATE TABLE IF NOT EXISTS exchanges (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    description TEXT,
+    budget TEXT,
+    currency TEXT,
+    value_cents INTEGER NOT NULL,
+    account_from TEXT,
+    account_to TEXT,
+    date TEXT NOT NULL,
+    month TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS exchanges_date ON exchanges (date);
+
+CREATE TABLE IF NOT EXISTS balances (
+    account_id TEXT NOT NULL,
+    account TEXT,
+    currency TEXT NOT NULL,
+    value_cents INTEGER NOT NULL,
+    PRIMARY KEY (account_id, currency)
+);
+"""
+
+KINDS = {
+    ops.Cost: 'cost',
+    ops.Income: 'income',
+}
+
+
+def connect(filename: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(filename)
+    # REPLACE deletes the previous version of the record,
+    # the rollup triggers have to see that deletion
+    connection.execute("PRAGMA recursive_triggers = ON")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class SQLiteSink(BaseSink):
+
+    def __init__(self, filename: str, batch_size: int) -> None:
+        super().__init__(filename, batch_size)
+        self._connection = connect(filename)
+
+    def _write_batch(self, records: list):
+        operations, exchanges, accounts, balances = [], [], [], []
+        for record in records:
+            if isinstance(record, ops.Exchange):
+                exchanges.append(self._exchange_row(record))
+            elif isinstance(record, ops.Account):
+                accounts.append((record.id,))
+                balances.extend((record.id, record.title, currency_code(balance.currency),
+                                 to_minor_units(balance.value))
+                                for balance in record.remnants)
+            else:
+                operations.append(self._operation_row(record))
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO operations VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", operations)
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO exchanges VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", exchanges)
+            # zero balances are not exported, drop the stale ones
+            self._connection.executemany(
+                "DELETE FROM balances WHERE account_id = ?", accounts)
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO balances VALUES (?, ?, ?, ?)", balances)
+
+    @staticmethod
+    def _operation_row(record) -> tuple:
+        date = record.date.isoformat()
+        return (KINDS[type(record)], record.id, record.title, record.description,
+                record.category, record.budget, currency_code(record.currency),
+                to_minor_units(record.value), record.account, date, date[:7])
+
+    @staticmethod
+    def _exchange_row(record: ops.Exchange) -> tuple:
+        date = record.date.isoformat()
+        return (record.id, record.title, record.description, record.budget,
+                currency_code(record.currency), to_minor_units(record.value), record.account_from,
+                record.account_to, date, date[:7])
+
+    def _close(self):
+        self._connection.close()
+
+
+class SQLiteExporter(BaseExporter):
+    """
+    All the record types are written into a single database.
+    """
+
+    EXTENSION = '.sqlite'
+    SINGLE_FILE = True
+
+    def __init__(self, batch_size: int=5000) -> None:
+        super().__init__(batch_size)
+
+    def open(self, filename: str, **kwargs) -> SQLiteSink:
+        return SQLiteSink(filename, self.batch_size)
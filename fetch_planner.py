@@ -0,0 +1,155 @@
+"""
+Planning of the list page requests.
+
+A month is requested as a whole until pages of the operation turn
+out to be heavy: then the following months are split into weeks
+or days using the same filtrDateStart/filtrDateEnd parameters, so
+no single request dominates the latency. Cost and income windows
+are handed out in turns.
+"""
+import datetime
+import itertools
+import threading
+
+from calendar import monthrange
+from collections import deque, namedtuple
+from typing import Iterable, List, Optional, Tuple
+
+import constants
+
+
+Shard = namedtuple("Shard", ["operation", "date_start", "date_end"])
+
+
+def split_month(operation: str, month: int, year: int,
+                window_days: int) -> List[Shard]:
+    __, days_count = monthrange(year, month)
+    return [Shard(operation,
+                  datetime.date(year, month, first_day),
+                  datetime.date(year, month, min(first_day + window_days - 1,
+                                                 days_count)))
+            for first_day in range(1, days_count + 1, window_days)]
+
+
+class FetchPlanner(object):
+    """
+    Thread safe source of the date windows to fetch, adapting the
+    window size to the observed rows density and response times.
+    With revalidate the pages are checked with the site even
+    when the page cache holds them as fresh.
+    """
+
+    WINDOW_DAYS = (31, 7, 1)
+    SMOOTHING = 0.5
+
+    def __init__(self,
+                 months: Iterable[Tuple[int, int]],
+                 operations: Tuple[str, ...]=(constants.COST_NAME,
+                                              constants.INCOME_NAME),
+                 max_rows: int=constants.DEFAULT_MAX_ROWS_PER_REQUEST,
+                 max_seconds: float=constants.DEFAULT_MAX_REQUEST_SECONDS,
+                 initial_window_days: int=None,
+                 revalidate: bool=False) -> None:
+        months = list(months)
+        self.revalidate = revalidate
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.initial_window_days = initial_window_days or self.WINDOW_DAYS[0]
+        self._pending = {op: deque(months) for op in operations}
+        self._ready = {op: deque() for op in operations}
+        self._turns = itertools.cycle(operations)
+        self._operations_count = len(operations)
+        self._rows_per_day = {}
+        self._seconds_per_row = {}
+        self._lock = threading.Lock()
+
+    def _window_days(self, operation: str) -> int:
+        rows_per_day = self._rows_per_day.get(operation)
+        if rows_per_day is None:
+            return self.initial_window_days
+        seconds_per_row = self._seconds_per_row.get(operation, 0)
+        for days in self.WINDOW_DAYS:
+            rows = rows_per_day * days
+            if rows <= self.max_rows and rows * seconds_per_row <= self.max_seconds:
+                return days
+        return self.WINDOW_DAYS[-1]
+
+    def next_shard(self) -> Optional[Shard]:
+        """
+        Next window to fetch, None when everything has been planned.
+        """
+        with self._lock:
+            for _ in range(self._operations_count):
+                operation = next(self._turns)
+                ready = self._ready[operation]
+                if not ready and self._pending[operation]:
+                    month, year = self._pending[operation].popleft()
+                    ready.extend(split_month(operation, month, year,
+                                             self._window_days(operation)))
+                if ready:
+                    return ready.popleft()
+            return None
+
+    def first_shards(self) -> List[Shard]:
+        """
+        One window of every operation, to be fetched before the rest.
+        """
+        shards = []
+        for _ in range(self._operations_count):
+            shard = self.next_shard()
+            if shard is not None:
+                shards.append(shard)
+        return shards
+
+    def record(self, shard: Shard, rows: int, seconds: float):
+        """
+        Feed the planner with the size and the response time of the window.
+        """
+        days = (shard.date_end - shard.date_start).days + 1
+        with self._lock:
+            self._rows_per_day[shard.operation] = self._smooth(
+                self._rows_per_day.get(shard.operation), rows / days)
+            if rows:
+                self._seconds_per_row[shard.operation] = self._smooth(
+                    self._seconds_per_row.get(shard.operation), seconds / rows)
+
+    def _smooth(self, previous: Optional[float], sample: float) -> float:
+        if previous is None:
+            return sample
+        return previous + self.SMOOTHING * (sample - previous)
+
+
+class ReplayPlanner(object):
+    """
+    Hands out the windows of the archived list pages. Windows an
+    earlier run fetched overlapping the ones of a later run are
+    left out, so every day is parsed from the latest page only.
+    """
+
+    revalidate = False
+
+    def __init__(self, shards: Iterable[Tuple[Shard, float]]) -> None:
+        """
+        shards are windows with the time their pages were fetched at.
+        """
+        covered = set()
+        selected = []
+        for shard, __ in sorted(shards, key=lambda s: -s[1]):
+            days = {(shard.operation, shard.date_start + datetime.timedelta(days=i))
+                    for i in range((shard.date_end - shard.date_start).days + 1)}
+            if covered.isdisjoint(days):
+                covered |= days
+                selected.append(shard)
+        selected.sort(key=lambda shard: (shard.date_start, shard.operation), reverse=True)
+        self._shards = deque(selected)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    def next_shard(self) -> Optional[Shard]:
+        with self._lock:
+            return self._shards.popleft() if self._shards else None
+
+    def record(self, shard: Shard, rows: int, seconds: float):
+        pass
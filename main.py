@@ -3,18 +3,43 @@
 import os
 import json
 import argparse
+import itertools
+import logging
+import sys
 
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
+import constants
 from exceptions import SettingsValidationError
-from parser import KoshelekParser
-from exporters import CSVExporter
+from session_store import SessionStore
+from exporters import EXPORTERS, BaseExporter, export_operations, get_exporter
+from metrics import Metrics, ProgressLine
+import operations as ops
 
+if TYPE_CHECKING:
+    from exchange_resolver import ExchangeResolver
+    from page_archive import ArchiveReader, PageArchive
+    from page_cache import PageCache
+    from parser import KoshelekParser
+    from process_parsing import ProcessPageParser
+    from profiler import SamplingProfiler
+    from request_scheduler import RequestScheduler
+
+# The parsers, the HTTP client and the HTML libraries are imported
+# only once an export starts, so --help and settings errors are fast.
+
+
+logger = logging.getLogger('koshelek.main')
 
 CSV_DELIMETER = ','
 
+THREADS_ENGINE, ASYNCIO_ENGINE = 'threads', 'asyncio'
+ENGINES = (THREADS_ENGINE, ASYNCIO_ENGINE)
+
 SETTINGS_FILE = "settings.json"
-SETTINGS = json.load(open(SETTINGS_FILE))
+DEFAULT_STORE_FILE = "operations_store.json"
+FIRST_SYNC_ERROR = "--sync needs the number of --months the first time, nothing is stored yet."
 
 
 def load_settings_from_file(filepath):
@@ -22,6 +47,23 @@ def load_settings_from_file(filepath):
         return json.load(settings_fh)
 
 
+def read_batch_settings(settings_file: str) -> List[dict]:
+    """
+    Users of the batch export: settings file with the list of
+    {"login": ..., "password": ..., "output_dir": ...} objects
+    under the "accounts" key, output_dir is optional.
+    """
+    if not os.path.isfile(settings_file):
+        raise SettingsValidationError("Incorrect batch settings path.")
+    settings = load_settings_from_file(settings_file)
+    users = settings.get("accounts") if isinstance(settings, dict) else None
+    if not users:
+        raise SettingsValidationError("Batch settings should list the accounts.")
+    for user in users:
+        validate_settings_dict(user)
+    return users
+
+
 def validate_settings_dict(settings_dict):
     """
     Check whether settings dict has all the required fields
@@ -47,12 +89,159 @@ def parse_args():
                             default=0,
                             type=int)
     arg_parser.add_argument('--threads', '-t',
-                            help='Number of threads to use.',
-                            default=2, type=int)
+                            help='Max number of threads to use, requests in flight '
+                                 'are adapted to the site response times below it.',
+                            default=16, type=int)
+    arg_parser.add_argument('--engine', '-e',
+                            help='Network engine: thread pools or asyncio event loop.',
+                            choices=ENGINES, default=THREADS_ENGINE)
+    arg_parser.add_argument('--concurrency', '-c',
+                            help='Max number of simultaneous requests of the asyncio engine.',
+                            default=constants.DEFAULT_ASYNC_CONCURRENCY, type=int)
+    arg_parser.add_argument('--max-retries',
+                            help='Number of retries of failed and throttled requests.',
+                            default=constants.DEFAULT_MAX_RETRIES, type=int)
+    arg_parser.add_argument('--rate-limit',
+                            help='Max number of requests per second, 0 for no limit.',
+                            default=0, type=float)
+    arg_parser.add_argument('--latency-target',
+                            help='Requests in flight are reduced once responses '
+                                 'get slower than this, seconds.',
+                            default=constants.DEFAULT_LATENCY_TARGET, type=float)
+    arg_parser.add_argument('--format', '-f',
+                            help='Output format of the exported operations.',
+                            choices=sorted(EXPORTERS), default='csv')
+    arg_parser.add_argument('--extractor',
+                            help='Engine extracting operation rows from the pages.',
+                            choices=sorted(constants.ROW_EXTRACTORS),
+                            default=constants.DEFAULT_ROW_EXTRACTOR)
+    arg_parser.add_argument('--parse-workers',
+                            help='Number of processes parsing the pages, '
+                                 '0 parses them in the network threads.',
+                            default=0, type=int)
+    arg_parser.add_argument('--parse-chunk-rows',
+                            help='Max number of rows sent to a parsing process at once.',
+                            default=constants.DEFAULT_PARSE_CHUNK_ROWS, type=int)
+    arg_parser.add_argument('--max-rows-per-request',
+                            help='Split months into weeks or days once pages get bigger.',
+                            default=constants.DEFAULT_MAX_ROWS_PER_REQUEST, type=int)
+    arg_parser.add_argument('--max-request-seconds',
+                            help='Split months into weeks or days once pages get slower.',
+                            default=constants.DEFAULT_MAX_REQUEST_SECONDS, type=float)
+    arg_parser.add_argument('--cache-dir',
+                            help='Directory of the persistent page cache and the stored logins.',
+                            default=constants.DEFAULT_CACHE_DIR)
+    arg_parser.add_argument('--cache-size',
+                            help='Max size of the page cache, megabytes.',
+                            default=constants.DEFAULT_CACHE_SIZE // (1024 * 1024),
+                            type=int)
+    arg_parser.add_argument('--no-cache',
+                            help='Always download pages, bypassing the page cache.',
+                            action='store_true')
+    arg_parser.add_argument('--clear-cache',
+                            help='Remove all cached pages before the export.',
+                            action='store_true')
+    arg_parser.add_argument('--exchange-cache',
+                            help='File keeping resolved exchange accounts between runs.',
+                            default=constants.DEFAULT_EXCHANGE_CACHE_FILE)
+    arg_parser.add_argument('--sync',
+                            help='Fetch only months changed since the last sync '
+                                 'and export operations from the local store.',
+                            action='store_true')
+    arg_parser.add_argument('--store',
+                            help='Path to the local operation store used by --sync.',
+                            default=DEFAULT_STORE_FILE)
+    arg_parser.add_argument('--dirty-window',
+                            help='Number of months before the sync checkpoint to fetch again.',
+                            default=1, type=int)
+    arg_parser.add_argument('--output-dir', '-o',
+                            help='Directory of the exported files, in the batch mode '
+                                 'every user gets a subdirectory named by the login.')
+    arg_parser.add_argument('--batch',
+                            help='Export all the users listed in this settings file.')
+    arg_parser.add_argument('--parallel-users',
+                            help='Number of users exported at the same time in the batch mode.',
+                            default=constants.DEFAULT_PARALLEL_USERS, type=int)
+    arg_parser.add_argument('--budget',
+                            help='Max number of requests in flight for all the users '
+                                 'of the batch together.',
+                            default=constants.DEFAULT_BATCH_BUDGET, type=int)
+    arg_parser.add_argument('--low-memory',
+                            help='Keep memory use bounded however many months are '
+                                 'exported: smaller pages and queues, rows go '
+                                 'to the output files in small batches, only the '
+                                 'recent exchange accounts and failed rows are kept.',
+                            action='store_true')
+    arg_parser.add_argument('--archive',
+                            help='Append every fetched page to this compressed '
+                                 'archive, to be parsed again with --replay.')
+    arg_parser.add_argument('--replay',
+                            help='Parse the pages of this archive instead of '
+                                 'fetching them, nothing is sent to the site. '
+                                 'All the archived months unless --months is given.')
+    arg_parser.add_argument('--report',
+                            help='Write JSON report with request, parsing and '
+                                 'export metrics of the run to this file.')
+    arg_parser.add_argument('--profile',
+                            help='Sample stacks of all the threads during the run and '
+                                 'write PROFILE.collapsed flame graph stacks by '
+                                 'pipeline stage and PROFILE.txt with the hottest '
+                                 'functions.')
+    arg_parser.add_argument('--profile-top',
+                            help='Number of the hottest functions in the profile summary.',
+                            default=constants.DEFAULT_PROFILE_TOP, type=int)
+    arg_parser.add_argument('--daemon',
+                            help='Keep running: sync the changed months into the local '
+                                 'store every --refresh-interval seconds and answer '
+                                 'queries about them over a local HTTP JSON API.',
+                            action='store_true')
+    arg_parser.add_argument('--host',
+                            help='Address the API of --daemon listens on.',
+                            default=constants.DEFAULT_DAEMON_HOST)
+    arg_parser.add_argument('--port',
+                            help='Port the API of --daemon listens on.',
+                            default=constants.DEFAULT_DAEMON_PORT, type=int)
+    arg_parser.add_argument('--refresh-interval',
+                            help='Seconds between the refreshes of --daemon.',
+                            default=constants.DEFAULT_REFRESH_INTERVAL, type=float)
+    arg_parser.add_argument('--progress',
+                            help='Show live progress line on stderr.',
+                            action='store_true')
     args = arg_parser.parse_args()
+    if args.low_memory and args.sync:
+        arg_parser.error("--low-memory can not be used with --sync, "
+                         "the local store is kept in memory.")
+    if args.archive and args.replay:
+        arg_parser.error("--archive can not be used with --replay.")
+    if (args.archive or args.replay) and args.engine != THREADS_ENGINE:
+        arg_parser.error("--archive and --replay work with the threads engine only.")
+    if args.replay and args.sync:
+        arg_parser.error("--replay can not be used with --sync, "
+                         "the sync checkpoint follows the site.")
+    if args.sync and not args.batch and not can_sync(args, args.output_dir or "."):
+        arg_parser.error(FIRST_SYNC_ERROR)
+    if args.daemon:
+        if args.batch or args.archive or args.replay or args.low_memory:
+            arg_parser.error("--daemon can not be used with --batch, --archive, "
+                             "--replay or --low-memory.")
+        if args.engine != THREADS_ENGINE:
+            arg_parser.error("--daemon works with the threads engine only.")
+        if args.months <= 0:
+            arg_parser.error("--daemon needs the number of --months to keep.")
     return args
 
 
+def store_path(cli_args, output_dir: str=".") -> str:
+    return os.path.join(output_dir, cli_args.store)
+
+
+def can_sync(cli_args, output_dir: str=".") -> bool:
+    """
+    The first sync has nothing to start from but the number of months.
+    """
+    return cli_args.months > 0 or os.path.exists(store_path(cli_args, output_dir))
+
+
 def read_settings(settings_file: str=SETTINGS_FILE):
     if not os.path.exists(settings_file) \
         or not os.path.isfile(settings_file):
@@ -79,29 +268,367 @@ def get_credentials(cli_args) -> Tuple[str, str]:
     return login, password
 
 
+def page_cache_dir(cli_args) -> str:
+    return os.path.join(cli_args.cache_dir, constants.PAGE_CACHE_DIR_NAME)
+
+
+def clear_page_cache(cli_args):
+    """
+    Drop the cached pages of all the users, once before
+    any export starts writing to the cache.
+    """
+    from page_cache import PageCache
+    PageCache(directory=page_cache_dir(cli_args)).clear()
+
+
+def create_page_cache(cli_args, login: str) -> 'PageCache':
+    if cli_args.replay or cli_args.no_cache:
+        return None
+    from page_cache import PageCache
+    return PageCache(directory=page_cache_dir(cli_args),
+                     max_size=cli_args.cache_size * 1024 * 1024,
+                     namespace=login)
+
+
+def create_session_store(cli_args) -> SessionStore:
+    if cli_args.no_cache or cli_args.replay:
+        return None
+    return SessionStore(os.path.join(cli_args.cache_dir, constants.SESSION_FILE_NAME))
+
+
+def create_exchange_resolver(cli_args, output_dir: str=".") -> 'ExchangeResolver':
+    from exchange_resolver import ExchangeResolver
+    path = None if cli_args.no_cache else os.path.join(output_dir,
+                                                       cli_args.exchange_cache)
+    if path and cli_args.clear_cache and os.path.exists(path):
+        os.remove(path)
+    max_entries = constants.LOW_MEMORY_EXCHANGE_MEMO if cli_args.low_memory else None
+    return ExchangeResolver(path=path, max_entries=max_entries)
+
+
+def create_page_parser(cli_args) -> 'ProcessPageParser':
+    if cli_args.parse_workers <= 0:
+        return None
+    from process_parsing import ProcessPageParser
+    return ProcessPageParser(workers=cli_args.parse_workers,
+                             rows_per_chunk=cli_args.parse_chunk_rows,
+                             extractor_name=cli_args.extractor)
+
+
+def create_page_archive(cli_args, output_dir: str=".") -> 'PageArchive':
+    if not cli_args.archive:
+        return None
+    from page_archive import PageArchive
+    return PageArchive(os.path.join(output_dir, cli_args.archive))
+
+
+def open_replay_archive(cli_args, output_dir: str=".") -> 'ArchiveReader':
+    if not cli_args.replay:
+        return None
+    from page_archive import ArchiveReader
+    return ArchiveReader(os.path.join(output_dir, cli_args.replay))
+
+
+def get_output_filenames(exporter: BaseExporter,
+                         output_dir: str=".") -> Dict[type, str]:
+    if exporter.SINGLE_FILE:
+        filename = os.path.join(output_dir, constants.SINGLE_FILE_NAME + exporter.EXTENSION)
+        return dict.fromkeys((ops.Cost, ops.Income, ops.Exchange), filename)
+    return {
+        ops.Cost: os.path.join(output_dir, "all_costs" + exporter.EXTENSION),
+        ops.Income: os.path.join(output_dir, "all_incomes" + exporter.EXTENSION),
+        ops.Exchange: os.path.join(output_dir, "all_exchanges" + exporter.EXTENSION),
+    }
+
+
+def create_scheduler(cli_args, metrics: Metrics=None,
+                     max_concurrency: int=None) -> 'RequestScheduler':
+    from request_scheduler import AdaptiveLimit, RequestScheduler
+    if not max_concurrency:
+        max_concurrency = (cli_args.concurrency if cli_args.engine == ASYNCIO_ENGINE
+                           else cli_args.threads)
+    limit = AdaptiveLimit(maximum=max_concurrency,
+                          latency_target=cli_args.latency_target)
+    return RequestScheduler(max_retries=cli_args.max_retries,
+                            rate=cli_args.rate_limit,
+                            limit=limit,
+                            metrics=metrics)
+
+
+def create_parser(cli_args, login: str, password: str,
+                  exporter: BaseExporter,
+                  metrics: Metrics=None,
+                  scheduler: 'RequestScheduler'=None,
+                  session_store: SessionStore=None,
+                  output_dir: str=".",
+                  archive: 'PageArchive'=None,
+                  replay: 'ArchiveReader'=None) -> 'KoshelekParser':
+    from row_extractors import get_row_extractor
+    cache = create_page_cache(cli_args, login)
+    resolver = create_exchange_resolver(cli_args, output_dir)
+    page_parser = create_page_parser(cli_args)
+    scheduler = scheduler or create_scheduler(cli_args, metrics)
+    if cli_args.engine == ASYNCIO_ENGINE:
+        from async_parser import AsyncKoshelekParser
+        return AsyncKoshelekParser(username=login,
+                                   password=password,
+                                   exporter=exporter,
+                                   concurrency=cli_args.concurrency,
+                                   page_cache=cache,
+                                   exchange_resolver=resolver,
+                                   row_extractor=get_row_extractor(cli_args.extractor),
+                                   page_parser=page_parser,
+                                   max_rows_per_request=cli_args.max_rows_per_request,
+                                   max_request_seconds=cli_args.max_request_seconds,
+                                   metrics=metrics,
+                                   scheduler=scheduler,
+                                   session_store=session_store,
+                                   low_memory=cli_args.low_memory)
+    from parser import KoshelekParser
+    return KoshelekParser(username=login,
+                          password=password,
+                          exporter=exporter,
+                          threads=cli_args.threads,
+                          page_cache=cache,
+                          exchange_resolver=resolver,
+                          row_extractor=get_row_extractor(cli_args.extractor),
+                          page_parser=page_parser,
+                          max_rows_per_request=cli_args.max_rows_per_request,
+                          max_request_seconds=cli_args.max_request_seconds,
+                          metrics=metrics,
+                          scheduler=scheduler,
+                          session_store=session_store,
+                          low_memory=cli_args.low_memory,
+                          archive=archive,
+                          replay=replay)
+
+
+def export_account(cli_args, login: str, password: str,
+                   output_dir: str=".",
+                   scheduler: 'RequestScheduler'=None,
+                   session_store: SessionStore=None,
+                   progress: bool=False) -> List[Tuple[int, int]]:
+    """
+    Export operations and accounts of the user into output_dir,
+    returns months whose operations are incomplete.
+    """
+    if cli_args.sync and not can_sync(cli_args, output_dir):
+        # checked before the login, the batch users have their own stores
+        raise ValueError(FIRST_SYNC_ERROR)
+    os.makedirs(output_dir, exist_ok=True)
+    if cli_args.low_memory:
+        exporter = get_exporter(cli_args.format,
+                                batch_size=constants.LOW_MEMORY_BATCH_SIZE)
+    else:
+        exporter = get_exporter(cli_args.format)
+    metrics = Metrics()
+    metrics.info.update(engine=cli_args.engine, threads=cli_args.threads,
+                        concurrency=cli_args.concurrency, months=cli_args.months,
+                        format=cli_args.format, extractor=cli_args.extractor,
+                        parse_workers=cli_args.parse_workers,
+                        low_memory=cli_args.low_memory,
+                        replay=bool(cli_args.replay))
+    archive = create_page_archive(cli_args, output_dir)
+    replay = open_replay_archive(cli_args, output_dir)
+    progress_line = ProgressLine(metrics).start() if progress else None
+    parser = create_parser(cli_args, login, password, exporter, metrics,
+                           scheduler=scheduler,
+                           session_store=session_store,
+                           output_dir=output_dir,
+                           archive=archive,
+                           replay=replay)
+    try:
+        accounts = parser.get_accounts()
+        if cli_args.sync:
+            from operation_store import OperationStore, sync_operations
+            store = OperationStore(store_path(cli_args, output_dir))
+            sync_operations(parser, store,
+                            months=cli_args.months,
+                            dirty_window=cli_args.dirty_window)
+            operations = itertools.chain(store.costs, store.incomes,
+                                         store.exchanges)
+        else:
+            operations = parser.iter_operations(months=cli_args.months)
+        export_operations(exporter, operations,
+                          get_output_filenames(exporter, output_dir),
+                          metrics=metrics,
+                          delimeter=CSV_DELIMETER)
+    finally:
+        parser.close()
+        for pages in (archive, replay):
+            if pages is not None:
+                pages.close()
+        if progress_line is not None:
+            progress_line.stop()
+    if archive is not None:
+        logger.info("Archived %(pages)d pages, %(stored)d of them new or changed "
+                    "(%(stored_bytes)d bytes).", archive.stats())
+    parser.exchange_resolver.save()
+    logger.info("Exchange accounts: %(fetched)d forms fetched, "
+                "%(fetches_avoided)d fetches avoided "
+                "(%(memo_hits)d cached, %(inferred)d inferred).",
+                parser.exchange_resolver.stats())
+
+    accounts_name = constants.SINGLE_FILE_NAME if exporter.SINGLE_FILE else "all_accounts"
+    parser.export_to_file(accounts,
+                          os.path.join(output_dir, accounts_name + exporter.EXTENSION),
+                          delimeter=CSV_DELIMETER)
+
+    failed_months = parser.failed_months()
+    if cli_args.report:
+        report_path = os.path.join(output_dir, cli_args.report)
+        metrics.info['failed_months'] = ["{}.{}".format(*m) for m in failed_months]
+        metrics.info['exchange_resolver'] = parser.exchange_resolver.stats()
+        if archive is not None:
+            metrics.info['page_archive'] = archive.stats()
+        if parser._page_cache is not None:
+            metrics.info['page_cache'] = {
+                'hits': parser._page_cache.hits,
+                'revalidations': parser._page_cache.revalidations,
+                'misses': parser._page_cache.misses,
+            }
+        metrics.write_report(report_path)
+        logger.info("Run report written to %s.", report_path)
+    return failed_months
+
+
+def user_output_dir(output_dir: str, login: str) -> str:
+    safe_login = "".join(c if c.isalnum() or c in "-_.@" else "_" for c in login)
+    return os.path.join(output_dir, safe_login.lstrip(".") or "_")
+
+
+def run_batch(cli_args) -> Dict[str, list]:
+    """
+    Export all the users of the batch settings file, a few at
+    a time, sharing the request budget and the stored sessions.
+    Returns problems per login: incomplete months or the error.
+    """
+    users = read_batch_settings(cli_args.batch)
+    output_dir = cli_args.output_dir or constants.DEFAULT_BATCH_OUTPUT_DIR
+    scheduler = create_scheduler(cli_args, max_concurrency=cli_args.budget)
+    session_store = create_session_store(cli_args)
+    logger.info("Exporting %d users, %d at a time.", len(users), cli_args.parallel_users)
+
+    def export_user(user):
+        login = user["login"]
+        user_dir = user.get("output_dir") or user_output_dir(output_dir, login)
+        return export_account(cli_args, login, user["password"], user_dir,
+                              scheduler=scheduler,
+                              session_store=session_store)
+
+    problems = {}
+    with ThreadPoolExecutor(max_workers=cli_args.parallel_users,
+                            thread_name_prefix='user-') as users_pool:
+        futures = {users_pool.submit(export_user, user): user["login"]
+                   for user in users}
+        for future in as_completed(futures):
+            login = futures[future]
+            try:
+                failed_months = future.result()
+            except Exception as exc:
+                logger.exception("Export of %s failed.", login)
+                problems[login] = [str(exc)]
+                continue
+            if failed_months:
+                problems[login] = ["{}.{}".format(*m) for m in failed_months]
+            logger.info("Export of %s completed.", login)
+    return problems
+
+
+def run_daemon(cli_args, login: str, password: str):
+    """
+    Serve the operations of the user until interrupted,
+    refreshing them in the background.
+    """
+    from operation_store import OperationStore
+    from export_daemon import ExportDaemon, create_api_server
+    output_dir = cli_args.output_dir or "."
+    os.makedirs(output_dir, exist_ok=True)
+    metrics = Metrics()
+    session_store = create_session_store(cli_args)
+
+    def create_daemon_parser():
+        return create_parser(cli_args, login, password, None, metrics,
+                             session_store=session_store,
+                             output_dir=output_dir)
+
+    daemon = ExportDaemon(create_daemon_parser,
+                          OperationStore(store_path(cli_args, output_dir)),
+                          months=cli_args.months,
+                          dirty_window=cli_args.dirty_window,
+                          refresh_interval=cli_args.refresh_interval,
+                          metrics=metrics)
+    server = create_api_server(daemon, cli_args.host, cli_args.port)
+    daemon.start()
+    logger.info("Serving operations of %s on http://%s:%d/, refreshing every %.0f s.",
+                login, cli_args.host, server.server_address[1],
+                cli_args.refresh_interval)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping, waiting for the refresh in progress.")
+    finally:
+        server.server_close()
+        daemon.stop()
+
+
+def write_profile(profiler: 'SamplingProfiler', cli_args):
+    prefix = os.path.join(cli_args.output_dir or ".", cli_args.profile)
+    os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+    paths = profiler.write(prefix, top=cli_args.profile_top)
+    logger.info("Profile written to %s and %s.\n%s", paths[0], paths[1],
+                profiler.summary(top=cli_args.profile_top))
+
+
 def main():
     args = parse_args()
+    logging.basicConfig(level=logging.INFO)
 
-    login, password = get_credentials(args)
+    if not args.profile:
+        run(args)
+        return
+    from profiler import SamplingProfiler
+    profiler = SamplingProfiler().start()
+    try:
+        run(args)
+    finally:
+        profiler.stop()
+        write_profile(profiler, args)
 
-    if not login or not password:
+
+def run(args):
+    if args.clear_cache and not args.replay:
+        clear_page_cache(args)
+
+    if args.batch:
+        problems = run_batch(args)
+        for login, details in sorted(problems.items()):
+            logger.error("%s: %s", login, ", ".join(details))
+        if problems:
+            sys.exit(1)
+        return
+
+    if args.replay:
+        # the archived pages are parsed without logging in
+        login, password = args.login or "", ""
+    else:
+        login, password = get_credentials(args)
+
+    if not args.replay and (not login or not password):
         msg = "Either login/password should be specified or settings file."
         raise ValueError(msg)
 
-    parser = KoshelekParser(username=login,
-                            password=password,
-                            exporter=CSVExporter(),
-                            threads=args.threads)
+    if args.daemon:
+        run_daemon(args, login, password)
+        return
 
-    accounts = parser.get_accounts()
-    costs, incomes, exchanges = parser.get_operations_for_months(months=args.months)
-
-    parser.export_to_file(costs, "all_costs.csv",
-                          delimeter=CSV_DELIMETER)
-    parser.export_to_file(incomes, "all_incomes.csv",
-                          delimeter=CSV_DELIMETER)
-    parser.export_to_file(accounts, "all_accounts.csv",
-                          delimeter=CSV_DELIMETER)
+    failed_months = export_account(args, login, password,
+                                   args.output_dir or ".",
+                                   session_store=create_session_store(args),
+                                   progress=args.progress)
+    if failed_months:
+        logger.error("Exported operations are incomplete, see errors above.")
+        sys.exit(1)
 
 
 if __name__ == '__main__':
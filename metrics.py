@@ -0,0 +1,284 @@
+"""
+Run metrics: request counters, latency and parse time
+histograms, queue depths and exporter throughput.
+
+Metrics are collected for every run and are cheap enough
+to stay on: a counter is a dict update under a lock.
+The report is a plain dict ready to be dumped as JSON.
+"""
+import json
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import constants
+
+
+LIST_PAGE, EDIT_FORM = 'list_page', 'edit_form'
+ACCOUNTS_PAGE, ACCOUNT_DETAILS, BALANCE_PROBE = 'accounts_page', 'account_details', 'balance_probe'
+LOGIN, OTHER = 'login', 'other'
+
+
+def url_kind(url: str) -> str:
+    """
+    Kind of the site page the URL points to.
+    >>> url_kind('https://koshelek.org/costs?filtrDateStart=01.03.2015')
+    'list_page'
+    """
+    path = urlparse(url).path.rstrip('/')
+    if constants.URL_PART_BEFORE_ID in path:
+        return EDIT_FORM
+    if path in ('/costs', '/income'):
+        return LIST_PAGE
+    if path == '/accounts/remainder_currency':
+        return BALANCE_PROBE
+    if path.startswith('/accounts/'):
+        return ACCOUNT_DETAILS
+    if path == '/accounts':
+        return ACCOUNTS_PAGE
+    if path in ('', '/login'):
+        return LOGIN
+    return OTHER
+
+
+class Histogram(object):
+    """
+    Fixed buckets from 10 microseconds to 10 seconds,
+    quantiles are estimated by the bucket upper bounds.
+    """
+
+    BOUNDS = tuple(base * 10 ** exp
+                   for exp in range(-5, 1)
+                   for base in (1, 2.5, 5)) + (10.0, float('inf'))
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(self.BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.BOUNDS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'mean': round(self.total / self.count, 6) if self.count else 0.0,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): count
+                        for bound, count in zip(self.BOUNDS, self.counts)
+                        if count},
+        }
+
+
+class Gauge(object):
+
+    def __init__(self) -> None:
+        self.last = 0
+        self.max = 0
+        self.samples = 0
+        self.total = 0
+
+    def set(self, value):
+        self.last = value
+        self.max = max(self.max, value)
+        self.samples += 1
+        self.total += value
+
+    def to_dict(self) -> dict:
+        return {
+            'last': self.last,
+            'max': self.max,
+            'mean': round(self.total / self.samples, 3) if self.samples else 0,
+        }
+
+
+class Metrics(object):
+    """
+    Thread safe registry of the run metrics.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.info = {}
+        self._started = time.monotonic()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._requests = {}
+        self._exports = {}
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def incr(self, name: str, value: int=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def counter(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def gauge(self, name: str, value):
+        with self._lock:
+            gauge = self._gauges.get(name)
+            if gauge is None:
+                gauge = self._gauges[name] = Gauge()
+            gauge.set(value)
+
+    def request(self, url: str, seconds: float, size: int, status: int):
+        """
+        Account a finished HTTP request.
+        """
+        kind = url_kind(url)
+        with self._lock:
+            stats = self._requests.get(kind)
+            if stats is None:
+                stats = self._requests[kind] = {'count': 0, 'errors': 0,
+                                                'bytes': 0, 'latency': Histogram()}
+            stats['count'] += 1
+            stats['errors'] += status >= 400
+            stats['bytes'] += size
+            stats['latency'].observe(seconds)
+
+    def response_hook(self, response, *args, **kwargs):
+        """
+        requests session hook: session.hooks['response'].append(metrics.response_hook)
+        """
+        self.request(response.url, response.elapsed.total_seconds(),
+                     len(response.content), response.status_code)
+
+    def exported(self, name: str, records: int, seconds: float):
+        with self._lock:
+            stats = self._exports.setdefault(name, {'records': 0, 'seconds': 0.0})
+            stats['records'] += records
+            stats['seconds'] += seconds
+
+    def totals(self) -> dict:
+        with self._lock:
+            return {
+                'requests': sum(s['count'] for s in self._requests.values()),
+                'bytes': sum(s['bytes'] for s in self._requests.values()),
+                'operations': self._counters.get('operations', 0),
+                'gauges': {name: gauge.last for name, gauge in self._gauges.items()},
+            }
+
+    def report(self) -> dict:
+        elapsed = self.elapsed
+        with self._lock:
+            requests = {kind: dict(stats, latency=stats['latency'].to_dict())
+                        for kind, stats in self._requests.items()}
+            exports = {name: dict(stats,
+                                  records_per_second=round(stats['records'] / stats['seconds'])
+                                  if stats['seconds'] else None)
+                       for name, stats in self._exports.items()}
+            return {
+                'started': self.started,
+                'duration_seconds': round(elapsed, 3),
+                'info': dict(self.info),
+                'requests': requests,
+                'counters': dict(self._counters),
+                'timings': {name: histogram.to_dict()
+                            for name, histogram in self._histograms.items()},
+                'queues': {name: gauge.to_dict()
+                           for name, gauge in self._gauges.items()},
+                'exporters': exports,
+            }
+
+    def write_report(self, path: str):
+        with open(path, 'w', encoding='utf-8') as report_fh:
+            json.dump(self.report(), report_fh, indent=2, ensure_ascii=False)
+
+
+class ProgressLine(object):
+    """
+    Background thread redrawing a one line summary of the run.
+    """
+
+    def __init__(self, metrics: Metrics,
+                 interval: float=1.0,
+                 stream=None) -> None:
+        self.metrics = metrics
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='progress',
+                                        daemon=True)
+
+    def format(self) -> str:
+        totals = self.metrics.totals()
+        elapsed = self.metrics.elapsed
+        queues = ' '.join('{}={}'.format(name, depth)
+                          for name, depth in sorted(totals['gauges'].items()))
+        return ("{elapsed:6.1f}s requests: {requests} ({rate:.1f}/s) "
+                "{mb:.1f} MB operations: {operations} {queues}"
+                .format(elapsed=elapsed,
+                        requests=totals['requests'],
+                        rate=totals['requests'] / elapsed if elapsed else 0,
+                        mb=totals['bytes'] / (1024 * 1024),
+                        operations=totals['operations'],
+                        queues=queues))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.stream.write('\r' + self.format())
+            self.stream.flush()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.stream.write('\r' + self.format() + '\n')
+        self.stream.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,234 @@
+"""
+Local store of the exported operations used by the incremental sync.
+
+Operations are kept in a JSON file keyed by their type and id
+along with the checkpoint: the last month that has been closed
+and fully synced, and the oldest synced month. Later runs only
+fetch months after the checkpoint plus a "dirty window" of recent
+months that may still be edited on the site, checking their pages
+with the site even when they are cached, and the months before
+the oldest synced one when more months are asked for. Months
+fetched without failures replace the stored ones, so operations
+deleted on the site leave the store as well.
+"""
+import datetime
+import itertools
+import json
+import logging
+import os
+
+from collections import namedtuple
+from typing import Iterable, List, Optional, Tuple
+
+import operations as ops
+
+
+logger = logging.getLogger('koshelek.store')
+
+SyncResult = namedtuple("SyncResult", ["months", "inserted", "updated", "deleted"])
+
+
+class OperationStore(object):
+
+    KINDS = {
+        'cost': ops.Cost,
+        'income': ops.Income,
+        'exchange': ops.Exchange,
+    }
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.checkpoint = None
+        self.oldest = None
+        self._operations = {kind: {} for kind in self.KINDS}
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, encoding='utf-8') as store_fh:
+            data = json.load(store_fh)
+        checkpoint = data.get('checkpoint')
+        self.checkpoint = tuple(checkpoint) if checkpoint else None
+        for kind, operation_cls in self.KINDS.items():
+            self._operations[kind] = {
+                op_id: operation_cls(**fields)
+                for op_id, fields in data['operations'].get(kind, {}).items()
+            }
+        oldest = data.get('oldest')
+        if oldest:
+            self.oldest = tuple(oldest)
+        elif self.checkpoint:
+            # stores written before the oldest month was kept
+            dates = [op.date for op in itertools.chain(*(
+                operations.values() for operations in self._operations.values()))]
+            self.oldest = (min(dates).month, min(dates).year) if dates else None
+
+    def save(self):
+        data = {
+            'checkpoint': self.checkpoint,
+            'oldest': self.oldest,
+            'operations': {
+                kind: {op_id: dict(zip(op._fields, ops.to_strings(op)))
+                       for op_id, op in operations.items()}
+                for kind, operations in self._operations.items()
+            },
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as store_fh:
+            json.dump(data, store_fh, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _kind_of(self, operation: ops.Operation) -> str:
+        for kind, operation_cls in self.KINDS.items():
+            if isinstance(operation, operation_cls):
+                return kind
+        raise ValueError("Unknown operation type: {}".format(type(operation)))
+
+    def upsert(self, operations: Iterable[ops.Operation],
+               seen: set=None) -> Tuple[int, int]:
+        """
+        Insert new operations and replace the stored ones with the same id.
+        Returns number of inserted and updated operations, kinds
+        and ids of all the operations are added to seen if given.
+        """
+        inserted, updated = 0, 0
+        for operation in operations:
+            kind = self._kind_of(operation)
+            if seen is not None:
+                seen.add((kind, operation.id))
+            stored = self._operations[kind]
+            if operation.id in stored:
+                updated += stored[operation.id] != operation
+            else:
+                inserted += 1
+            stored[operation.id] = operation
+        return inserted, updated
+
+    def remove_missing(self, seen: set, months: Iterable[Tuple[int, int]]) -> int:
+        """
+        Remove the operations of the given months that are not
+        in seen, those have been deleted on the site.
+        Returns number of removed operations.
+        """
+        months = set(months)
+        removed = 0
+        for kind, stored in self._operations.items():
+            missing = [op_id for op_id, operation in stored.items()
+                       if (operation.date.month, operation.date.year) in months and
+                       (kind, op_id) not in seen]
+            for op_id in missing:
+                del stored[op_id]
+            removed += len(missing)
+        return removed
+
+    def operations(self, kind: str) -> List[ops.Operation]:
+        return list(self._operations[kind].values())
+
+    @property
+    def costs(self) -> List[ops.Cost]:
+        return self.operations('cost')
+
+    @property
+    def incomes(self) -> List[ops.Income]:
+        return self.operations('income')
+
+    @property
+    def exchanges(self) -> List[ops.Exchange]:
+        return self.operations('exchange')
+
+
+def previous_month(month: int, year: int) -> Tuple[int, int]:
+    if month == 1:
+        return 12, year - 1
+    return month - 1, year
+
+
+def last_closed_month(now: datetime.datetime) -> Tuple[int, int]:
+    return previous_month(now.month, now.year)
+
+
+def months_to_sync(checkpoint: Optional[Tuple[int, int]],
+                   now: datetime.datetime,
+                   dirty_window: int,
+                   months: int) -> int:
+    """
+    Number of months from the current one to be fetched: all the months
+    after the checkpoint plus the dirty window, or the requested number
+    of months when nothing has been synced yet.
+    """
+    if checkpoint is None:
+        return months
+    month, year = checkpoint
+    since_checkpoint = (now.year - year) * 12 + now.month - month
+    return max(since_checkpoint, 1) + dirty_window
+
+
+def month_index(month: int, year: int) -> int:
+    return year * 12 + month - 1
+
+
+def month_of_index(index: int) -> Tuple[int, int]:
+    return index % 12 + 1, index // 12
+
+
+def sync_operations(parser,
+                    store: OperationStore,
+                    now: datetime.datetime=None,
+                    months: int=1,
+                    dirty_window: int=1) -> SyncResult:
+    """
+    Fetch operations of the months that may have changed since
+    the last sync, and of the months before the oldest synced one
+    up to the requested number of months, merge them into the store
+    and move the checkpoint. The checkpoint never passes a month
+    that failed to sync, nor does the oldest synced month, so they
+    are fetched again next time. Operations missing from the months
+    synced without failures are removed from the store.
+    """
+    if store.checkpoint is None and months <= 0:
+        raise ValueError("Nothing has been synced yet, the number "
+                         "of months to sync should be given.")
+    now = now or datetime.datetime.now()
+    current = month_index(now.month, now.year)
+    recent = months_to_sync(store.checkpoint, now, dirty_window, months)
+    synced_oldest = (month_index(*store.oldest) if store.oldest
+                     else current - recent + 1)
+    oldest = min(current - months + 1, synced_oldest)
+    # the recent months are never backfilled twice
+    skip = max(current - synced_oldest + 1, recent)
+    logger.info("Syncing %d month(s), checkpoint: %s",
+                recent, store.checkpoint)
+    # edits of the dirty window months are only seen if
+    # their cached pages are checked with the site
+    operations = parser.iter_operations(now=now, months=recent, revalidate=True)
+    older = max(current - oldest + 1 - skip, 0)
+    if older:
+        logger.info("Syncing %d older month(s), oldest synced: %s",
+                    older, store.oldest)
+        operations = itertools.chain(operations, parser.iter_operations(
+            now=now, months=current - oldest + 1, skip=skip))
+    seen = set()
+    inserted, updated = store.upsert(operations, seen)
+
+    failed = {month_index(*month_year) for month_year in parser.failed_months()}
+    fetched = itertools.chain(range(current - recent + 1, current + 1),
+                              range(oldest, oldest + older))
+    deleted = store.remove_missing(seen, (month_of_index(index) for index in fetched
+                                          if index not in failed))
+    recent_failed = [index for index in failed if index > current - recent]
+    older_failed = [index for index in failed if index <= current - recent]
+    checkpoint = month_index(*last_closed_month(now))
+    if recent_failed:
+        checkpoint = min(checkpoint, min(recent_failed) - 1)
+        logger.warning("Checkpoint is held at %d.%d due to failed months.",
+                       *month_of_index(checkpoint))
+    if older_failed:
+        oldest = max(older_failed) + 1
+        logger.warning("Oldest synced month is held at %d.%d due to failed months.",
+                       *month_of_index(oldest))
+    store.checkpoint = month_of_index(checkpoint)
+    store.oldest = month_of_index(oldest)
+    store.save()
+    logger.info("Sync completed: %d inserted, %d updated, %d deleted.",
+                inserted, updated, deleted)
+    return SyncResult(recent + older, inserted, updated, deleted)
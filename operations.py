@@ -1,19 +1,105 @@
+import datetime
+import sys
+
 from collections import namedtuple
+from decimal import Decimal
 from typing import List, Union
 
+import constants
+
+
+def to_decimal(value) -> Decimal:
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(value)
+
+
+def to_date(value) -> datetime.date:
+    """
+    Convert date in the site format (dd.mm.yyyy)
+    >>> to_date('31.03.2015')
+    >>> datetime.date(2015, 3, 31)
+    """
+    if isinstance(value, datetime.date):
+        return value
+    if len(value) == 10 and value[2] == value[5] == '.':
+        return datetime.date(int(value[6:]), int(value[3:5]), int(value[:2]))
+    return datetime.datetime.strptime(value, constants.DATE_FORMAT).date()
+
+
+def format_field(value):
+    """
+    Turn typed field back into the form it had on the site.
+    """
+    if isinstance(value, datetime.date):
+        return value.strftime(constants.DATE_FORMAT)
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def to_strings(record) -> list:
+    return [format_field(value) for value in record]
+
+
+class _TypedOperation(object):
+    """
+    Operation fields are converted once on creation:
+    value to Decimal, date to datetime.date, while
+    repeated labels such as category, account and
+    currency are interned and shared between records.
+    """
+    __slots__ = ()
+
+    INTERNED_FIELDS = frozenset(("category", "budget", "currency",
+                                 "account", "account_from", "account_to"))
+    CONVERTERS = {
+        "value": to_decimal,
+        "date": to_date,
+    }
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_converters = tuple(
+            cls.CONVERTERS.get(field) or
+            (sys.intern if field in cls.INTERNED_FIELDS else str)
+            for field in cls._fields)
+
+    def __new__(cls, *args, **kwargs):
+        record = super().__new__(cls, *args, **kwargs)
+        return tuple.__new__(cls, [convert(value)
+                                   for convert, value in zip(cls._field_converters, record)])
+
+    @classmethod
+    def _make(cls, iterable):
+        return cls(*iterable)
+
+
+class Cost(_TypedOperation,
+           namedtuple("Cost",
+                      ["id", "title", "description", "category",
+                       "budget", "currency", "value", "account", "date"])):
+    __slots__ = ()
+
+
+class Income(_TypedOperation,
+             namedtuple("Income",
+                        ["id", "title", "description", "category",
+                         "budget", "currency", "value", "account", "date"])):
+    __slots__ = ()
+
+
+class Exchange(_TypedOperation,
+               namedtuple("Exchange",
+                          ["id", "title", "description", "budget", "currency",
+                           "value", "account_from", "account_to", "date"])):
+    __slots__ = ()
+
 
-Cost = namedtuple("Cost",
-                  ["id", "title", "description", "category",
-                   "budget", "currency", "value", "account", "date"])
-Income = namedtuple("Income",
-                    ["id", "title", "description", "category",
-                     "budget", "currency", "value", "account", "date"])
-Exchange = namedtuple("Exchange",
-                      ["id", "title", "description", "budget", "currency",
-                       "value", "account_from", "account_to", "date"])
 Account = namedtuple("Account",
                      ["id", "title", "remnants"])
 Balance = namedtuple("Balance",
                      ["currency", "value"])
 
+Operation = Union[Income, Cost, Exchange]
 Operations = List[Union[Income, Cost]]
@@ -0,0 +1,209 @@
+"""
+Archive of the raw pages fetched from the site and the offline
+replay of an export from it.
+
+Every list page, editorial form and account page is appended
+zlib compressed to the pack file, the index next to it has one
+JSON line per page: the key, which is the path and the sorted
+query of the URL, with the offset and size of the compressed
+body. A page fetched again with the same body is not stored
+twice, a changed one is appended and its index line shadows
+the previous one.
+
+Replaying reads the pack through mmap, bodies are decompressed
+straight out of the mapped file when the page is requested.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+
+from collections import namedtuple
+from typing import Iterator, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import zlib
+
+import requests
+from requests.hooks import dispatch_hook
+
+from request_scheduler import RequestFailed
+
+
+logger = logging.getLogger('koshelek.page_archive')
+
+INDEX_SUFFIX = '.idx'
+COMPRESSION_LEVEL = 6
+
+ArchivedPage = namedtuple("ArchivedPage", ["key", "offset", "size", "encoding",
+                                           "digest", "fetched_at"])
+
+
+def archive_key(url: str) -> str:
+    """
+    Key of the page, the same whatever the site address
+    and the order of the query parameters.
+    """
+    parts = urlsplit(url)
+    params = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    return parts.path + ('?' + urlencode(params) if params else '')
+
+
+def read_index(path: str) -> Iterator[ArchivedPage]:
+    """
+    Pages of the index in the order they were archived,
+    the line torn by an interrupted run is skipped.
+    """
+    try:
+        index_fh = open(path, encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with index_fh:
+        for line in index_fh:
+            try:
+                yield ArchivedPage(**json.loads(line))
+            except (ValueError, TypeError):
+                logger.warning("Skipping broken line of the archive index %s.", path)
+
+
+class PageArchive(object):
+    """
+    Append only writer of the pack file, shared by all the
+    threads of an export. Only one export may write to the
+    archive at a time.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.pages = 0
+        self.stored = 0
+        self.stored_bytes = 0
+        self._digests = {page.key: page.digest for page in read_index(self.index_path)}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._drop_torn_index_line()
+        self._pack = open(path, 'ab')
+        self._index = open(self.index_path, 'a', encoding='utf-8')
+
+    def _drop_torn_index_line(self):
+        try:
+            with open(self.index_path, 'rb+') as index_fh:
+                content = index_fh.read()
+                if content and not content.endswith(b'\n'):
+                    index_fh.truncate(content.rfind(b'\n') + 1)
+        except FileNotFoundError:
+            pass
+
+    def add(self, url: str, content: bytes, encoding: Optional[str]=None):
+        key = archive_key(url)
+        digest = hashlib.sha1(content).hexdigest()
+        with self._lock:
+            self.pages += 1
+            if self._digests.get(key) == digest:
+                return
+            self._digests[key] = digest
+        body = zlib.compress(content, COMPRESSION_LEVEL)
+        with self._lock:
+            # the body goes first, a page is only listed
+            # in the index once it is entirely in the pack
+            offset = self._pack.tell()
+            self._pack.write(body)
+            self._pack.flush()
+            page = ArchivedPage(key, offset, len(body), encoding, digest, time.time())
+            self._index.write(json.dumps(page._asdict()) + '\n')
+            self._index.flush()
+            self.stored += 1
+            self.stored_bytes += len(body)
+
+    def response_hook(self, response: requests.Response, *args, **kwargs):
+        """
+        Archive the successfully fetched pages.
+        """
+        if response.request.method == 'GET' and response.status_code == 200:
+            self.add(response.request.url, response.content, response.encoding)
+
+    def stats(self) -> dict:
+        return {
+            'pages': self.pages,
+            'stored': self.stored,
+            'stored_bytes': self.stored_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._pack.close()
+            self._index.close()
+
+
+class ArchiveReader(object):
+    """
+    Pages of the archive, read from the memory mapped pack.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str) -> None:
+        if not os.path.isfile(path):
+            raise FileNotFoundError("No page archive at {}.".format(path))
+        self.path = path
+        self.pages = {page.key: page for page in read_index(path + INDEX_SUFFIX)}
+        self._map = None
+        self._view = memoryview(b'')
+        with open(path, 'rb') as pack_fh:
+            if os.fstat(pack_fh.fileno()).st_size:
+                self._map = mmap.mmap(pack_fh.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._map)
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def get(self, url: str) -> Optional[ArchivedPage]:
+        return self.pages.get(archive_key(url))
+
+    def read(self, page: ArchivedPage) -> bytes:
+        return zlib.decompress(self._view[page.offset:page.offset + page.size])
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+
+
+class PageNotArchived(RequestFailed):
+
+    def __init__(self, url: str) -> None:
+        super().__init__(url, reason="not in the archive")
+
+
+class ReplaySession(requests.Session):
+    """
+    requests session answering every request with the archived
+    page, nothing is sent to the network. Pages missing from
+    the archive raise PageNotArchived.
+    """
+
+    def __init__(self, reader: ArchiveReader) -> None:
+        super().__init__()
+        self.reader = reader
+        # proxies and netrc from the environment are looked up
+        # for every request otherwise, there is no network to reach
+        self.trust_env = False
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        page = self.reader.get(request.url)
+        if page is None:
+            raise PageNotArchived(request.url)
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = request.url
+        response.request = request
+        response.encoding = page.encoding
+        response._content = self.reader.read(page)
+        response.elapsed = datetime.timedelta(0)
+        return dispatch_hook('response', request.hooks, response, **kwargs)
@@ -0,0 +1,221 @@
+"""
+Persistent on-disk cache of the fetched pages.
+
+Pages of months that have been closed long ago do not change,
+so they are kept for a long time, while the current month
+is always revalidated with the site.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from collections import namedtuple
+from typing import Optional
+
+import constants
+
+
+logger = logging.getLogger('koshelek.page_cache')
+
+CacheLookup = namedtuple("CacheLookup", ["body", "headers"])
+
+
+class _DirectoryUsage(object):
+    """
+    Running size of the pages of a cache directory, shared
+    by the caches of all the users of the batch.
+    """
+
+    def __init__(self) -> None:
+        self.size = None
+        self.lock = threading.Lock()
+
+
+_usages = {}
+_usages_lock = threading.Lock()
+
+
+def _directory_usage(directory: str) -> _DirectoryUsage:
+    with _usages_lock:
+        return _usages.setdefault(os.path.abspath(directory), _DirectoryUsage())
+
+
+def month_ttl(month: int, year: int, now: datetime.datetime=None) -> int:
+    """
+    Number of seconds the page of the given month stays fresh.
+
+    Current and future months are never fresh, the previous one
+    may still be edited for a while, older ones are closed.
+    """
+    now = now or datetime.datetime.now()
+    age = (now.year - int(year)) * 12 + now.month - int(month)
+    if age <= 0:
+        return 0
+    if age == 1:
+        return constants.CACHE_TTL_RECENT_MONTH
+    return constants.CACHE_TTL_CLOSED_MONTH
+
+
+class PageCache(object):
+    """
+    Stores page bodies with their validators in a directory,
+    one JSON file per URL and query parameters.
+    Least recently used pages are evicted once the cache
+    grows beyond max_size bytes.
+    """
+
+    FILE_SUFFIX = '.json'
+    # Eviction frees a tenth of the cache at once, so the
+    # directory is scanned once in many stores, not on each
+    EVICTION_TARGET = 0.9
+
+    def __init__(self,
+                 directory: str=constants.DEFAULT_CACHE_DIR,
+                 max_size: int=constants.DEFAULT_CACHE_SIZE,
+                 namespace: str="") -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.namespace = namespace
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._usage = _directory_usage(directory)
+        os.makedirs(directory, exist_ok=True)
+
+    def make_key(self, url: str, param_dict: dict=None) -> str:
+        params = sorted((param_dict or {}).items())
+        raw = json.dumps([self.namespace, url, params], ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.FILE_SUFFIX)
+
+    def _read(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._path(key), encoding='utf-8') as cache_fh:
+                return json.load(cache_fh)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning("Corrupted cache entry %s, ignoring.", key)
+            return None
+
+    def lookup(self, url: str, param_dict: dict, ttl: int) -> CacheLookup:
+        """
+        Return the page body when it is still fresh, otherwise
+        the headers for conditional revalidation of the page.
+        """
+        key = self.make_key(url, param_dict)
+        entry = self._read(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return CacheLookup(None, {})
+        if ttl > 0 and time.time() - entry['fetched_at'] < ttl:
+            with self._lock:
+                self.hits += 1
+            try:
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                # evicted since it was read
+                pass
+            return CacheLookup(entry['body'], {})
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return CacheLookup(None, headers)
+
+    def revalidated(self, url: str, param_dict: dict) -> Optional[str]:
+        """
+        Mark the stored page as fresh after the site
+        has answered 304 Not Modified and return it,
+        None when it has been evicted in the meantime.
+        """
+        key = self.make_key(url, param_dict)
+        entry = self._read(key)
+        if entry is None:
+            return None
+        entry['fetched_at'] = time.time()
+        self._write(key, entry)
+        with self._lock:
+            self.revalidations += 1
+        return entry['body']
+
+    def store(self, url: str, param_dict: dict, body: str, headers=None):
+        headers = headers or {}
+        entry = {
+            'url': url,
+            'params': param_dict or {},
+            'fetched_at': time.time(),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'body': body,
+        }
+        self._write(self.make_key(url, param_dict), entry)
+
+    def _write(self, key: str, entry: dict):
+        path = self._path(key)
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp_path, 'w', encoding='utf-8') as cache_fh:
+            json.dump(entry, cache_fh, ensure_ascii=False)
+        written = os.path.getsize(tmp_path)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._usage.lock:
+            if self._usage.size is None:
+                self._usage.size = self._scan_size()
+            else:
+                self._usage.size += written - replaced
+            if self._usage.size > self.max_size:
+                self._evict()
+
+    def _stats(self) -> list:
+        stats = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(self.FILE_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # evicted by the cache of another user of the batch
+                continue
+            stats.append((stat.st_mtime, stat.st_size, entry.path))
+        return stats
+
+    def _scan_size(self) -> int:
+        return sum(size for __, size, __ in self._stats())
+
+    def _evict(self):
+        """
+        Remove the least recently used pages, the running size is
+        replaced with the one scanned. Called under the usage lock.
+        """
+        stats = self._stats()
+        total_size = sum(size for __, size, __ in stats)
+        target = self.max_size * self.EVICTION_TARGET
+        for __, size, path in sorted(stats):
+            if total_size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        self._usage.size = total_size
+
+    def clear(self):
+        with self._usage.lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+            self._usage.size = 0
@@ -1,29 +1,47 @@
 import datetime
+import itertools
 import logging
+import threading
+import time
 
 from calendar import monthrange
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Iterator, List, Tuple
-from queue import Queue
+from collections import deque, namedtuple
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Tuple, Union
+from queue import Empty, Full, Queue
 
 import requests
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from bs4 import BeautifulSoup
 
 import constants
+from exchange_resolver import ExchangeResolver
 from exporters import CSVExporter
+from fetch_planner import FetchPlanner, ReplayPlanner, Shard
+from metrics import Metrics
 import operations as ops
+import page_cache
+from page_archive import ArchiveReader, PageArchive, ReplaySession, archive_key
 import parsing_strategies as strategies
-import utils
+from process_parsing import ProcessPageParser
+from request_scheduler import AdaptiveLimit, RequestFailed, RequestScheduler
+from row_extractors import BS4RowExtractor, Row, get_row_extractor
+from page_cache import PageCache
+from session_store import SessionStore
+from transport import WorkerSessions, create_session
 
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('koshelek.parser')
 logging\
     .getLogger('requests.packages.urllib3.connectionpool')\
     .setLevel(logging.WARNING)
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+# Row that failed to parse with the shard of its page, the
+# row itself may not even have a date to tell its month
+FailedRow = namedtuple("FailedRow", ["shard", "row"])
+
 
 class BlockParser(object):
 
@@ -33,14 +51,25 @@ class BlockParser(object):
         'transfer': strategies.ExchangeParseStrategy,
     }
 
-    def __init__(self, session: requests.Session):
+    def __init__(self,
+                 session: requests.Session,
+                 base_url: str=constants.BASE_URL,
+                 exchange_resolver=None,
+                 metrics: Metrics=None):
         self.session = session
+        self.base_url = base_url
+        self.exchange_resolver = exchange_resolver
+        self.metrics = metrics or Metrics()
+
+    def parse_row(self, row: Row):
+        parse_strategy = self.OPERATION_MAP[row.operation]
+        with self.metrics.timer('parse.' + row.operation):
+            return parse_strategy.parse(self.session, row,
+                                        base_url=self.base_url,
+                                        resolver=self.exchange_resolver)
 
     def parse_block(self, block: BeautifulSoup):
-        url = utils._extract_ajax_url(block)
-        operation_type = utils._get_operation_from_ajax_url(url)
-        parse_strategy = self.OPERATION_MAP[operation_type]
-        return parse_strategy.parse(self.session, block)
+        return self.parse_row(BS4RowExtractor.row_from_block(block))
 
 
 class IncorrectCredentials(ValueError):
@@ -50,31 +79,78 @@ class IncorrectCredentials(ValueError):
 class KoshelekParser(object):
 
     SESSION_COOKIE_NAME = "JSESSIONID"
-
-    URLS = {
-        "login": constants.BASE_URL + "/login",
-        "income": constants.BASE_URL + "/income",
-        "cost": constants.BASE_URL + "/costs",
-        "accounts": constants.BASE_URL + "/accounts",
+    # Field of the login form the site shows to anonymous users
+    LOGIN_FORM_MARKER = "user.password"
+
+    URL_PATHS = {
+        "login": "/login",
+        "income": "/income",
+        "cost": "/costs",
+        "accounts": "/accounts",
     }
 
-    DATA_CLASS = "data_line"
+    QUEUE_POLL_TIMEOUT = 0.1
+    _SENTINEL = object()
 
     def __init__(self,
                  username: str="",
                  password: str="",
                  exporter=None,
-                 threads=3) -> None:
-        if not (username and password):
+                 threads=3,
+                 queue_size=constants.DEFAULT_QUEUE_SIZE,
+                 base_url: str=constants.BASE_URL,
+                 page_cache: PageCache=None,
+                 exchange_resolver: ExchangeResolver=None,
+                 row_extractor=None,
+                 page_parser: ProcessPageParser=None,
+                 max_rows_per_request: int=constants.DEFAULT_MAX_ROWS_PER_REQUEST,
+                 max_request_seconds: float=constants.DEFAULT_MAX_REQUEST_SECONDS,
+                 metrics: Metrics=None,
+                 scheduler: RequestScheduler=None,
+                 session_store: SessionStore=None,
+                 low_memory: bool=False,
+                 archive: PageArchive=None,
+                 replay: ArchiveReader=None) -> None:
+        if not (username and password) and replay is None:
             msg = "Password or username is empty."
             raise IncorrectCredentials(msg)
         self.username = username
         self.password = password
+        self.base_url = base_url
+        self.urls = {name: base_url + path
+                     for name, path in self.URL_PATHS.items()}
         self._logger = logging.getLogger("koshelek.parser")
         self._exporter = exporter or CSVExporter()
+        self._page_cache = page_cache
+        self._session_store = session_store
+        self._archive = archive
+        self._replay = replay
+        self.metrics = metrics or Metrics()
+        self._scheduler = scheduler or RequestScheduler(
+            limit=AdaptiveLimit(maximum=threads), metrics=self.metrics)
         self._session = self._initialize_session()
-        self._block_parser = BlockParser(self._session)
+        self._session.hooks['response'].append(self.metrics.response_hook)
+        if archive is not None:
+            self._session.hooks['response'].append(archive.response_hook)
+        self.exchange_resolver = exchange_resolver or ExchangeResolver(
+            max_entries=constants.LOW_MEMORY_EXCHANGE_MEMO if low_memory else None)
+        self._block_parser = BlockParser(self._session, base_url,
+                                         self.exchange_resolver,
+                                         self.metrics)
+        self._row_extractor = row_extractor or get_row_extractor()
+        self._page_parser = page_parser
+        self._balance_cache = {}
+        self._low_memory = low_memory
+        if low_memory:
+            queue_size = min(queue_size, constants.LOW_MEMORY_QUEUE_SIZE)
+            max_rows_per_request = min(max_rows_per_request,
+                                       constants.LOW_MEMORY_MAX_ROWS_PER_REQUEST)
+        self._max_rows_per_request = max_rows_per_request
+        self._max_request_seconds = max_request_seconds
+        self._failures_lock = threading.Lock()
+        self.reset_failures()
         self._number_of_threads = threads
+        self._queue_size = max(queue_size, threads)
 
         self.producer_pool = ThreadPoolExecutor(max_workers=self._number_of_threads,
                                                 thread_name_prefix='producer-')
@@ -82,17 +158,34 @@ class KoshelekParser(object):
                                                 thread_name_prefix='consumer-')
         self._authorise_session()
 
-    def _extract_operation_blocks_from_page(self,
-                                            page_text: str) -> List[BeautifulSoup]:
+    def _extract_operation_rows_from_page(self,
+                                          page_text: str) -> List[Union[Row, ops.Operation]]:
+        """
+        Rows of the page, those parsed by the
+        worker processes come as ready operations.
+        """
+        with self.metrics.timer('extract.list_page'):
+            if self._page_parser is not None:
+                return self._page_parser.parse(page_text)
+            return self._row_extractor.extract(page_text)
+
+    def _extract_account_blocks_from_page(self,
+                                          page_text: str) -> List[BeautifulSoup]:
         soup = BeautifulSoup(page_text, constants.DEFAULT_PARSER)
-        return soup.find_all("tr", self.DATA_CLASS)
+        return soup.find_all('div', {'class': 'grid_block'})
 
-    def get_accounts(self) -> ops.Account:
-        url = self.URLS['accounts']
+    def get_accounts(self) -> List[ops.Account]:
+        # balances are only shared by the blocks of one call,
+        # a parser kept alive has to see them change
+        self._balance_cache = {}
+        url = self.urls['accounts']
         resp = self._session.get(url)
-        blocks = BeautifulSoup(resp.text).find_all('div', {'class': 'grid_block'})
-        parser = strategies.AccountParser(self._session)
-        return [parser.parse(b) for b in blocks]
+        blocks = self._extract_account_blocks_from_page(resp.text)
+        parser = strategies.AccountParser(self._session, self.base_url,
+                                          executor=self.consumer_pool,
+                                          balance_cache=self._balance_cache)
+        futures = [self.producer_pool.submit(parser.parse, b) for b in blocks]
+        return [future.result() for future in futures]
 
     def get_operations_content(self, year="", month="",
                                operation: str=constants.COST_NAME,
@@ -107,10 +200,27 @@ class KoshelekParser(object):
             month = now.month
         logger.info("Getting {op} for {month}.{year}"
                     .format(op=operation, month=month, year=year))
-        operation_type_url = self.URLS.get(operation, constants.COST_NAME)
+        operation_type_url = self.urls.get(operation, constants.COST_NAME)
         date_filter = self.get_date_filter_dict_for_month(month, year)
         return self.get_url_content(operation_type_url,
-                                    param_dict=date_filter)
+                                    param_dict=date_filter,
+                                    ttl=page_cache.month_ttl(month, year, now))
+
+    def get_operations_content_for_range(self,
+                                         operation: str,
+                                         date_start: datetime.date,
+                                         date_end: datetime.date,
+                                         now: datetime.datetime=None,
+                                         revalidate: bool=False) -> str:
+        logger.info("Getting {op} for {start:%d.%m.%Y}-{end:%d.%m.%Y}"
+                    .format(op=operation, start=date_start, end=date_end))
+        operation_type_url = self.urls.get(operation, constants.COST_NAME)
+        ttl = 0 if revalidate else page_cache.month_ttl(date_end.month,
+                                                        date_end.year, now)
+        return self.get_url_content(operation_type_url,
+                                    param_dict=self.get_date_filter_dict(date_start,
+                                                                         date_end),
+                                    ttl=ttl)
 
     def _get_month_and_year_diff(self,
                                  cur_year: int,
@@ -139,26 +249,144 @@ class KoshelekParser(object):
         return {"filtrDateStart": "01.{:02d}.{}".format(month, year),
                 "filtrDateEnd": "{}.{:02d}.{}".format(days_count, month, year)}
 
+    def get_date_filter_dict(self,
+                             date_start: datetime.date,
+                             date_end: datetime.date) -> dict:
+        return {"filtrDateStart": date_start.strftime(constants.DATE_FORMAT),
+                "filtrDateEnd": date_end.strftime(constants.DATE_FORMAT)}
+
+    def _create_fetch_planner(self,
+                              now: datetime.datetime,
+                              months: int,
+                              skip: int=0,
+                              revalidate: bool=False) -> FetchPlanner:
+        if self._replay is not None:
+            return ReplayPlanner(self._archived_shards(now, months, skip))
+        window_days = constants.LOW_MEMORY_WINDOW_DAYS if self._low_memory else None
+        return FetchPlanner(self._month_year_iterator(now, months, skip),
+                            max_rows=self._max_rows_per_request,
+                            max_seconds=self._max_request_seconds,
+                            initial_window_days=window_days,
+                            revalidate=revalidate)
+
+    def _archived_shards(self,
+                         now: datetime.datetime,
+                         months: int,
+                         skip: int=0) -> Iterator[Tuple[Shard, float]]:
+        """
+        Windows of the archived list pages with the time they were
+        fetched at, those of the given number of months from the
+        current one, or all of them when months is 0.
+        """
+        operations = {archive_key(self.urls[op]): op
+                      for op in (constants.COST_NAME, constants.INCOME_NAME)}
+        wanted = set(self._month_year_iterator(now, months, skip)) if months else None
+        for key, page in self._replay.pages.items():
+            path, __, query = key.partition('?')
+            params = dict(parse_qsl(query))
+            if path not in operations or 'filtrDateStart' not in params:
+                continue
+            shard = Shard(operations[path],
+                          ops.to_date(params['filtrDateStart']),
+                          ops.to_date(params['filtrDateEnd']))
+            if wanted is None or (shard.date_start.month,
+                                  shard.date_start.year) in wanted:
+                yield shard, page.fetched_at
+
     def get_operations_for_months(self,
                                   now: datetime.datetime=None,
-                                  months: int=1) -> ops.Operations:
+                                  months: int=1) -> Tuple[List[ops.Cost],
+                                                          List[ops.Income],
+                                                          List[ops.Exchange]]:
         """
         Get all costs or incomes within the range of
         given number of months from the current day.
         """
+        operations = self.iter_operations(now=now, months=months)
+        return self._group_operations(operations)
+
+    def iter_operations(self,
+                        now: datetime.datetime=None,
+                        months: int=1,
+                        skip: int=0,
+                        revalidate: bool=False) -> Iterator[ops.Operation]:
+        """
+        Lazily yield costs, incomes and exchanges within the range of
+        given number of months from the current day as soon as they
+        are parsed. The most recent skip months are left out, with
+        revalidate no page is served from the cache unchecked.
+
+        Month pages are downloaded by the producer pool while
+        the consumer pool is parsing rows of the pages that
+        have already arrived. Both queues are bounded, so slow
+        consumers throttle the downloads.
+        """
         now = now or datetime.datetime.now()
 
-        blocks_queue = Queue()
-        operations_queue = Queue()
-
-        self._get_blocks_for_months(now, months, blocks_queue)
-        self._parse_blocks(blocks_queue, operations_queue)
-        return self._extract_operations_from_queue(operations_queue)
+        rows_queue = Queue(maxsize=self._queue_size)
+        operations_queue = Queue(maxsize=self._queue_size)
+        stop = threading.Event()
+
+        consumers_count = self._number_of_threads
+        for _ in range(consumers_count):
+            self.consumer_pool.submit(self._consume_rows,
+                                      rows_queue, operations_queue, stop)
+        planner = self._create_fetch_planner(now, months, skip, revalidate)
+        self._produce_rows(planner, now, rows_queue,
+                           consumers_count, stop)
+
+        finished_consumers = 0
+        try:
+            while finished_consumers < consumers_count:
+                operation = operations_queue.get()
+                if operation is self._SENTINEL:
+                    finished_consumers += 1
+                    continue
+                yield operation
+        finally:
+            stop.set()
+        self._log_failures()
+        logger.info('Operations extraction completed.')
 
-    def _extract_operations_from_queue(self, operations: Queue):
+    def reset_failures(self):
+        """
+        Forget the failures of the previous runs of a parser kept alive.
+        """
+        self.failed_shards = []
+        # the low memory mode keeps only the last failed rows,
+        # all of them are counted along with their shards
+        self.failed_rows = (deque(maxlen=constants.LOW_MEMORY_FAILED_ROWS)
+                            if self._low_memory else [])
+        self.failed_row_count = 0
+        self._failed_row_shards = set()
+
+    def _record_failed_row(self, shard: Shard, row):
+        with self._failures_lock:
+            self.failed_rows.append(FailedRow(shard, row))
+            self.failed_row_count += 1
+            self._failed_row_shards.add(shard)
+
+    def failed_months(self) -> List[Tuple[int, int]]:
+        """
+        (month, year) pairs of the months with pages or
+        operations that could not be fetched or parsed,
+        so their operations are incomplete.
+        """
+        shards = itertools.chain(self.failed_shards, self._failed_row_shards)
+        months = {(shard.date_start.month, shard.date_start.year) for shard in shards}
+        return sorted(months, key=lambda month_year: month_year[::-1])
+
+    def _log_failures(self):
+        months = self.failed_months()
+        if months:
+            logger.error("Operations of %s are incomplete: %d page(s) and "
+                         "%d operation(s) failed.",
+                         ", ".join("{}.{}".format(*m) for m in months),
+                         len(self.failed_shards), self.failed_row_count)
+
+    def _group_operations(self, operations: Iterable[ops.Operation]):
         costs, incomes, exchanges = [], [], []
-        while not operations.empty():
-            op = operations.get()
+        for op in operations:
             if isinstance(op, ops.Income):
                 incomes.append(op)
             elif isinstance(op, ops.Cost):
@@ -166,80 +394,221 @@ class KoshelekParser(object):
             elif isinstance(op, ops.Exchange):
                 exchanges.append(op)
             else:
-                logger.warn("Unknown operation type: %s (%s)",
-                            op, type(op))
-        logger.info('Operations extraction completed.')
+                logger.warning("Unknown operation type: %s (%s)",
+                               op, type(op))
         return costs, incomes, exchanges
 
-    def _get_blocks_for_months(self,
-                               now: datetime.datetime,
-                               months: int,
-                               queue: Queue):
-        thread_args = ((year, month, operation)
-                       for (month, year) in self.__month_year_iterator(now, months)
-                       for operation in (constants.COST_NAME, constants.INCOME_NAME))
-
-        futures_ = (self.producer_pool.submit(self.get_operations_content, *args)
-                    for args in thread_args)
-
-        for future in as_completed(futures_):
+    def _produce_rows(self,
+                      planner: FetchPlanner,
+                      now: datetime.datetime,
+                      rows: Queue,
+                      consumers_count: int,
+                      stop: threading.Event):
+        """
+        Run page downloading workers on the producer pool, the
+        last finished worker tells every consumer to stop.
+        """
+        workers_count = self._number_of_threads
+        pending = [workers_count]
+        pending_lock = threading.Lock()
+
+        def finish():
+            logger.info("Rows obtaining finished.")
+            for _ in range(consumers_count):
+                self._put(rows, self._SENTINEL, stop)
+
+        def on_worker_done(future):
+            with pending_lock:
+                pending[0] -= 1
+                is_last = pending[0] == 0
+            if is_last:
+                finish()
+
+        for _ in range(workers_count):
+            future = self.producer_pool.submit(self._fetch_rows,
+                                               planner, now, rows, stop)
+            future.add_done_callback(on_worker_done)
+
+    def _fetch_rows(self,
+                    planner: FetchPlanner,
+                    now: datetime.datetime,
+                    rows: Queue,
+                    stop: threading.Event):
+        while not stop.is_set():
+            shard = planner.next_shard()
+            if shard is None:
+                return
             try:
-                costs_page = future.result()
-                for block in self._extract_operation_blocks_from_page(costs_page):
-                    queue.put(block)
-            except Exception as e:
+                started = time.monotonic()
+                page = self.get_operations_content_for_range(
+                    *shard, now=now, revalidate=planner.revalidate)
+                elapsed = time.monotonic() - started
+                page_rows = self._extract_operation_rows_from_page(page)
+                # rows are plain strings, the page is not needed
+                # while they wait for the queue
+                del page
+                planner.record(shard, len(page_rows), elapsed)
+            except Exception:
                 logger.exception("Unknown error occured while parsing the page.")
-        logger.info("Blocks obtaining finished.")
-
-    def _parse_blocks(self,
-                      blocks: Queue,
-                      operations: Queue):
-        future_results = []
-        logger.info('Block parsing started.')
-        while not blocks.empty():
-            block_to_parse = blocks.get(timeout=10)
-            future = self.consumer_pool.submit(self._block_parser.parse_block,
-                                               block_to_parse)
-            future_results.append(future)
-        for future in as_completed(future_results):
+                self.failed_shards.append(shard)
+                continue
+            for row in page_rows:
+                if not self._put(rows, (shard, row), stop):
+                    return
+            self.metrics.gauge('queue.rows', rows.qsize())
+
+    def _consume_rows(self,
+                      rows: Queue,
+                      operations: Queue,
+                      stop: threading.Event):
+        while True:
+            item = self._get(rows, stop)
+            if item is self._SENTINEL:
+                break
+            shard, row = item
             try:
-                operations.put(future.result())
-            except Exception as e:
+                operation = (self._block_parser.parse_row(row)
+                             if isinstance(row, Row) else row)
+            except Exception:
                 logger.exception("Error parsing the operation.")
-        logger.info("Block parsing completed.")
+                self._record_failed_row(shard, row)
+                continue
+            if not self._put(operations, operation, stop):
+                return
+            self.metrics.incr('operations')
+            self.metrics.gauge('queue.operations', operations.qsize())
+        self._put(operations, self._SENTINEL, stop)
+
+    def _put(self, queue: Queue, item, stop: threading.Event) -> bool:
+        """
+        Put item into the bounded queue unless the pipeline is stopped.
+        """
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=self.QUEUE_POLL_TIMEOUT)
+                return True
+            except Full:
+                continue
+        return False
 
-    def __month_year_iterator(self,
-                              now: datetime.datetime=None,
-                              months: int=1) -> Iterator[Tuple[int, int]]:
+    def _get(self, queue: Queue, stop: threading.Event):
+        """
+        Get item from the queue, sentinel is returned
+        when the pipeline is stopped.
+        """
+        while not stop.is_set():
+            try:
+                return queue.get(timeout=self.QUEUE_POLL_TIMEOUT)
+            except Empty:
+                continue
+        return self._SENTINEL
+
+    def _month_year_iterator(self,
+                             now: datetime.datetime=None,
+                             months: int=1,
+                             skip: int=0) -> Iterator[Tuple[int, int]]:
         now = now or datetime.datetime.now()
         cur_month = now.month
         cur_year = now.year
 
-        for diff_month_i in range(0, months):
+        for diff_month_i in range(skip, months):
             month, year = self._get_month_and_year_diff(cur_year,
                                                         cur_month,
                                                         diff_month_i)
             yield month, year
 
-    @staticmethod
-    def _initialize_session() -> requests.Session:
-        return requests.Session()
+    def _initialize_session(self) -> requests.Session:
+        if self._replay is not None:
+            return ReplaySession(self._replay)
+        return WorkerSessions(create_session(self._scheduler,
+                                             pool_size=self._scheduler.limit.maximum))
 
     def _authorise_session(self) -> requests.Session:
         """
         Perform login request with provided
         credentials and save the authorisation
         cookie into the local session.
+        The stored cookie is reused while it is valid,
+        nothing is done when replaying the archive.
         """
-        self._session.get(constants.BASE_URL, verify=False)
+        if self._replay is not None or self._restore_session():
+            return self._session
+        self._session.get(self.base_url, verify=False)
         payload = {
             'user.login': self.username,
             'user.password': self.password,
             'saveUser': True
         }
-        self._session.post(self.URLS["login"], data=payload)
+        self._session.post(self.urls["login"], data=payload)
+        if self._session_store is not None:
+            self._session_store.save(self.base_url, self.username,
+                                     self._session.cookies.get(self.SESSION_COOKIE_NAME))
         return self._session
 
+    def _restore_session(self) -> bool:
+        """
+        Put the stored session cookie into the session
+        and check whether the site still accepts it.
+        """
+        if self._session_store is None:
+            return False
+        cookie = self._session_store.get(self.base_url, self.username)
+        if not cookie:
+            return False
+        self._session.cookies.set(self.SESSION_COOKIE_NAME, cookie)
+        try:
+            response = self._session.get(self.urls['accounts'],
+                                         allow_redirects=False, verify=False)
+            authorised = self._is_authorised(response.status_code, response.text)
+        except RequestFailed:
+            authorised = False
+        if not authorised:
+            logger.info("Stored session of %s has expired.", self.username)
+            self._session.cookies.clear()
+        return authorised
+
+    def ensure_authorised(self) -> bool:
+        """
+        Log in again once the site has stopped accepting the
+        session cookie, as it does to long running parsers.
+        Returns whether the login was needed.
+        """
+        if self._replay is not None:
+            return False
+        response = self._session.get(self.urls['accounts'],
+                                     allow_redirects=False, verify=False)
+        if self._is_authorised(response.status_code, response.text):
+            return False
+        logger.info("Session of %s has expired, logging in again.", self.username)
+        self._session.cookies.clear()
+        self._authorise_session()
+        self._session.renew()
+        return True
+
+    @classmethod
+    def _is_authorised(cls, status: int, page_text: str) -> bool:
+        return status == 200 and cls.LOGIN_FORM_MARKER not in page_text
+
+    def _archive_page(self, url: str, param_dict: dict, body: str):
+        """
+        Archive the page served by the page cache, the fetched
+        ones are archived by the response hook.
+        """
+        if self._archive is not None:
+            request = requests.Request('GET', url, params=param_dict).prepare()
+            self._archive.add(request.url, body.encode(constants.DEFAULT_ENCODING),
+                              constants.DEFAULT_ENCODING)
+
+    def close(self):
+        """
+        Release worker threads and network connections.
+        """
+        self.producer_pool.shutdown(wait=False)
+        self.consumer_pool.shutdown(wait=False)
+        if self._page_parser is not None:
+            self._page_parser.close()
+        self._session.close()
+
     def export_to_file(self,
                        operations: ops.Operations,
                        filename: str,
@@ -252,11 +621,30 @@ class KoshelekParser(object):
             raise ValueError("No exporter set up to be used.")
         self._exporter.export_to_file(operations, filename, **kwargs)
 
-    def get_url_content(self, url: str, param_dict: dict=None) -> str:
+    def get_url_content(self, url: str,
+                        param_dict: dict=None,
+                        ttl: int=None) -> str:
         """
-        Reads URL content
+        Reads URL content, pages with the given
+        ttl are served from the page cache if set up.
+        Raises RequestFailed once the retries are exhausted.
         """
         param_dict = param_dict or {}
-        r = self._session.get(url, params=param_dict, verify=False)
-        assert r.ok
+        if self._page_cache is None or ttl is None:
+            r = self._session.get(url, params=param_dict, verify=False)
+            return r.text
+        cached = self._page_cache.lookup(url, param_dict, ttl)
+        if cached.body is not None:
+            self._archive_page(url, param_dict, cached.body)
+            return cached.body
+        r = self._session.get(url, params=param_dict,
+                              headers=cached.headers, verify=False)
+        if r.status_code == 304:
+            body = self._page_cache.revalidated(url, param_dict)
+            if body is not None:
+                self._archive_page(url, param_dict, body)
+                return body
+            # evicted since the lookup, fetch it unconditionally
+            r = self._session.get(url, params=param_dict, verify=False)
+        self._page_cache.store(url, param_dict, r.text, r.headers)
         return r.text
@@ -1,100 +1,85 @@
 import abc
 import decimal
 import re
-from typing import Iterator
+import threading
+from typing import Iterator, Optional, Tuple
 
 from bs4 import BeautifulSoup
 
 import constants
 import utils
 from operations import Account, Balance, Income, Cost, Exchange
+from row_extractors import Row
 
 
 class BaseStrategy(abc.ABC):
 
     @abc.abstractclassmethod
-    def parse(cls, session, block):
+    def parse(cls, session, row: Row, base_url=constants.BASE_URL, resolver=None):
         pass
 
     @staticmethod
     def _extract_id_from_url(ajax_url):
-        indx = ajax_url.find(constants.URL_PART_BEFORE_ID) + len(constants.URL_PART_BEFORE_ID)
-        ajax_url = ajax_url[indx:]
-        return_url_pos = ajax_url.find('?return_url')
-        if return_url_pos:
-            ajax_url = ajax_url[:return_url_pos]
-        return ajax_url
+        return utils._extract_id_from_url(ajax_url)
 
 
 class IncomeParseStrategy(BaseStrategy):
 
     @classmethod
-    def parse(cls, session, block):
-        td_els = utils._extract_td_elements(block)
-        ajax_url = utils._extract_ajax_url(block)
-        # FIXME: moved to base class
-        _id = cls._extract_id_from_url(ajax_url)
-        title = td_els[0].a.text
-        category = td_els[1].a.text
-        budget = td_els[2].a.text
-        money = td_els[3].a.text
-        cur, value = utils.split_currency(money)
-        account = td_els[4].a.text
-        date = td_els[5].a.text
-        return Income(id=_id, title=title, description="",
-                      category=category, budget=budget,
+    def parse(cls, session, row: Row, base_url=constants.BASE_URL, resolver=None):
+        cur, value = utils.split_currency(row.money)
+        return Income(id=row.id, title=row.title, description="",
+                      category=row.category, budget=row.budget,
                       currency=cur, value=value,
-                      account=account, date=date)
+                      account=row.account, date=row.date)
 
 
 class CostParseStrategy(BaseStrategy):
 
     @classmethod
-    def parse(cls, session, block):
-        td_els = utils._extract_td_elements(block)
-        title = td_els[0].a.text
-        ajax_url = utils._extract_ajax_url(block)
-        _id = cls._extract_id_from_url(ajax_url)
-        category = td_els[1].a.text
-        budget = td_els[2].a.text
-        money = td_els[3].a.text
-        cur, value = utils.split_currency(money)
-        account = td_els[4].a.text
-        date = td_els[5].a.text
-        return Cost(id=_id, title=title, description="", category=category,
-                    budget=budget, currency=cur, value=value,
-                    account=account, date=date)
-
-    @staticmethod
-    def _extract_id_from_url(ajax_url):
-        indx = ajax_url.find(constants.URL_PART_BEFORE_ID) + len(constants.URL_PART_BEFORE_ID)
-        return ajax_url[indx:]
+    def parse(cls, session, row: Row, base_url=constants.BASE_URL, resolver=None):
+        cur, value = utils.split_currency(row.money)
+        return Cost(id=row.id, title=row.title, description="",
+                    category=row.category, budget=row.budget,
+                    currency=cur, value=value,
+                    account=row.account, date=row.date)
 
 
 class ExchangeParseStrategy(BaseStrategy):
 
     @classmethod
-    def parse(cls, session, block) -> Exchange:
-        td_els = utils._extract_td_elements(block)
-        title = td_els[0].a.text
-        ajax_url = utils._extract_ajax_url(block)
-        _id = cls._extract_id_from_url(ajax_url)
-        account_from, account_to = cls._parse_editorial_form(session, ajax_url)
-        budget = td_els[2].a.text
-        money = td_els[3].a.text
-        cur, value = utils.split_currency(money)
-        date = td_els[5].a.text
+    def parse(cls, session, row: Row, base_url=constants.BASE_URL,
+              resolver=None) -> Exchange:
+        if resolver is None:
+            account_from, account_to = cls._parse_editorial_form(session, row.ajax_url,
+                                                                 base_url)
+        else:
+            account_from, account_to = resolver.resolve(session, row, base_url)
+        return cls.parse_with_accounts(row, account_from, account_to)
+
+    @classmethod
+    def parse_with_accounts(cls, row: Row, account_from, account_to) -> Exchange:
+        """
+        Build exchange from the row when accounts
+        have already been read from the editorial form.
+        """
+        cur, value = utils.split_currency(row.money)
         # FIXME: fix description
-        return Exchange(id=_id, title=title,
-                        budget=budget, currency=cur, description='',
+        return Exchange(id=row.id, title=row.title,
+                        budget=row.budget, currency=cur, description='',
                         account_from=account_from, account_to=account_to,
                         value=value,
-                        date=date)
+                        date=row.date)
+
+    @classmethod
+    def _parse_editorial_form(cls, session, ajax_url,
+                              base_url=constants.BASE_URL):
+        response = session.get(base_url + ajax_url, verify=False)
+        return cls._extract_accounts_from_form(response.text)
 
     @staticmethod
-    def _parse_editorial_form(session, ajax_url):
-        response = session.get(constants.BASE_URL + ajax_url, verify=False)
-        soup = BeautifulSoup(response.text, constants.DEFAULT_PARSER)
+    def _extract_accounts_from_form(form_text: str):
+        soup = BeautifulSoup(form_text, constants.DEFAULT_PARSER)
 
         account_from = soup\
             .find('select', id='accountFrom')\
@@ -106,44 +91,102 @@ class ExchangeParseStrategy(BaseStrategy):
             .find('option', selected='selected')\
             .text
 
-        return account_to, account_from
+        return account_from, account_to
 
 
 class AccountParser:
 
     CURRENCY_URL = '/accounts/remainder_currency?account_id={}&currency={}'
     AVAILABLE_CURRENCIES = ('EUR', 'USD', 'BYR', 'BYN', 'RUR', 'PLN')
+    RE_CURRENCY_ATTR = re.compile('currenc', re.IGNORECASE)
 
-    def __init__(self, session):
+    def __init__(self, session, base_url=constants.BASE_URL,
+                 executor=None, balance_cache: dict=None):
         self.session = session
+        self.base_url = base_url
+        self.executor = executor
+        self.balance_cache = {} if balance_cache is None else balance_cache
+        self._cache_lock = threading.Lock()
 
     def parse(self, block: BeautifulSoup) -> Account:
-        details_url = self.__extract_details_url(block)
+        details_url = self._extract_details_url(block)
         return self.account_from_details_url(details_url)
 
     def account_from_details_url(self, details_url) -> Account:
-        bs = BeautifulSoup(self.session.get(details_url).text)
-        account_id = self.__extract_account_id(bs)
-        account_title = self.__extract_account_title(bs)
-        balances = [b for b in self.__extract_balances_for_account_id(account_id)]
+        page_text = self.session.get(details_url).text
+        account_id, account_title, currencies = self._extract_account_details(page_text)
+        balances = [b for b in self.__extract_balances_for_account_id(account_id,
+                                                                      currencies)]
         return Account(account_id, account_title, balances)
 
+    def _extract_account_details(self, page_text: str) -> Tuple[str, str, Tuple[str, ...]]:
+        """
+        Account id, title and currencies worth
+        probing for the balance.
+        """
+        bs = BeautifulSoup(page_text, constants.DEFAULT_PARSER)
+        return (self.__extract_account_id(bs),
+                self.__extract_account_title(bs),
+                self.__detect_currencies(bs))
+
     def __extract_account_title(self, block: BeautifulSoup) -> str:
         return block.find('input', {'id': 'name'})['value']
 
-    def __extract_details_url(self, block: BeautifulSoup) -> str:
+    def _extract_details_url(self, block: BeautifulSoup) -> str:
         edit_action = block.find('img', {'alt': 'Редактировать'}).parent['onclick']
         details_url = re.search('\"(.+?)\"', edit_action).group().replace('"', '')
-        return constants.BASE_URL + details_url
+        return self.base_url + details_url
 
     def __extract_account_id(self, block: BeautifulSoup) -> str:
         action_url = block.find('form')['action']
         return re.search('\d{2,}', action_url).group()
 
-    def __extract_balances_for_account_id(self, account_id: str) -> Iterator[Balance]:
-        for cur_code in self.AVAILABLE_CURRENCIES:
-            balance_url = constants.BASE_URL + self.CURRENCY_URL.format(account_id,
-                                                                        cur_code)
-            text = self.session.get(balance_url).text
-            if text != '0.0':
-                yield Balance(cur_code, decimal.Decimal(text))
+    def __detect_currencies(self, block: BeautifulSoup) -> Tuple[str, ...]:
+        """
+        Currencies selected in the multiple choice currency list
+        of the details page. Anything less conclusive, such as a
+        single default currency field, and all the available
+        currencies are probed, a missed balance is worse than
+        a few extra requests.
+        """
+        lists = [select for select in block.find_all('select', multiple=True)
+                 if self.RE_CURRENCY_ATTR.search(select.get('id', '') + ' ' +
+                                                 select.get('name', ''))]
+        if len(lists) != 1:
+            return self.AVAILABLE_CURRENCIES
+        selected = {option.get('value') or option.text.strip()
+                    for option in lists[0].find_all('option', selected=True)}
+        if not selected or not selected <= set(self.AVAILABLE_CURRENCIES):
+            return self.AVAILABLE_CURRENCIES
+        return tuple(c for c in self.AVAILABLE_CURRENCIES if c in selected)
+
+    def _balance_url(self, account_id: str, cur_code: str) -> str:
+        return self.base_url + self.CURRENCY_URL.format(account_id, cur_code)
+
+    @staticmethod
+    def _balance_from_text(cur_code: str, text: str) -> Optional[Balance]:
+        if text != '0.0':
+            return Balance(cur_code, decimal.Decimal(text))
+        return None
+
+    def _get_balance(self, account_id: str, cur_code: str) -> Optional[Balance]:
+        key = (account_id, cur_code)
+        with self._cache_lock:
+            if key in self.balance_cache:
+                return self.balance_cache[key]
+        text = self.session.get(self._balance_url(account_id, cur_code)).text
+        balance = self._balance_from_text(cur_code, text)
+        with self._cache_lock:
+            self.balance_cache[key] = balance
+        return balance
+
+    def __extract_balances_for_account_id(self, account_id: str,
+                                          currencies: Tuple[str, ...]) -> Iterator[Balance]:
+        if self.executor is None:
+            balances = (self._get_balance(account_id, c) for c in currencies)
+        else:
+            balances = self.executor.map(self._get_balance,
+                                         [account_id] * len(currencies), currencies)
+        for balance in balances:
+            if balance:
+                yield balance
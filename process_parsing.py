@@ -0,0 +1,103 @@
+"""
+Parsing of the list pages in a pool of worker processes.
+
+HTML parsing is CPU bound and serialised by the GIL, so with
+many threads it still uses a single core. Workers receive raw
+page text split into chunks of rows and send back compact
+tuples: parsed incomes and costs, and raw rows of exchanges
+that still need their editorial form to be resolved. A row that
+fails to parse is sent back raw as well, so the parent records
+that row alone instead of the whole page.
+"""
+import multiprocessing
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Union
+
+import constants
+import operations as ops
+import parsing_strategies as strategies
+from row_extractors import Row, get_row_extractor
+
+
+RE_DATA_ROW_START = re.compile(r'<tr\b[^>]*\bclass\s*=\s*["\'][^"\']*\bdata_line\b',
+                               re.IGNORECASE)
+
+TRANSFER_OPERATION = 'transfer'
+# Marks the rows sent back unparsed
+RAW_ROW = 'row'
+
+OPERATIONS = {
+    'costs': (strategies.CostParseStrategy, ops.Cost),
+    'income': (strategies.IncomeParseStrategy, ops.Income),
+}
+
+_extractors = {}
+
+
+def split_page(page_text: str, rows_per_chunk: int) -> List[str]:
+    """
+    Cut the page into fragments of at most rows_per_chunk
+    operation rows without parsing it.
+    """
+    starts = [m.start() for m in RE_DATA_ROW_START.finditer(page_text)]
+    if len(starts) <= rows_per_chunk:
+        return [page_text]
+    bounds = starts[::rows_per_chunk] + [len(page_text)]
+    return ['<table>{}</table>'.format(page_text[start:end])
+            for start, end in zip(bounds, bounds[1:])]
+
+
+def parse_chunk(chunk: str, extractor_name: str) -> List[Tuple[str, tuple]]:
+    """
+    Worker side: extract rows of the chunk and parse
+    those that do not need any network requests.
+    """
+    extractor = _extractors.get(extractor_name)
+    if extractor is None:
+        extractor = _extractors[extractor_name] = get_row_extractor(extractor_name)
+    parsed = []
+    for row in extractor.extract(chunk):
+        if row.operation == TRANSFER_OPERATION:
+            parsed.append((RAW_ROW, tuple(row)))
+            continue
+        try:
+            strategy, __ = OPERATIONS[row.operation]
+            parsed.append((row.operation, tuple(strategy.parse(None, row))))
+        except Exception:
+            # parsed again by the parent which logs and records it
+            parsed.append((RAW_ROW, tuple(row)))
+    return parsed
+
+
+class ProcessPageParser(object):
+    """
+    Splits pages into chunks and parses them on all cores.
+    """
+
+    def __init__(self,
+                 workers: int=None,
+                 rows_per_chunk: int=constants.DEFAULT_PARSE_CHUNK_ROWS,
+                 extractor_name: str=constants.DEFAULT_ROW_EXTRACTOR) -> None:
+        self.rows_per_chunk = rows_per_chunk
+        self.extractor_name = extractor_name
+        self._executor = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+
+    def parse(self, page_text: str) -> List[Union[ops.Operation, Row]]:
+        chunks = split_page(page_text, self.rows_per_chunk)
+        results = self._executor.map(parse_chunk, chunks,
+                                     [self.extractor_name] * len(chunks))
+        items = []
+        for chunk_items in results:
+            for operation, fields in chunk_items:
+                if operation == RAW_ROW:
+                    items.append(Row(*fields))
+                else:
+                    __, operation_cls = OPERATIONS[operation]
+                    items.append(operation_cls(*fields))
+        return items
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,212 @@
+"""
+Sampling profiler of the export pipeline.
+
+A background thread takes the Python stacks of all the other
+threads every few milliseconds, so the producer and consumer
+pools, the asyncio loop and the exporting main thread are all
+seen, at a cost of a few percent of one core. cProfile only
+sees the thread it was enabled in and slows the run down a lot.
+
+Every sample is attributed to the pipeline stage found in its
+stack, the innermost frame deciding:
+
+    fetch    HTTP requests, the scheduler slots and backoffs
+    extract  rows extracted from the list pages
+    parse    rows turned into operations, account pages
+    export   operations written by the exporters
+    wait     pipeline queues and idle pool workers
+    other    anything else
+
+Samples are written as collapsed stacks, one "stage;frame;...
+count" line per distinct stack, the input of flamegraph.pl,
+speedscope and most other flame graph tools, along with a text
+summary of the stages and the hottest functions. Time spent by
+the --parse-workers processes is not sampled, waiting for their
+results counts as extract.
+
+The sampler needs the GIL to look at the stacks, so it tends to
+catch threads right where they release it: C calls doing so,
+such as socket reads and zlib, get more samples than their share.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+from collections import Counter
+from types import CodeType
+from typing import Dict, List, Optional, Tuple
+
+import constants
+
+
+logger = logging.getLogger('koshelek.profiler')
+
+FETCH, EXTRACT, PARSE, EXPORT, WAIT, OTHER = ('fetch', 'extract', 'parse',
+                                              'export', 'wait', 'other')
+STAGES = (FETCH, EXTRACT, PARSE, EXPORT, WAIT, OTHER)
+
+# Whole modules, by file name or by the package directory
+MODULE_STAGES = {
+    'request_scheduler.py': FETCH,
+    'transport.py': FETCH,
+    'page_archive.py': FETCH,
+    'page_cache.py': FETCH,
+    'requests': FETCH,
+    'urllib3': FETCH,
+    'aiohttp': FETCH,
+    'socket.py': FETCH,
+    'ssl.py': FETCH,
+    'row_extractors.py': EXTRACT,
+    'process_parsing.py': EXTRACT,
+    'parsing_strategies.py': PARSE,
+    'exchange_resolver.py': PARSE,
+    'amounts.py': PARSE,
+    'operations.py': PARSE,
+    'exporters': EXPORT,
+    'selectors.py': WAIT,
+}
+# Functions of the modules shared by several stages
+FUNCTION_STAGES = {
+    ('parser.py', 'get_url_content'): FETCH,
+    # the asyncio engine fetches the pages through these two
+    ('async_parser.py', '_fetch'): FETCH,
+    ('async_parser.py', '_request'): FETCH,
+    ('parser.py', '_extract_operation_rows_from_page'): EXTRACT,
+    ('parser.py', '_extract_account_blocks_from_page'): EXTRACT,
+    ('parser.py', 'parse_row'): PARSE,
+    ('parser.py', '_put'): WAIT,
+    ('parser.py', '_get'): WAIT,
+    ('parser.py', 'iter_operations'): WAIT,
+    ('thread.py', '_worker'): WAIT,
+}
+
+Stack = Tuple[CodeType, ...]
+
+
+def frame_label(code: CodeType) -> str:
+    return '{}:{}'.format(os.path.basename(code.co_filename), code.co_name)
+
+
+class SamplingProfiler(object):
+    """
+    Counts the distinct stacks of all the threads but its own.
+    """
+
+    def __init__(self, interval: float=constants.DEFAULT_PROFILE_INTERVAL) -> None:
+        self.interval = interval
+        self.samples = 0
+        self.duration = 0.0
+        self._stacks = Counter()
+        self._stages = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler',
+                                        daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        started = time.monotonic()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                self._stacks[tuple(stack)] += 1
+            self.samples += 1
+        self.duration = time.monotonic() - started
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _code_stage(self, code: CodeType) -> Optional[str]:
+        stage = self._stages.get(code, ())
+        if stage == ():
+            filename = os.path.basename(code.co_filename)
+            package = os.path.basename(os.path.dirname(code.co_filename))
+            stage = (FUNCTION_STAGES.get((filename, code.co_name)) or
+                     MODULE_STAGES.get(filename) or MODULE_STAGES.get(package))
+            self._stages[code] = stage
+        return stage
+
+    def stage(self, stack: Stack) -> str:
+        """
+        Stage of the innermost frame of the stack that has one.
+        """
+        for code in stack:
+            stage = self._code_stage(code)
+            if stage is not None:
+                return stage
+        return OTHER
+
+    def stage_samples(self) -> Dict[str, int]:
+        stages = dict.fromkeys(STAGES, 0)
+        for stack, count in self._stacks.items():
+            stages[self.stage(stack)] += count
+        return stages
+
+    def hot_functions(self, top: int=constants.DEFAULT_PROFILE_TOP) -> List[Tuple[str, int, int]]:
+        """
+        Functions with their own and cumulative samples, busiest first.
+        Samples spent waiting are left out.
+        """
+        own, cumulative = Counter(), Counter()
+        for stack, count in self._stacks.items():
+            if not stack or self.stage(stack) == WAIT:
+                continue
+            own[stack[0]] += count
+            for code in set(stack):
+                cumulative[code] += count
+        return [(frame_label(code), count, cumulative[code])
+                for code, count in own.most_common(top)]
+
+    def write_collapsed(self, path: str):
+        lines = Counter()
+        for stack, count in self._stacks.items():
+            frames = [self.stage(stack)] + [frame_label(code) for code in reversed(stack)]
+            lines[';'.join(frames)] += count
+        with open(path, 'w', encoding='utf-8') as collapsed_fh:
+            for line, count in sorted(lines.items()):
+                collapsed_fh.write('{} {}\n'.format(line, count))
+
+    def summary(self, top: int=constants.DEFAULT_PROFILE_TOP) -> str:
+        stages = self.stage_samples()
+        total = sum(stages.values()) or 1
+        lines = ['{} samples every {:.0f} ms over {:.1f} s, thread samples by stage:'
+                 .format(self.samples, self.interval * 1000, self.duration)]
+        busy = total - stages[WAIT]
+        for stage in STAGES:
+            lines.append('  {:<8}{:>8}{:>7.1f}%'.format(stage, stages[stage],
+                                                        100.0 * stages[stage] / total))
+        lines.append('')
+        lines.append('Hot functions, {} thread samples outside wait:'.format(busy))
+        lines.append('  {:>7}{:>7}  {}'.format('own', 'total', 'function'))
+        for label, own, cumulative in self.hot_functions(top):
+            lines.append('  {:>6.1f}%{:>6.1f}%  {}'.format(100.0 * own / (busy or 1),
+                                                           100.0 * cumulative / (busy or 1),
+                                                           label))
+        return '\n'.join(lines)
+
+    def write(self, prefix: str, top: int=constants.DEFAULT_PROFILE_TOP) -> Tuple[str, str]:
+        """
+        Write prefix.collapsed and prefix.txt, returns their paths.
+        """
+        collapsed_path, summary_path = prefix + '.collapsed', prefix + '.txt'
+        self.write_collapsed(collapsed_path)
+        with open(summary_path, 'w', encoding='utf-8') as summary_fh:
+            summary_fh.write(self.summary(top) + '\n')
+        return collapsed_path, summary_path
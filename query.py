@@ -0,0 +1,188 @@
+"""
+Queries over the SQLite index written with --format sqlite.
+
+Totals grouped by month, year, category, account or currency
+are read from the monthly rollup whenever the date bounds fall
+on whole months, only day precise bounds scan the operations
+through the date index. Sums are never mixed between currencies.
+
+    python query.py exports/operations.sqlite totals --by month --kind cost --since 2017
+    python query.py exports/operations.sqlite list --category Food --limit 20
+"""
+import argparse
+import calendar
+import decimal
+import os
+import sys
+import time
+
+from typing import List, Optional, Tuple
+
+from amounts import currency_code
+from exporters.sqlite_exporter import connect
+
+
+GROUPS = {
+    'kind': 'kind',
+    'month': 'month',
+    'year': 'substr(month, 1, 4)',
+    'category': 'category',
+    'account': 'account',
+    'currency': 'currency',
+}
+LIST_COLUMNS = ('kind', 'date', 'title', 'category', 'account', 'currency', 'value_cents')
+
+
+def to_bound(text: str, end: bool=False) -> str:
+    """
+    YYYY, YYYY-MM or YYYY-MM-DD as the first or the last
+    date of the period, compares right with ISO dates.
+    >>> to_bound('2017-02', end=True)
+    '2017-02-31'
+    """
+    parts = text.split('-')
+    if not 1 <= len(parts) <= 3 or not all(part.isdigit() for part in parts):
+        raise argparse.ArgumentTypeError("Expected YYYY, YYYY-MM or YYYY-MM-DD: {}".format(text))
+    if len(parts) == 3:
+        return text
+    if len(parts) == 1:
+        parts.append('12' if end else '01')
+    return '{}-{}-{}'.format(parts[0], parts[1], '31' if end else '01')
+
+
+def is_month_bound(bound: Optional[str], end: bool=False) -> bool:
+    if bound is None:
+        return True
+    year, month, day = (int(part) for part in bound.split('-'))
+    if end:
+        return day >= calendar.monthrange(year, month)[1]
+    return day == 1
+
+
+def format_cents(cents: int) -> str:
+    return str(decimal.Decimal(cents).scaleb(-2))
+
+
+def _filters(kind: str=None,
+             categories: List[str]=None,
+             accounts: List[str]=None,
+             currency: str=None) -> Tuple[List[str], list]:
+    conditions, params = [], []
+    if kind:
+        conditions.append('kind = ?')
+        params.append(kind)
+    for column, values in (('category', categories), ('account', accounts)):
+        if values:
+            conditions.append('{} IN ({})'.format(column, ', '.join('?' * len(values))))
+            params.extend(values)
+    if currency:
+        conditions.append('currency = ?')
+        params.append(currency_code(currency))
+    return conditions, params
+
+
+def totals(connection,
+           by: List[str]=(),
+           since: str=None,
+           until: str=None,
+           **filters) -> Tuple[List[str], list, str]:
+    """
+    Sum and count of the operations per group, returns
+    column names, rows and the table the sums come from.
+    """
+    by = [group for group in by if group != 'currency'] + ['currency']
+    conditions, params = _filters(**filters)
+    if is_month_bound(since) and is_month_bound(until, end=True):
+        table, total, count = 'monthly_rollup', 'SUM(total_cents)', 'SUM(count)'
+        bounds = (('month >= ?', since), ('month <= ?', until))
+        params.extend(bound[:7] for _, bound in bounds if bound)
+    else:
+        table, total, count = 'operations', 'SUM(value_cents)', 'COUNT(*)'
+        bounds = (('date >= ?', since), ('date <= ?', until))
+        params.extend(bound for _, bound in bounds if bound)
+    conditions.extend(condition for condition, bound in bounds if bound)
+    keys = ', '.join(GROUPS[group] for group in by)
+    sql = 'SELECT {keys}, {total}, {count} FROM {table}'.format(
+        keys=keys, total=total, count=count, table=table)
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' GROUP BY {keys} ORDER BY {keys}'.format(keys=keys)
+    rows = [row[:-2] + (format_cents(row[-2]), row[-1])
+            for row in connection.execute(sql, params)]
+    return by + ['total', 'count'], rows, table
+
+
+def list_operations(connection,
+                    since: str=None,
+                    until: str=None,
+                    limit: int=50,
+                    **filters) -> Tuple[List[str], list, str]:
+    conditions, params = _filters(**filters)
+    for condition, bound in (('date >= ?', since), ('date <= ?', until)):
+        if bound:
+            conditions.append(condition)
+            params.append(bound)
+    sql = 'SELECT {} FROM operations'.format(', '.join(LIST_COLUMNS))
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY date DESC LIMIT ?'
+    params.append(limit)
+    rows = [row[:-1] + (format_cents(row[-1]),)
+            for row in connection.execute(sql, params)]
+    return list(LIST_COLUMNS[:-1]) + ['value'], rows, 'operations'
+
+
+def print_table(columns: List[str], rows: list, stream=None):
+    stream = stream or sys.stdout
+    cells = [columns] + [[str(value) for value in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(columns))]
+    for row in cells:
+        stream.write('  '.join(value.ljust(width)
+                               for value, width in zip(row, widths)).rstrip() + '\n')
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description='Queries over the SQLite export.')
+    arg_parser.add_argument('database', help='operations.sqlite written by --format sqlite.')
+    arg_parser.add_argument('command', choices=('totals', 'list'))
+    arg_parser.add_argument('--by', action='append', choices=sorted(GROUPS), default=[],
+                            help='Group the totals, may be repeated. '
+                                 'Totals are always split by currency.')
+    arg_parser.add_argument('--kind', choices=('cost', 'income'))
+    arg_parser.add_argument('--category', action='append', dest='categories',
+                            help='Only operations of the category, may be repeated.')
+    arg_parser.add_argument('--account', action='append', dest='accounts',
+                            help='Only operations of the account, may be repeated.')
+    arg_parser.add_argument('--currency',
+                            help='Only operations in this currency, its ISO code or label.')
+    arg_parser.add_argument('--since', type=to_bound,
+                            help='First day, YYYY, YYYY-MM or YYYY-MM-DD.')
+    arg_parser.add_argument('--until', type=lambda text: to_bound(text, end=True),
+                            help='Last day, YYYY, YYYY-MM or YYYY-MM-DD.')
+    arg_parser.add_argument('--limit', type=int, default=50,
+                            help='Max number of the listed operations.')
+    args = arg_parser.parse_args()
+    if not os.path.exists(args.database):
+        arg_parser.error("No such database: {}".format(args.database))
+    return args
+
+
+def main():
+    args = parse_args()
+    connection = connect(args.database)
+    filters = dict(kind=args.kind, categories=args.categories,
+                   accounts=args.accounts, currency=args.currency,
+                   since=args.since, until=args.until)
+    started = time.perf_counter()
+    if args.command == 'totals':
+        columns, rows, table = totals(connection, args.by, **filters)
+    else:
+        columns, rows, table = list_operations(connection, limit=args.limit, **filters)
+    elapsed = time.perf_counter() - started
+    connection.close()
+    print_table(columns, rows)
+    sys.stderr.write('{} rows from {} in {:.1f} ms\n'.format(len(rows), table, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
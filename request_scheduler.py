@@ -0,0 +1,261 @@
+"""
+Scheduling of the HTTP requests.
+
+Every request goes through the scheduler which:
+
+- retries throttled, failed and timed out requests with
+  exponential backoff and full jitter, honouring Retry-After;
+- caps the request rate with a token bucket;
+- keeps the number of requests in flight under a limit that
+  doubles every round trip until the first sign of congestion,
+  then grows by one while responses are fast and healthy and
+  is cut in half on errors or slow responses (AIMD).
+
+The policy objects only compute delays and limits, so they are
+shared by the thread pools and the asyncio engine alike.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from typing import Callable, Optional
+
+import requests
+
+import constants
+
+
+logger = logging.getLogger('koshelek.scheduler')
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class RequestFailed(Exception):
+    """
+    Request failed permanently: retries are exhausted
+    or the site answered with a non retryable error.
+    """
+
+    def __init__(self, url: str, status: Optional[int]=None, reason: str="") -> None:
+        self.url = url
+        self.status = status
+        self.reason = reason
+        super().__init__("{} failed: {}".format(url, reason or status))
+
+
+class TokenBucket(object):
+    """
+    Allows rate requests per second with bursts of up to burst requests.
+    """
+
+    def __init__(self, rate: float=0, burst: int=1) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token, returns seconds to wait before it may be used.
+        """
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class AdaptiveLimit(object):
+    """
+    AIMD limit of the requests in flight.
+    """
+
+    DECREASE_FACTOR = 0.5
+
+    def __init__(self,
+                 initial: int=constants.DEFAULT_INITIAL_CONCURRENCY,
+                 minimum: int=1,
+                 maximum: int=constants.DEFAULT_ASYNC_CONCURRENCY,
+                 latency_target: float=constants.DEFAULT_LATENCY_TARGET) -> None:
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._slow_start = True
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, congested: bool):
+        """
+        Free the slot and adapt the limit to the outcome of the request.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if congested or latency > self.latency_target:
+                self._decrease(latency)
+            elif self._slow_start:
+                self.limit = min(self.limit + 1, self.maximum)
+            else:
+                self._successes += 1
+                if self._successes >= int(self.limit):
+                    self._successes = 0
+                    self.limit = min(self.limit + 1, self.maximum)
+            self._condition.notify_all()
+
+    def _decrease(self, latency: float):
+        # Requests that were in flight together share the same
+        # congestion episode, react to it once per round trip.
+        now = time.monotonic()
+        if now - self._last_decrease < latency:
+            return
+        self._last_decrease = now
+        self._slow_start = False
+        self._successes = 0
+        self.limit = max(self.limit * self.DECREASE_FACTOR, self.minimum)
+        logger.debug("Concurrency limit decreased to %d.", self.limit)
+
+
+class RequestScheduler(object):
+
+    def __init__(self,
+                 max_retries: int=constants.DEFAULT_MAX_RETRIES,
+                 backoff_base: float=constants.DEFAULT_BACKOFF_BASE,
+                 backoff_max: float=constants.DEFAULT_BACKOFF_MAX,
+                 rate: float=0,
+                 limit: AdaptiveLimit=None,
+                 metrics=None) -> None:
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bucket = TokenBucket(rate, burst=max(int(rate), 1))
+        self.limit = limit or AdaptiveLimit()
+        self.metrics = metrics
+
+    def backoff(self, attempt: int, retry_after: Optional[str]=None) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max,
+                                     self.backoff_base * 2 ** attempt))
+
+    def _finished(self, url: str, attempt: int, status: Optional[int],
+                  retry_after: Optional[str], reason: str) -> float:
+        """
+        Decide on the outcome of the attempt: 0 when the request
+        succeeded, seconds to wait before the next attempt, or
+        raise RequestFailed.
+        """
+        if status is not None and status not in RETRY_STATUSES:
+            if status >= 400:
+                self._count('requests.failed')
+                raise RequestFailed(url, status)
+            return 0.0
+        if attempt >= self.max_retries:
+            self._count('requests.failed')
+            raise RequestFailed(url, status, reason)
+        self._count('requests.retries')
+        delay = self.backoff(attempt, retry_after)
+        logger.warning("%s: %s, retrying in %.1f s (%d/%d).",
+                       url, reason or status, delay, attempt + 1, self.max_retries)
+        return delay
+
+    def _count(self, name: str):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+            self.metrics.gauge('concurrency.limit', int(self.limit.limit))
+
+    def request(self, send: Callable[[], requests.Response], url: str) -> requests.Response:
+        """
+        Run send() under the rate and concurrency limits until it succeeds.
+        """
+        attempt = 0
+        while True:
+            time.sleep(self.bucket.reserve())
+            self.limit.acquire()
+            started = time.monotonic()
+            response, status, reason = None, None, ""
+            try:
+                response = send()
+                status = response.status_code
+            except requests.RequestException as exc:
+                # broken and undecodable bodies are retried like
+                # the connection errors and timeouts
+                reason = type(exc).__name__
+            finally:
+                self.limit.release(time.monotonic() - started,
+                                   congested=status is None or status in RETRY_STATUSES)
+            retry_after = response.headers.get('Retry-After') if response is not None else None
+            delay = self._finished(url, attempt, status, retry_after, reason)
+            if status is not None and status not in RETRY_STATUSES:
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+    async def request_async(self, send, url: str,
+                            network_errors=(OSError, asyncio.TimeoutError)):
+        """
+        Coroutine counterpart of request, send() returns a coroutine
+        resolving to (status, headers, result) or raising one of
+        network_errors.
+        """
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.bucket.reserve())
+            while not self.limit.try_acquire():
+                await asyncio.sleep(constants.SCHEDULER_POLL_INTERVAL)
+            started = time.monotonic()
+            status, headers, result, reason = None, {}, None, ""
+            try:
+                status, headers, result = await send()
+            except network_errors as exc:
+                reason = type(exc).__name__
+            finally:
+                self.limit.release(time.monotonic() - started,
+                                   congested=status is None or status in RETRY_STATUSES)
+            delay = self._finished(url, attempt, status,
+                                   headers.get('Retry-After'), reason)
+            if status is not None and status not in RETRY_STATUSES:
+                return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class ScheduledSession(requests.Session):
+    """
+    requests session sending every request through the scheduler,
+    permanently failed requests raise RequestFailed.
+    """
+
+    def __init__(self, scheduler: RequestScheduler=None) -> None:
+        super().__init__()
+        self.scheduler = scheduler or RequestScheduler()
+
+    def request(self, method, url, *args, **kwargs):
+        # a stalled connection is retried instead of holding its worker
+        kwargs.setdefault('timeout', constants.DEFAULT_REQUEST_TIMEOUT)
+        parent = super(ScheduledSession, self)
+        return self.scheduler.request(
+            lambda: parent.request(method, url, *args, **kwargs), url)
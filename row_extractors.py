@@ -0,0 +1,83 @@
+"""
+Extraction of the operation rows from the list pages.
+
+A page is parsed once and every `<tr class="data_line">` is turned
+into a flat Row tuple of plain strings, so parse strategies never
+touch the HTML tree and the page may be released right away.
+"""
+from collections import namedtuple
+from typing import List
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+import constants
+import utils
+
+
+Row = namedtuple("Row",
+                 ["id", "operation", "title", "category", "budget",
+                  "money", "account", "date", "ajax_url"])
+
+DATA_CLASS = "data_line"
+
+
+def make_row(cells: List[str], ajax_url: str) -> Row:
+    return Row(utils._extract_id_from_url(ajax_url),
+               utils._get_operation_from_ajax_url(ajax_url),
+               *cells[:6], ajax_url=ajax_url)
+
+
+class BS4RowExtractor(object):
+    """
+    Row extraction on top of the BeautifulSoup tree.
+    """
+
+    def extract(self, page_text: str) -> List[Row]:
+        soup = BeautifulSoup(page_text, constants.DEFAULT_PARSER)
+        rows = [self.row_from_block(block)
+                for block in soup.find_all("tr", DATA_CLASS)]
+        soup.decompose()
+        return rows
+
+    @staticmethod
+    def row_from_block(block: BeautifulSoup) -> Row:
+        td_els = utils._extract_td_elements(block)
+        onclick = td_els[constants.PRICE_EDITOR_ELEMENT_INDEX].a['onclick']
+        ajax_url = constants.RE_AJAX_ARGS_URL.findall(onclick)[0]
+        return make_row([td.a.text for td in td_els[:6]], ajax_url)
+
+
+class LxmlRowExtractor(object):
+    """
+    Row extraction with lxml and precompiled XPath expressions,
+    several times faster than going through BeautifulSoup.
+    """
+
+    ROWS_XPATH = etree.XPath('//tr[contains(concat(" ", normalize-space(@class), " "),'
+                             ' " {} ")]'.format(DATA_CLASS))
+    CELL_LINKS_XPATH = etree.XPath('td/descendant::a[1]')
+
+    def extract(self, page_text: str) -> List[Row]:
+        root = etree.HTML(page_text)
+        if root is None:
+            return []
+        return [self.row_from_element(element)
+                for element in self.ROWS_XPATH(root)]
+
+    def row_from_element(self, element) -> Row:
+        links = self.CELL_LINKS_XPATH(element)
+        onclick = links[constants.PRICE_EDITOR_ELEMENT_INDEX].get('onclick')
+        ajax_url = constants.RE_AJAX_ARGS_URL.findall(onclick)[0]
+        return make_row([''.join(link.itertext()) for link in links[:6]],
+                        ajax_url)
+
+
+EXTRACTORS = {
+    'lxml': LxmlRowExtractor,
+    'bs4': BS4RowExtractor,
+}
+
+
+def get_row_extractor(name: str=constants.DEFAULT_ROW_EXTRACTOR):
+    return EXTRACTORS[name]()
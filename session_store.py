@@ -0,0 +1,63 @@
+"""
+Persistent store of the login cookies.
+
+Logging in costs two requests for every run and user, so the
+session cookie is kept between runs and reused as long as the
+site still accepts it. Passwords are never stored.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from typing import Optional
+
+
+logger = logging.getLogger('koshelek.session_store')
+
+
+class SessionStore(object):
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._sessions = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def make_key(base_url: str, login: str) -> str:
+        return '{} {}'.format(base_url, login)
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as sessions_fh:
+                self._sessions = json.load(sessions_fh)
+        except ValueError:
+            logger.warning("Ignoring corrupted session store %s.", self.path)
+            self._sessions = {}
+
+    def get(self, base_url: str, login: str) -> Optional[str]:
+        with self._lock:
+            session = self._sessions.get(self.make_key(base_url, login))
+        return session['cookie'] if session else None
+
+    def save(self, base_url: str, login: str, cookie: Optional[str]):
+        """
+        Remember the session cookie of the user, None forgets it.
+        """
+        key = self.make_key(base_url, login)
+        with self._lock:
+            if cookie:
+                self._sessions[key] = {'cookie': cookie, 'saved': time.time()}
+            else:
+                self._sessions.pop(key, None)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, 'w', encoding='utf-8') as sessions_fh:
+                json.dump(self._sessions, sessions_fh)
+            os.replace(tmp_path, self.path)
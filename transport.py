@@ -0,0 +1,109 @@
+"""
+HTTP transport of the threads engine.
+
+All the sessions of a parser share one connection pool sized to
+the number of requests the scheduler lets in flight, so threads
+neither queue on the default pool of 10 connections nor open
+connections that are thrown away right after the response.
+
+Every worker thread sends requests through its own session cloned
+from the logged in one, cookie jars are never read and updated by
+different threads at once.
+
+Compressed transfers are always asked for. Responses with no
+charset are decoded as UTF-8 instead of guessing the encoding
+from the whole body.
+"""
+import threading
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+import constants
+from request_scheduler import RequestScheduler, ScheduledSession
+
+
+ACCEPT_ENCODING = 'gzip, deflate'
+
+
+def _default_encoding(response, *args, **kwargs):
+    if 'charset' not in response.headers.get('Content-Type', ''):
+        response.encoding = constants.DEFAULT_ENCODING
+
+
+def create_session(scheduler: RequestScheduler, pool_size: int) -> ScheduledSession:
+    session = ScheduledSession(scheduler)
+    # the site is requested with and without certificate verification,
+    # urllib3 keeps a pool for each and would drop one with a single slot
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(pool_size, 1),
+                          pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    session.hooks['response'].append(_default_encoding)
+    return session
+
+
+def clone_session(template: ScheduledSession) -> ScheduledSession:
+    """
+    Session sharing the scheduler and the connection pools of the
+    template, with copies of its headers, cookies and hooks.
+    """
+    session = ScheduledSession(template.scheduler)
+    for prefix, adapter in template.adapters.items():
+        session.mount(prefix, adapter)
+    session.headers.update(template.headers)
+    session.hooks = {event: list(hooks) for event, hooks in template.hooks.items()}
+    session.verify = template.verify
+    # CookieJar takes this lock whenever it stores a cookie
+    with template.cookies._cookies_lock:
+        session.cookies.update(template.cookies)
+    return session
+
+
+class WorkerSessions(object):
+    """
+    Session of the calling thread: the template in the thread that
+    created it, where the login happens, a clone of the template in
+    any other thread. Attributes are looked up on that session, so
+    it is used as a plain requests session.
+    """
+
+    def __init__(self, template: ScheduledSession) -> None:
+        self.template = template
+        self._owner = threading.get_ident()
+        self._local = threading.local()
+        self._clones = []
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def session(self) -> requests.Session:
+        if threading.get_ident() == self._owner:
+            return self.template
+        session = getattr(self._local, 'session', None)
+        if session is None or self._local.generation != self._generation:
+            with self._lock:
+                session = clone_session(self.template)
+                self._clones.append(session)
+                self._local.session, self._local.generation = session, self._generation
+        return session
+
+    def renew(self):
+        """
+        Make every thread clone the template again once
+        its cookies have changed, after a new login.
+        """
+        with self._lock:
+            self._generation += 1
+            self._clones = []
+
+    def __getattr__(self, name):
+        return getattr(self.session(), name)
+
+    def close(self):
+        with self._lock:
+            clones, self._clones = self._clones, []
+        for session in clones:
+            session.close()
+        self.template.close()
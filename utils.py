@@ -1,8 +1,7 @@
-from typing import Tuple
-
 from bs4 import BeautifulSoup
 
 import constants
+from amounts import split_currency  # noqa: F401
 
 
 def _extract_td_elements(soup: BeautifulSoup) -> str:
@@ -16,6 +15,21 @@ def _extract_ajax_url(soup: BeautifulSoup) -> str:
     return constants.RE_AJAX_ARGS_URL.findall(url_)[0]
 
 
+def _extract_id_from_url(ajax_url: str) -> str:
+    """
+    Example
+
+    >>> _extract_id_from_url('/income/2edit_ajax128?return_url=/income')
+    >>> '128'
+    """
+    indx = ajax_url.find(constants.URL_PART_BEFORE_ID) + len(constants.URL_PART_BEFORE_ID)
+    ajax_url = ajax_url[indx:]
+    return_url_pos = ajax_url.find('?return_url')
+    if return_url_pos != -1:
+        ajax_url = ajax_url[:return_url_pos]
+    return ajax_url
+
+
 def _get_operation_from_ajax_url(ajax_url):
     """
     Example
@@ -24,14 +38,3 @@ def _get_operation_from_ajax_url(ajax_url):
     >>> 'income'
     """
     return ajax_url.split('/')[1]
-
-
-def split_currency(sum_str: str) -> Tuple[str, str]:
-    sum_str = sum_str.replace('\xa0', ' ')
-    match = constants.RE_CURRENCY.match(sum_str)
-    if not match:
-        raise ValueError("Incorrect currency string: {}".format(sum_str))
-    cur = match.groupdict()['currency']
-    value = match.groupdict()['value']
-    value = value.replace(',', '.').replace(' ', '')
-    return cur, value